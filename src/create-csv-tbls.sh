@@ -228,9 +228,4 @@ uniq $tblsdir/rt16M.csv > $tblsdir/pt16M.csv
 echo pt20M.csv
 uniq $tblsdir/rt20M.csv > $tblsdir/pt20M.csv
 
-# Call extendpt.py to add null rows to PTs if needed
-echo -e "\nExtending PTs to lengths divisible by 16 (saves time in gpujoin.py)"
-echo       -------------------------------------------------------------------
-extendpt
-
 echo -e "\nTime: $(round $(echo "$(date +%s.%N) - $start" | bc) 2) sec"
@@ -2,14 +2,16 @@
 # -*- coding: utf-8 -*-
 
 #  genplots.py
-#   Generate plots for report. Read GPU and MySQL performance times from files
-#   and plot them.
+#   Generate plots for report. Read GPU performance times from gpujoin's
+#   results store and MySQL performance times from files, and plot them.
 #
 # Rashad Barghouti
 # rb3074@columbia.edu
 # EECS E6893, Fall 2016
 #------------------------------------------------------------------------------
 import argparse
+import ast
+import json
 import sys
 from pathlib import Path    # in Python 3.4+ only
 import matplotlib.pyplot as plt
@@ -23,11 +25,59 @@ def read_tmsfile(p):
     l = []
     with p.open('r') as fd:
         for line in fd:
-            # eval() doesn't like empty lines, so check for them
+            # literal_eval() doesn't like empty lines, so check for them
             if not line.isspace() and line[0] != '#':
-                l.append(eval(line))
+                l.append(ast.literal_eval(line))
     return tuple(l)
 
+#------------------------------------------------------------------------------
+# read_results(p)
+#  This routine is copied from gpujoin.py. It reads the run records of a
+#  results store.
+#------------------------------------------------------------------------------
+def read_results(p):
+    recs = []
+    if p.exists():
+        with p.open('r') as fd:
+            for line in fd:
+                try:
+                    recs.append(json.loads(line))
+                except ValueError:
+                    pass
+    return recs
+
+#------------------------------------------------------------------------------
+# Options stored with a run that change its device times, and their values in
+# a plain run: the Bloom-filter pre-pass and the dedup pass join only part of
+# LPT (--bloom, --dedup), zero-copy buffers (-z) are read from host memory,
+# --ptpart joins PT in partitions, and the join result modes other than the
+# left join (--mode) run a count and an emit pass
+#------------------------------------------------------------------------------
+run_opts = {'bloom': False, 'dedup': False, 'zerocopy': False, 'ptpart': None,
+            'mode': 'left'}
+
+#------------------------------------------------------------------------------
+# find_run(recs, ptbl=None, **opts)
+#  Returns the (device times, LPT sizes) of the latest stored run that joined
+#  all sets with their own PTs, or, if ptbl is given, the latest run that
+#  joined sets with that one PT (option -p). The times are those of the run's
+#  first kernel. Only the runs whose options in run_opts have the values of a
+#  plain run are considered, except for those given in opts, e.g.,
+#  'find_run(recs, bloom=True)' for the runs with --bloom. Returns None if
+#  there is no such run.
+#------------------------------------------------------------------------------
+def find_run(recs, ptbl=None, **opts):
+    opts = dict(run_opts, **opts)
+    for rec in reversed(recs):
+        if any(rec.get(k, v) != opts[k] for k, v in run_opts.items()):
+            continue
+        if rec['ptbl'] == ptbl and (ptbl or rec['allsets']):
+            knl = rec['kernels'][0]
+            gputm = [j['device_time'] for j in rec['joins']
+                     if j['kernel'] == knl]
+            return gputm, rec['lptsz']
+    return None
+
 #------------------------------------------------------------------------------
 
 #-------------------------------------------------------------------------------
@@ -35,19 +85,23 @@ def read_tmsfile(p):
 #-------------------------------------------------------------------------------
 # default paths to data files
 prog = Path(__file__).resolve()
-gpufp1 = prog.parents[1] / 'output/gpujoin-allsets.tms'
+resultsfp = prog.parents[1] / 'output/gpujoin-results.jsonl'
 sqlfp1 = prog.parents[1] / 'output/sqljoin.tms'
+recs = read_results(resultsfp)
 
 # Plot 1: PT grows in size with LPT
 #
 skip = False
-for p in [gpufp1, sqlfp1]:
-    if not p.is_file():
-        print("Error: file {} does not exist".format(p.name))
-        skip = True
+run1 = find_run(recs)
+if run1 is None:
+    print("Error: no run on all sets in {}".format(resultsfp.name))
+    skip = True
+if not sqlfp1.is_file():
+    print("Error: file {} does not exist".format(sqlfp1.name))
+    skip = True
 
 if not skip:
-    _, gputm1, _, lptsz, _ = read_tmsfile(gpufp1)
+    gputm1, lptsz = run1
     (sqltm1,) = read_tmsfile(sqlfp1)
     #plt.figure()
     #plt.subplot(121)
@@ -72,28 +126,26 @@ if not skip:
 # ********
 # Plot 2: PT size is fixed in all joins. PT10M, PT13M, and PT16M
 # ********
-#gpufp1 = prog.parents[1] / 'output/gpujoin-pt832K.tms'
 #sqlfp1 = prog.parents[1] / 'output/sqljoin-pt832K.tms'
 
-gpufp2 = prog.parents[1] / 'output/gpujoin-pt10M.tms'
 sqlfp2 = prog.parents[1] / 'output/sqljoin-pt10M.tms'
-
-gpufp3 = prog.parents[1] / 'output/gpujoin-pt13M.tms'
 sqlfp3 = prog.parents[1] / 'output/sqljoin-pt13M.tms'
-
-gpufp4 = prog.parents[1] / 'output/gpujoin-pt16M.tms'
 sqlfp4 = prog.parents[1] / 'output/sqljoin-pt16M.tms'
 
-for p in [gpufp2, sqlfp2, gpufp3, sqlfp3, gpufp4, sqlfp4]:
+runs = [find_run(recs, ptbl) for ptbl in ['pt10M', 'pt13M', 'pt16M']]
+for ptbl, run in zip(['pt10M', 'pt13M', 'pt16M'], runs):
+    if run is None:
+        print("Error: no run with {} in {}. Terminating"
+              .format(ptbl, resultsfp.name))
+        sys.exit(1)
+for p in [sqlfp2, sqlfp3, sqlfp4]:
     if not p.is_file():
         print("Error: file {} does not exist. Terminating".format(p.name))
         sys.exit(1)
 
 #plt.subplot(122)
 fig = plt.figure()
-_, gputm2, _, lptsz, _ = read_tmsfile(gpufp2)
-_, gputm3, _, _, _ = read_tmsfile(gpufp3)
-_, gputm4, _, _, _ = read_tmsfile(gpufp4)
+(gputm2, lptsz), (gputm3, _), (gputm4, _) = runs
 (sqltm2,) = read_tmsfile(sqlfp2)
 (sqltm3,) = read_tmsfile(sqlfp3)
 (sqltm4,) = read_tmsfile(sqlfp4)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#  gentables.py
+#   This script generates synthetic table sets (LPT, PT, RT) for gpujoin.py,
+#   so that it can be benchmarked without the wikipedia database and the
+#   create-csv-tbls.sh pipeline. A set is named like the real ones
+#   by its LPT row count, N[KM] (K = 1024 rows, M = 1024K rows); e.g.,
+#   'gentables 64K 5M' writes lpt64K, pt64K, rt64K, lpt5M, pt5M, and rt5M.
+#
+#   PT holds unique random titles with unique page ids, in random order. LPT
+#   rows link to PT titles with Zipf-skewed popularity (the r-th most popular
+#   title is linked with probability proportional to 1/r^s); a given fraction
+#   of them link to titles that are not in PT. RT is the expected join: LPT
+#   with the page id of each title, or 0 if the title is not in PT.
+#
+#   The sets of one run are nested like the real ones: the PT of a smaller set
+#   is the head of the PT of a larger one (same titles, same ids), and the
+#   missing titles are in no PT. So gpujoin's -p option can join the smaller
+#   sets with the largest PT.
+#
+#   The tables are written as .npy files, in the format read_table() loads,
+#   and optionally also as tab-separated CSV files.
+#------------------------------------------------------------------------------
+import re
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+TITLE_LEN = 60
+
+# Title characters. Tab and newline would break the CSV files; quote is
+# excluded so that no title can equal the "''" of the null rows that padded
+# older PT files
+ALPHABET = np.frombuffer(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+                         b'abcdefghijklmnopqrstuvwxyz0123456789_()-,.',
+                         dtype='u1')
+
+dt = np.dtype([('id', 'u4'), ('title', 'S60')])
+
+# Path to tables directory
+tbls_path = Path(__file__).resolve().parents[1] / 'tables'
+
+#------------------------------------------------------------------------------
+# set_rows(tblset)
+#   Returns the LPT row count of a table-set name of the form N[KM].
+#------------------------------------------------------------------------------
+def set_rows(tblset):
+    m = re.fullmatch(r'([1-9]\d*)([KM])', tblset)
+    if m is None:
+        raise argparse.ArgumentTypeError("invalid table set '{}' (expected "
+                "N[KM], e.g., 64K or 5M)".format(tblset))
+    return int(m.group(1)) << (10 if m.group(2) == 'K' else 20)
+
+def tblset_name(arg):
+    set_rows(arg)
+    return arg
+
+#------------------------------------------------------------------------------
+# title_lengths(rng, n, lens)
+#   Returns n title lengths drawn from the distribution lens, a tuple (kind,
+#   a, b) as parsed by lendist(), clipped to [1, TITLE_LEN].
+#------------------------------------------------------------------------------
+def title_lengths(rng, n, lens):
+    kind, a, b = lens
+    if kind == 'fixed':
+        l = np.full(n, a)
+    elif kind == 'uniform':
+        l = rng.integers(a, b, n, endpoint=True)
+    elif kind == 'normal':
+        l = np.rint(rng.normal(a, b, n))
+    else:
+        # lognormal with mean a and standard deviation b
+        sigma2 = np.log1p((b/a)**2)
+        l = np.rint(rng.lognormal(np.log(a) - sigma2/2, np.sqrt(sigma2), n))
+    return np.clip(l, 1, TITLE_LEN).astype(np.intp)
+
+#------------------------------------------------------------------------------
+# unique_titles(rng, n, lens)
+#   Returns n distinct random titles (an ndarray of dtype S60) whose lengths
+#   follow lens. Titles are drawn in bulk; the duplicates are redrawn (with
+#   new lengths) until none are left.
+#------------------------------------------------------------------------------
+def unique_titles(rng, n, lens):
+    titles = np.empty(0, dtype='S60')
+    for _ in range(100):
+        k = n - titles.size
+        if k == 0:
+            return titles[rng.permutation(n)]
+        l = title_lengths(rng, k, lens)
+        b = ALPHABET[rng.integers(0, ALPHABET.size, (k, TITLE_LEN))]
+        b[np.arange(TITLE_LEN) >= l[:, None]] = 0
+        titles = np.unique(np.concatenate((titles, b.view('S60').ravel())))
+    sys.exit("Error: cannot draw {} distinct titles with lengths {}"
+             .format(n, ':'.join(map(str, lens))))
+
+#------------------------------------------------------------------------------
+# zipf_draw(rng, n, k, s)
+#   Returns n indices in [0, k), index r drawn with probability proportional
+#   to 1/(r+1)^s. s = 0 gives the uniform distribution.
+#------------------------------------------------------------------------------
+def zipf_draw(rng, n, k, s):
+    if s == 0:
+        return rng.integers(0, k, n)
+    cdf = np.cumsum(np.arange(1, k+1, dtype=np.float64)**-s)
+    idx = np.searchsorted(cdf, rng.random(n) * cdf[-1], side='right')
+    return np.minimum(idx, k-1)
+
+#------------------------------------------------------------------------------
+# set_shape(args, tblset)
+#   Returns the (LPT rows, PT rows, unmatched LPT rows, missing titles) of a
+#   table set; there are as many links per missing title as per PT title.
+#------------------------------------------------------------------------------
+def set_shape(args, tblset):
+    nlpt = set_rows(tblset)
+    npt = args.ptrows or max(nlpt // args.ratio, 1)
+    nmiss = int(round(nlpt * args.unmatched))
+    nxtra = -(-nmiss * npt // nlpt) if nmiss else 0
+    return nlpt, npt, nmiss, nxtra
+
+#------------------------------------------------------------------------------
+# gen_universe(rng, args)
+#   Returns the titles and page ids all the sets of the run draw from: the PT
+#   titles of the largest set (titles[:len(ids)]), followed by the missing
+#   titles.
+#------------------------------------------------------------------------------
+def gen_universe(rng, args):
+    shapes = [set_shape(args, tblset) for tblset in args.tblset]
+    maxpt = max(shape[1] for shape in shapes)
+    maxxtra = max(shape[3] for shape in shapes)
+    titles = unique_titles(rng, maxpt + maxxtra, args.lens)
+
+    # Page ids: distinct, nonzero, and not in title order
+    ids = rng.choice(np.iinfo(np.uint32).max, maxpt, replace=False) + 1
+    return titles, ids
+
+#------------------------------------------------------------------------------
+# gen_set(rng, args, tblset, titles, ids)
+#   Generates the (lpt, pt, rt) arrays of one table set.
+#------------------------------------------------------------------------------
+def gen_set(rng, args, tblset, titles, ids):
+    nlpt, npt, nmiss, nxtra = set_shape(args, tblset)
+    miss0 = ids.size
+
+    pt = np.zeros(npt, dtype=dt)
+    pt['id'] = ids[:npt]
+    pt['title'] = titles[:npt]
+
+    # LPT links: Zipf over PT rows (whose order is random), uniform over the
+    # pool of missing titles
+    src = np.concatenate((zipf_draw(rng, nlpt - nmiss, npt, args.zipf),
+                          miss0 + rng.integers(0, max(nxtra, 1), nmiss)))
+    src = src[rng.permutation(nlpt)]
+
+    lpt = np.zeros(nlpt, dtype=dt)
+    lpt['title'] = titles[src]
+    rt = lpt.copy()
+    rt['id'] = np.where(src < npt, ids[np.minimum(src, npt-1)], 0)
+
+    return lpt, pt, rt
+
+#------------------------------------------------------------------------------
+# write_csv(arr, f)
+#   Writes arr to f as tab-separated 'id<TAB>title' lines.
+#------------------------------------------------------------------------------
+def write_csv(arr, f):
+    with f.open('wb') as fd:
+        fd.writelines(b'%d\t%s\n' % (i, t) for i, t in arr.tolist())
+
+#------------------------------------------------------------------------------
+# lendist(arg)
+#   argparse type for -l: KIND[:A[:B]], with KIND one of fixed:N,
+#   uniform:MIN:MAX, normal:MEAN:SD, or lognormal:MEAN:SD.
+#------------------------------------------------------------------------------
+def lendist(arg):
+    defaults = {'fixed': (16, 0), 'uniform': (1, TITLE_LEN),
+                'normal': (18, 8), 'lognormal': (18, 8)}
+    kind, *vals = arg.split(':')
+    if kind not in defaults or len(vals) > 2:
+        raise argparse.ArgumentTypeError("invalid distribution '{}'"
+                                         .format(arg))
+    try:
+        vals = [float(v) for v in vals]
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid distribution '{}'"
+                                         .format(arg))
+    a, b = vals + list(defaults[kind][len(vals):])
+    if kind in ('fixed', 'uniform'):
+        a, b = int(a), int(b)
+    if not (1 <= a <= TITLE_LEN) or b < 0 or (kind == 'uniform' and b < a):
+        raise argparse.ArgumentTypeError("invalid distribution '{}'"
+                                         .format(arg))
+    return kind, a, b
+
+def parse_cmdline():
+
+    s = ["Generate synthetic table sets (LPT, PT, RT) for gpujoin."]
+    parser = argparse.ArgumentParser(description=' '.join(s))
+
+    s = ["table set(s) to generate, named by LPT row count N[KM], where K ="]
+    s += ["1024 rows and M = 1024K rows. Example: '%(prog)s 64K 5M'"]
+    parser.add_argument('tblset', nargs='+', metavar='TBLSET',
+            type=tblset_name, help=' '.join(s))
+
+    s = ["output directory (default: the project's tables directory)"]
+    parser.add_argument('-d', dest='tdir', metavar='TBLSDIR', type=Path,
+            default=tbls_path, help=' '.join(s))
+
+    s = ["PT rows per set. The default is the LPT rows divided by RATIO"]
+    s += ["(option -r)"]
+    parser.add_argument('-p', dest='ptrows', metavar='ROWS', type=int,
+            default=0, help=' '.join(s))
+
+    s = ["LPT rows per PT row when -p is not given (default: %(default)s)"]
+    parser.add_argument('-r', dest='ratio', metavar='RATIO', type=int,
+            default=4, help=' '.join(s))
+
+    s = ["title-length distribution: fixed:N, uniform:MIN:MAX,"]
+    s += ["normal:MEAN:SD or lognormal:MEAN:SD; lengths are clipped to"]
+    s += ["[1, 60] (default: lognormal:18:8)"]
+    parser.add_argument('-l', dest='lens', metavar='DIST', type=lendist,
+            default=lendist('lognormal'), help=' '.join(s))
+
+    s = ["Zipf exponent of link popularity; 0 links PT titles uniformly"]
+    s += ["(default: %(default)s)"]
+    parser.add_argument('-z', dest='zipf', metavar='S', type=float,
+            default=1.0, help=' '.join(s))
+
+    s = ["fraction of LPT rows whose titles are not in PT and whose RT id"]
+    s += ["is 0 (default: %(default)s)"]
+    parser.add_argument('-u', dest='unmatched', metavar='FRAC', type=float,
+            default=0.0, help=' '.join(s))
+
+    s = ["random seed (default: %(default)s)"]
+    parser.add_argument('--seed', type=int, default=0, help=' '.join(s))
+
+    s = ["also write the tables as tab-separated CSV files"]
+    parser.add_argument('-c', dest='csv', action='store_true',
+            help=' '.join(s))
+
+    args = parser.parse_args()
+    if not 0 <= args.unmatched <= 1:
+        parser.error('argument -u: FRAC must be in [0, 1]')
+    if args.zipf < 0:
+        parser.error('argument -z: S must be >= 0')
+    if args.ratio < 1 or args.ptrows < 0:
+        parser.error('arguments -p and -r must be positive')
+    return args
+
+def main():
+    args = parse_cmdline()
+    args.tdir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(args.seed)
+    titles, ids = gen_universe(rng, args)
+
+    for tblset in args.tblset:
+        tm = time.perf_counter()
+        tbls = gen_set(rng, args, tblset, titles, ids)
+        for name, arr in zip(('lpt', 'pt', 'rt'), tbls):
+            f = args.tdir / ''.join([name, tblset, '.npy'])
+            np.save(str(f), arr)
+            if args.csv:
+                write_csv(arr, f.with_suffix('.csv'))
+        lpt, pt, rt = tbls
+        print("{:<6} - LPT {} rows, PT {} rows, {} unmatched ({:.2f}s)"
+              .format(tblset, lpt.size, pt.size,
+                  np.count_nonzero(rt['id'] == 0), time.perf_counter() - tm))
+
+if __name__ == '__main__':
+    main()
@@ -12,19 +12,32 @@
 
 # System imports
 import io
+import os
+import ast
 import re
 import sys
+import json
 import time
+import hashlib
 import argparse
+import subprocess
+import threading
 from pathlib import Path    # in Python 3.4+ only
-from shutil import copy
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Dependency imports (may need to be added to default Python installation)
 import numpy as np
-import pyopencl as cl
-import pyopencl.array
 import prettytable
 
+# PyOpenCL is not needed by the host (CPU) engine, so let the program run
+# without it on machines that have no OpenCL installation
+try:
+    import pyopencl as cl
+    import pyopencl.array
+except ImportError:
+    cl = None
+
 #** Begin project definitions **#
 
 # Handler for controlled traceback display. Comment out for full traceback
@@ -37,13 +50,168 @@ prog_path = Path(__file__).resolve()
 project_path = prog_path.parents[1]
 output_path = project_path/'output'
 
-# Ordered list of the tblset keys/names
+# Ordered list of the tblset keys/names. Other sets, such as those made by
+# gentables.py, can be joined by name: any N[KM] is a tblset keyword
 allsets = ['208K', '416K', '832K', '2M', '3M', '7M', '10M', '13M', '16M']
 
+# Join engines. 'lmem' is the nested-loop shared-memory kernel; 'fprint' is a
+# nested-loop kernel that compares 64-bit title fingerprints before titles;
+# 'hash' probes an open-addressing table built over the PT fingerprints;
+# 'bsearch' binary-searches a sorted copy of PT on the device; 'dict' joins
+# dictionary-encoded titles by a direct-address gather; 'arena' binary-searches
+# PT with titles packed by length in byte arenas; 'sort' is a host-only
+# sort-merge join that does not use OpenCL
+engines = ['lmem', 'fprint', 'hash', 'bsearch', 'dict', 'arena', 'sort']
+
+# Engines that need the title-fingerprint columns of LPT and PT
+fpengines = ['fprint', 'hash']
+
+# Kernel registry: every join kernel in kernel.cl, keyed by the keyword that
+# selects it (option -k). The default kernel of an OpenCL engine has the
+# engine's name. An entry gives:
+#   knl:    the KERNEL value get_kernel() defines to build the kernel
+#   fn:     its entry point
+#   engine: the engine whose host tables and device buffers it joins
+#   args:   its arguments by name. An argument 'x' is the run's device buffer
+#           (or local memory) d_x, or one of the scalars ptsz, hmask,
+#           segoffset and nblks (see enqueue_join())
+#   lmem:   bytes of local memory it needs per work-group, given the block
+#           size and the fingerprint tile size (in blocks), or None
+#   rowlen: ROWLEN, the number of row elements it reads at a time
+#   wirows: LPT rows per work-item
+#   zero:   True if it writes an id of 0 for a row with no match; the output
+#           of the others is cleared before they run
+kernels = {
+    'naive':   dict(knl='NAIVE', fn='join_naive', engine='lmem',
+                    args=['lpt', 'pt', 'ptsz', 'lpid'],
+                    lmem=None, rowlen=16, wirows=1, zero=False),
+    'xor':     dict(knl='XOR', fn='join_vecdata_xor_ops', engine='lmem',
+                    args=['lpt', 'pt', 'ptsz', 'lpid'],
+                    lmem=None, rowlen=4, wirows=1, zero=False),
+    'oclfns':  dict(knl='OCLFNS', fn='join_vecdata_oclfns', engine='lmem',
+                    args=['lpt', 'pt', 'ptsz', 'lpid'],
+                    lmem=None, rowlen=4, wirows=1, zero=False),
+    'lmem':    dict(knl='LMEM', fn='join_vecdata_lmem', engine='lmem',
+                    args=['lpt', 'pt', 'ptsz', 'lpid', 'lmem'],
+                    lmem=lambda blk, tile: 64*blk + 4,
+                    rowlen=4, wirows=1, zero=False),
+    'lptsegs': dict(knl='LPTSEGS', fn='join_vecdata_LPTsegments',
+                    engine='lmem',
+                    args=['lpt', 'segoffset', 'pt', 'ptsz', 'lpid', 'lmem'],
+                    lmem=lambda blk, tile: 64*blk + 4,
+                    rowlen=4, wirows=1, zero=True),
+    'lwg':     dict(knl='LWG', fn='join_vecdata_lwg', engine='lmem',
+                    args=['lpt', 'nblks', 'pt', 'ptsz', 'lpid', 'lmem'],
+                    lmem=lambda blk, tile: 64*blk + 4,
+                    rowlen=4, wirows=4, zero=False),
+    'fprint':  dict(knl='FPRINT', fn='join_fprint_lmem', engine='fprint',
+                    args=['lpt', 'lpfp', 'pt', 'ptfp', 'ptsz', 'lpid',
+                          'lmem'],
+                    lmem=lambda blk, tile: 8*tile*blk + 4,
+                    rowlen=4, wirows=1, zero=True),
+    'hash':    dict(knl='HASH', fn='join_hash_probe', engine='hash',
+                    args=['lpt', 'lpfp', 'pt', 'ptfp', 'htbl', 'hmask',
+                          'lpid'],
+                    lmem=None, rowlen=4, wirows=1, zero=True),
+    'bsearch': dict(knl='BSEARCH', fn='join_sorted_bsearch',
+                    engine='bsearch', args=['lpt', 'pt', 'ptsz', 'lpid'],
+                    lmem=None, rowlen=4, wirows=1, zero=True),
+    'dict':    dict(knl='DICT', fn='join_dict_gather', engine='dict',
+                    args=['lpt', 'idmap', 'lpid'],
+                    lmem=None, rowlen=4, wirows=1, zero=True),
+    'arena':   dict(knl='ARENA', fn='join_arena_bsearch', engine='arena',
+                    args=['lpt', 'lpoff', 'pt', 'ptoff', 'ptid', 'ptsz',
+                          'lpid'],
+                    lmem=None, rowlen=4, wirows=1, zero=True),
+}
+
+# Join result modes (option --mode). 'left' fills the id column of LPT with
+# the id of its first match in PT, or 0; 'inner' returns the (LPT row, PT row)
+# pairs of all the matches; 'semi' a bitmask of the LPT rows that have a
+# match; and 'anti' the LPT rows that have none (dangling links). The other
+# modes than 'left' run the bsearch engine's count and emit kernels
+# (run_gpu_matches()).
+modes = ['left', 'inner', 'semi', 'anti']
+
+# Rows packed into a title arena at a time (see title_arena())
+ARENA_CHUNK = 1 << 20
+
+# Default number of PT fingerprints per local-memory tile of the fprint kernel,
+# in multiples of BLKSIZE. At 8 bytes per fingerprint, a tile of 8*BLKSIZE rows
+# takes as much local memory as BLKSIZE full 64-byte rows in the lmem kernel.
+FPTILE_BLKS = 8
+
+# Empty-slot marker of the hash engine's open-addressing table
+HTEMPTY = np.uint32(0xFFFFFFFF)
+
+# Bloom-filter pre-pass (--bloom): bits per PT row and bits set per title
+# (a false-positive rate of about 0.06%), and the engines it is used with,
+# those whose kernels scan PT for every LPT row
+BLOOM_BITS = 16
+BLOOM_HASHES = 8
+BLOOM_ENGINES = ['lmem', 'fprint']
+
+# Multi-device mode (-a): LPT is split into about MDEV_CHUNKS chunks per
+# device, of at least MDEV_MINROWS rows each, for the devices to share
+MDEV_CHUNKS = 16
+MDEV_MINROWS = 1 << 12
+
+# Autotuner (--tune): number of LPT rows sampled from the first table set, runs
+# per configuration, and the work-group sizes and fprint tile sizes (in blocks)
+# it tries. The fastest configuration is stored per device and kernel in
+# tune_fname, and, when several kernels are tuned together, the fastest kernel
+# is stored per device as well (under the key 'best').
+TUNE_ROWS = 1 << 15
+TUNE_RUNS = 3
+TUNE_LCLSZ = [4, 8, 16, 32, 64, 128, 256]
+TUNE_FPTBLKS = [2, 4, 8, 16, 32]
+tune_fname = project_path/'src/.cltune.json'
+
+# OpenCL program build options (part of the key of cached program binaries)
+CL_OPTIONS = []
+
+# Version of the persistent PT index layout; bump it whenever the format of
+# any of the index arrays (e.g., the fingerprint function) changes
+PTINDEX_VERSION = 1
+
+# Prefetch: while a set is joined, the tables of the next sets are read in a
+# background thread, up to PREFETCH_MB megabytes ahead (option --prefetch)
+PREFETCH_MB = 4096
+
+# Default cap on the error rows log_errors() writes per join (option --errs)
+ERRLOG_ROWS = 1000
+
+# Phases of the run's timeline (see trace_host() and trace_event()). Host
+# phases: loading the set's tables (load), building PT index structures
+# (index), gathering the distinct LPT titles and scattering their ids back
+# (dedup), the Bloom-filter pre-pass (filter), a host join (join), and
+# verifying the output (verify). Device
+# phases, timed by their OpenCL profiling events: copies to the device
+# (upload), clearing the output (fill), the join kernel (kernel), and copies
+# of the output back (readback). Load times are the set's; the others belong
+# to each join, i.e., to each kernel the set is joined with. In a Chrome
+# trace, the phases of a device are shown on the thread TRACE_TIDS[phase].
+TRACE_TIDS = {'load': 0, 'index': 0, 'dedup': 0, 'filter': 0, 'upload': 1,
+              'fill': 2, 'kernel': 2, 'join': 0, 'readback': 3, 'verify': 0}
+
+# Results store: every run that completes without errors appends one JSON
+# record to it (see write_results())
+results_fname = output_path/'gpujoin-results.jsonl'
+
+# Title dictionary of the dict engine (kept in the tables directory) and the
+# dtype of its dictionary-encoded tables
+tdict_fname = 'titledict.npz'
+codedt = np.dtype([('id', 'u4'), ('code', 'u4')])
+
 # System data struct
 class GPUJOIN_STRUCT:
     pass
 
+# One OpenCL device of a multi-device run (-a option): its context, queue,
+# program, and device buffers
+class OCLDEV_STRUCT:
+    pass
+
 #------------------------------------------------------------------------------
 # _main():
 #   This is the program's entry point. The function parses the cmdline and runs
@@ -57,22 +225,52 @@ def _main():
     # Create and initialize the gpujoin data structure
     gpu = init_gpujoin(args)
 
-    # Loop over all table sets and do a gpu-join on each
-    for gpu.tblset in gpu.sets:
-
-        # Create the tables' ndarrays and load them from CSV/NPY files
-        load_tables(gpu)
-
-        # Launch the GPU kernel to join this set's tables
-        equal = run_gpu(gpu)
+    # In tuning mode (--tune), only benchmark the kernels and store the
+    # results
+    if gpu.tune:
+        tune_kernels(gpu)
+        exit_prog(gpu)
 
-        # Log any errors; if multiple GPU outputs have had errors, terminate
-        if not equal:
-            log_errors(gpu)
+    # Loop over all table sets and do a gpu-join on each. However the loop
+    # ends (e.g., with a Ctrl-C), the prefetch of the next sets is stopped
+    try:
+        for i, gpu.tblset in enumerate(gpu.sets):
+
+            # Create the tables' ndarrays and load them from CSV/NPY files (or
+            # take them from the prefetch), then start reading the next sets
+            load_tables(gpu)
+            prefetch_sets(gpu, gpu.sets[i+1:])
+
+            # Join this set's tables with the host engine
+            if gpu.engine == 'sort':
+                if not run_cpu(gpu):
+                    log_errors(gpu)
+
+            # Or launch each selected GPU kernel in turn
+            for gpu.knlkwd in gpu.knls:
+                select_kernel(gpu)
+                if gpu.mode != 'left':
+                    equal = run_gpu_matches(gpu)
+                elif gpu.alldevs:
+                    equal = run_gpu_multi(gpu)
+                elif gpu.chunksz is not None:
+                    equal = run_gpu_stream(gpu)
+                else:
+                    equal = run_gpu(gpu)
+                if not equal:
+                    log_errors(gpu)
+
+            # If multiple outputs have had errors, terminate
             if len(gpu.errinfo) > 1:
                 break
+    finally:
+        if gpu.pfex is not None:
+            gpu.pfstop.set()
+            gpu.pfex.shutdown(wait=False, cancel_futures=True)
 
     # All joins are done. Write execution data to files and display output info
+    if gpu.tracef is not None:
+        write_trace(gpu)
     record_display_results(gpu)
 
     exit_prog(gpu)
@@ -108,269 +306,2505 @@ def init_gpujoin(args):
     prtlog(gpu)
     print('{:*<79}'.format(''), file=gpu.logfile)
 
-    # If '--prt' option was used, print summary table and exit
-    if args.tmsfile is not None:
-        print_summary_table(gpu, tmsfp=Path(args.tmsfile))
+    # If '--prt' option was used, print summary table and exit. RUN is a run
+    # in the results store (an index, default -1: the last run), or an older
+    # .tms file
+    if args.prtrun is not None:
+        if args.prtrun.endswith('.tms'):
+            print_summary_table(gpu, tmsfp=Path(args.prtrun))
+            sys.exit(0)
+        recs = read_results()
+        try:
+            rec = recs[int(args.prtrun)]
+        except (ValueError, IndexError):
+            prtlog(gpu, 'Error: no run {} in {} ({} runs)'.format(
+                    args.prtrun, results_fname.name, len(recs)),
+                    fd=sys.stderr)
+            exit_prog(gpu)
+        print_summary_table(gpu, rec=rec)
         sys.exit(0)
 
     # timestamp this run
     prtlog(gpu, '{} – {}\n'.format(prog_path.name, time.ctime()))
 
-    # Create OpenCL runtime
-    gpu.platname = 'NVIDIA CUDA' if args.platname is None else args.platname[0]
-    init_ocl_runtime(gpu)
+    gpu.engine = 'lmem' if args.engine is None else args.engine[0]
+
+    # Kernels to run on each set (see the kernels registry): those of -k, in
+    # registry order, else the engine's own. Their engines replace -e.
+    gpu.knls = [] if gpu.engine == 'sort' else [gpu.engine]
+    if args.knls is not None:
+        gpu.knls = [k for k in kernels if k in args.knls or 'all' in args.knls]
+        gpu.engine = kernels[gpu.knls[0]]['engine']
+    gpu.engines = {kernels[k]['engine'] for k in gpu.knls} or {gpu.engine}
+
+    # Streaming mode (-s) joins LPT in chunks with the lmem engine's
+    # segmented kernel
+    gpu.chunksz = None if args.chunksz is None else args.chunksz[0]
+    if gpu.chunksz is not None and (gpu.engine != 'lmem' or args.knls):
+        prtlog(gpu, 'Error: init_gpujoin(): option -s requires engine lmem',
+                ' and cannot be used with -k', fd=sys.stderr)
+        exit_prog(gpu)
+    if gpu.chunksz is not None:
+        gpu.knls = ['lptsegs']
+
+    # Multi-device mode (-a) splits LPT across all OpenCL devices
+    gpu.alldevs = args.alldevs
+    if gpu.alldevs and (gpu.engine == 'sort' or args.chunksz is not None
+                        or len(gpu.knls) > 1):
+        prtlog(gpu, 'Error: init_gpujoin(): option -a cannot be used with -s,',
+                ' engine sort or more than one kernel', fd=sys.stderr)
+        exit_prog(gpu)
+
+    # The autotuner (--tune) tunes the kernels of -k (or the engine's) on
+    # one device
+    gpu.tune = args.tune
+    if gpu.tune and (gpu.engine == 'sort' or gpu.alldevs or gpu.chunksz):
+        prtlog(gpu, 'Error: init_gpujoin(): option --tune cannot be used',
+                ' with -a, -s or engine sort', fd=sys.stderr)
+        exit_prog(gpu)
+
+    # The join result modes other than 'left' (--mode) count and emit all
+    # the matches of LPT with the bsearch engine's kernels
+    gpu.mode = args.mode
+    if gpu.mode != 'left' and (gpu.engine != 'bsearch' or args.knls
+            or gpu.alldevs or gpu.chunksz is not None or gpu.tune
+            or args.dedup):
+        prtlog(gpu, 'Error: init_gpujoin(): option --mode {} requires engine'
+                .format(gpu.mode), ' bsearch and cannot be used with -k, -a,',
+                ' -s, --tune or --dedup', fd=sys.stderr)
+        exit_prog(gpu)
+
+    # Create OpenCL runtime; the host engine runs without one
+    gpu.platname = 'NVIDIA CUDA' if args.platname is None else args.platname[0]
+    if gpu.engine != 'sort':
+        init_ocl_runtime(gpu)
+
+    # Without -k and -e, a plain run uses the fastest kernel --tune found on
+    # the device, if any
+    if (args.knls is None and args.engine is None and not gpu.tune
+            and not gpu.alldevs and gpu.chunksz is None
+            and gpu.mode == 'left'):
+        knl = load_best_kernel(gpu)
+        if knl is not None:
+            gpu.knls, gpu.engine = [knl], kernels[knl]['engine']
+            gpu.engines = {gpu.engine}
+            prtlog(gpu, 'Kernel {} selected: fastest tuned kernel on the'
+                    ' device'.format(knl))
+
+    # Init tables path; terminate if it does not exist
+    #
+    gpu.tblspath = project_path/'tables'
+    if args.tdir is not None:
+        gpu.tblspath = Path(args.tdir[0])
+    if not gpu.tblspath.is_dir():
+        prtlog(gpu, 'Error: init_gpujoin(): no such directory: {}'
+                .format(gpu.tblspath), fd=sys.stderr)
+        exit_prog(gpu)
+
+    # Create list of table sets to be joined
+    if 'all' in args.tblset:
+        gpu.sets = allsets
+    else:
+        gpu.sets = sorted(set(args.tblset), key=set_size)
+
+    # Note: if a single page table to be used for all joins (-p option), make
+    # sure it is large enough for all the LPTs in the join sets; don't do the
+    # joins for which it is not. E.g., if cmdline is something like "gpujoin -p
+    # pt832K 208K 416K 832K 2M", then tblset 2M will be removed, since pt832K
+    # is not large enough to produce a full join with lpt2M.
+    gpu.ptbl = None
+    if args.ptbl is not None:
+        gpu.ptbl = args.ptbl[0]
+        ptsize = set_size(gpu.ptbl[2:])
+        ptlst = []
+        new =[]
+        for tblset in gpu.sets:
+            if set_size(tblset) <= ptsize:
+                new += [tblset]
+                ptlst += [gpu.ptbl]
+            else:
+                break
+        gpu.sets = new
+    else:
+        ptlst = [''.join(['pt', tblset]) for tblset in gpu.sets]
+
+    lptlst = [''.join(['lpt', tblset]) for tblset in gpu.sets]
+    rtlst = [''.join(['rt', tblset]) for tblset in gpu.sets]
+    gpu.tbldict = {}
+    for key, lpt, pt, rt in zip(gpu.sets, lptlst, ptlst, rtlst):
+        gpu.tbldict[key] = (lpt, pt, rt)
+
+    # The dict engine's title dictionary is shared by all sets
+    if 'dict' in gpu.engines:
+        load_title_dict(gpu)
+
+    # Persistent PT index (in the tables directory) and memo of PT digests
+    gpu.ptindex = not args.noindex
+    gpu.ptidxdir = None
+    gpu.ptdigests = {}
+    digestf = gpu.tblspath/'ptindex'/'digests.json'
+    if gpu.ptindex and digestf.exists():
+        with digestf.open('r') as fd:
+            gpu.ptdigests = json.load(fd)
+
+    gpu.mknpy = args.mknpy
+    gpu.usenpy = args.usenpy
+    gpu.zerocopy = args.zerocopy
+
+    # Prefetch of the next sets' tables (none in zero-copy mode, which maps
+    # the files instead of reading them)
+    gpu.pfbudget = args.prefetch << 20
+    gpu.pfex = None
+    if gpu.pfbudget > 0 and not gpu.zerocopy and len(gpu.sets) > 1:
+        gpu.pfex = ThreadPoolExecutor(max_workers=1)
+    gpu.pf = {}
+    gpu.pfstop = threading.Event()
+    gpu.bloom = args.bloom
+    gpu.dedup = args.dedup
+    gpu.maxerrs = args.maxerrs
+    gpu.errnpy = args.errnpy
+    gpu.runs = 1 if args.runs is None else args.runs[0]
+
+    # Create lists to hold execution times, sizes of consumed tables, & errinfo
+    gpu.gputm, gpu.totaltm = [], []
+    gpu.lptsz, gpu.ptsz = [], []
+    gpu.lptuniq = []
+    gpu.upbytes = []
+    gpu.bloomstats, gpu.bloomrows = [], None
+    gpu.errinfo = []
+
+    # Timeline of the run and per-phase times and bytes (see trace_host())
+    gpu.tracef = None if args.trace is None else Path(args.trace[0])
+    gpu.t0 = time.perf_counter()
+    gpu.trace, gpu.pending, gpu.clkoff = [], [], {}
+    gpu.setphases, gpu.phases, gpu.phasestats = {}, {}, []
+
+    # Development/test options.
+    gpu.ptpart = None if args.ptpart is None else args.ptpart[0]
+    gpu.knlfname = project_path/'src/kernel.cl'
+    if args.kfn is not None:
+        gpu.knlfname = Path(args.kfn[0])
+
+    # Device memory pools, owned by the run and reused by all sets, and the
+    # device copies of the current PT (see to_device_resident())
+    if gpu.engine != 'sort':
+        for owner in gpu.devs if gpu.alldevs else [gpu]:
+            owner.rdpool = cl.tools.MemoryPool(cl.tools.ImmediateAllocator(
+                    owner.cq, mem_flags=cl.mem_flags.READ_ONLY))
+            owner.wrpool = cl.tools.MemoryPool(cl.tools.ImmediateAllocator(
+                    owner.cq, mem_flags=cl.mem_flags.WRITE_ONLY))
+            owner.resident = {}
+    gpu.uplock = threading.Lock()
+
+    # Get every kernel's src and build its OpenCL program (or load it from
+    # the cache of program binaries). The work-group size and fprint tile
+    # size come from --dim, else from the values tuned for the device and the
+    # kernel (see tune_kernel()), else from the defaults. A multi-device run
+    # uses the defaults, since all its devices share them.
+    gpu.knlcfg = {}
+    for gpu.knlkwd in gpu.knls:
+        gpu.engine = kernels[gpu.knlkwd]['engine']
+        gpu.lclsz, gpu.fptblks, gpu.tuned = (16, 1), FPTILE_BLKS, False
+        if args.dim is not None:
+            gpu.lclsz = tuple(args.dim)
+        elif not gpu.alldevs and not gpu.tune:
+            load_tuning(gpu)
+        knlstr = get_kernel(gpu)
+        gpu.prg = build_program(gpu, gpu.ctx, knlstr)
+        gpu.knlcfg[gpu.knlkwd] = gpu.lclsz, gpu.fptblks, gpu.tuned, gpu.prg
+
+        # Every other context of a multi-device run needs its own build
+        if gpu.alldevs:
+            prgs = {gpu.ctx: gpu.prg}
+            for dev in gpu.devs:
+                if dev.ctx not in prgs:
+                    prgs[dev.ctx] = build_program(gpu, dev.ctx, knlstr)
+                dev.prg = prgs[dev.ctx]
+
+    # Print out execution parameters for this run
+    #
+    # (OpenCL platform -- for some reason, the context properties list comes
+    # back empty, so use devices list instead.)
+    if gpu.engine == 'sort':
+        s = 'OpenCL platform: None (host engine)'
+    elif gpu.alldevs:
+        s = 'OpenCL devices: {}'.format(', '.join(
+                '{} ({})'.format(dev.name, dev.platname) for dev in gpu.devs))
+    else:
+        platname = gpu.ctx.devices[0].platform.name
+        if args.platname is None:
+            s = 'OpenCL platform: {} (default)'.format(platname)
+        else:
+            s = 'Selected OpenCL platform: {}'.format(platname)
+    prtlog(gpu, s)
+    if gpu.ptbl is None:
+        prtlog(gpu, 'One PT for all joins: No')
+    else:
+        prtlog(gpu, 'One PT for all joins: Yes — {}'.format(gpu.ptbl))
+    if gpu.sets is allsets:
+        prtlog(gpu, 'Join sets: All')
+    else:
+        prtlog(gpu, 'Join sets: {}'.format(gpu.sets))
+    prtlog(gpu, 'Join engine(s): {}'.format(', '.join(sorted(gpu.engines))))
+    for knl in gpu.knls:
+        lclsz, fptblks, tuned, _ = gpu.knlcfg[knl]
+        s = 'Kernel {} ({}): work-group size {}'.format(knl,
+                kernels[knl]['fn'], lclsz[0]*lclsz[1])
+        if kernels[knl]['engine'] == 'fprint':
+            s += ', fingerprint tile {} blocks'.format(fptblks)
+        prtlog(gpu, s, ' (tuned)' if tuned and not gpu.tune else '')
+    if gpu.chunksz is not None:
+        prtlog(gpu, 'Streaming LPT in chunks of {} rows'.format(gpu.chunksz))
+    if gpu.mode != 'left':
+        prtlog(gpu, 'Join result mode: {}'.format(gpu.mode))
+    prtlog(gpu, 'Scheduled GPU iterations per set: {}'.format(gpu.runs))
+
+
+    return gpu
+#------------------------------------------------------------------------------
+# load_tables(gpu)
+#   Creates the the tables' structured ndarrays and loads them from CSV or NPY
+#   data files
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT
+#
+# Output:
+#   ndarray tuple: (lpt, pt, rt), where
+#      lpt: linkpage table array
+#      pt:  page table array
+#      rt:  reference linkpage table
+#------------------------------------------------------------------------------
+def load_tables(gpu):
+
+    tblset = gpu.tbldict[gpu.tblset]
+
+    # Print out simple header to stdout
+    s = '\nTable set: {}'.format(gpu.tblset)
+    prtlog(gpu, s, '\n{:—<{len}}'.format('', len=len(s)-1))
+
+    p = gpu.tblspath
+    sufx = '.npy' if gpu.usenpy else '.csv'
+
+    # Construct tables' pathnames
+    lptf, ptf, rtf = (p.joinpath(t).with_suffix(sufx) for t in tblset)
+
+    # If one PT is to be used for all JOINs, reset ptf to point to it
+    if gpu.ptbl:
+        ptf = p.joinpath(gpu.ptbl).with_suffix(sufx)
+
+    # Bytes copied to the device(s) for this set's join, and the set's phases
+    gpu.setbytes = 0
+    gpu.setphases, gpu.phases = {}, {}
+
+    # Tables that were read ahead while the previous set was joined
+    pre = take_prefetched(gpu)
+
+    # Load ndarrays from csv or npy files. An unchanged PT is mapped from its
+    # persistent index instead.
+    tblarrays = []
+    for f in lptf, ptf, rtf:
+        if f in pre:
+            prtlog(gpu, 'Reading {} (prefetched)'.format(f.name))
+            prtlog(gpu, pre['log'][f], oe='')
+            tblarrays.append(pre[f])
+            continue
+        prtlog(gpu, 'Reading {}'.format(f.name))
+        tm = time.perf_counter()
+
+        # In zero-copy mode, npy files are memory-mapped. LPT is mapped
+        # copy-on-write, since its id column receives the join output
+        mode = None
+        if gpu.zerocopy:
+            mode = 'c' if f is lptf else 'r'
+
+        if f is ptf and gpu.ptindex:
+            open_ptindex(gpu, f)
+            arr = get_ptindex(gpu, 'pt', lambda: read_table(gpu, f, mode))
+        else:
+            arr = read_table(gpu, f, mode)
+
+        trace_host(gpu, 'load', time.perf_counter() - tm, 'read ' + f.name)
+        tblarrays.append(arr)
+
+    # Init table pointers in gpu_struct and record current array sizes
+    #
+    gpu.lpt, gpu.pt, gpu.rt = tblarrays[0], tblarrays[1], tblarrays[2]
+
+    # Identity of this PT for its resident device copies: the index digest,
+    # or else the file's path, size and mtime
+    if gpu.ptidxdir is not None:
+        gpu.ptkey = gpu.ptidxdir.name
+    else:
+        st = ptf.stat()
+        gpu.ptkey = str(ptf.resolve()), st.st_size, st.st_mtime_ns
+
+    # Add the title-fingerprint columns for the engines that use them (and
+    # for the Bloom filter)
+    if gpu.engines.intersection(fpengines) or gpu.bloom:
+        tm = time.perf_counter()
+        gpu.lptfp = pre.get('lptfp')
+        if gpu.lptfp is None:
+            gpu.lptfp = fingerprint_titles(gpu.lpt)
+        gpu.ptfp = get_ptindex(gpu, 'ptfp',
+                lambda: fingerprint_titles(gpu.pt))
+        tm = time.perf_counter() - tm
+        trace_host(gpu, 'load', tm, 'fingerprint titles')
+        prtlog(gpu, 'Title fingerprints computed ({})'.format(tmstr(tm)))
+
+    # Dictionary-encoded copies of the tables for the dict engine, which
+    # joins codes in place of titles (see select_kernel()). If it is the only
+    # engine, the 64-byte title rows are dropped and only the 8-byte code
+    # rows are kept.
+    gpu.tbls = gpu.lpt, gpu.pt, gpu.rt
+    if 'dict' in gpu.engines:
+        tm = time.perf_counter()
+        gpu.codetbls = tuple(encode_titles(gpu, t) for t in gpu.tbls)
+        save_title_dict(gpu)
+        if gpu.engines == {'dict'}:
+            gpu.tbls = gpu.codetbls
+            gpu.lpt, gpu.pt, gpu.rt = gpu.tbls
+        tm = time.perf_counter() - tm
+        trace_host(gpu, 'load', tm, 'encode titles')
+        prtlog(gpu, 'Titles dictionary-encoded ({}); dictionary size: {}'
+                .format(tmstr(tm), gpu.tdict.size))
+
+    # LPT's titles packed into a title arena for the arena engine
+    if 'arena' in gpu.engines:
+        tm = time.perf_counter()
+        gpu.lparena, gpu.lpoff = title_arena(gpu.lpt)
+        tm = time.perf_counter() - tm
+        trace_host(gpu, 'load', tm, 'pack title arena')
+        prtlog(gpu, 'LPT title arena packed ({}): {} bytes, {:.1f} per title'
+                .format(tmstr(tm), gpu.lparena.size,
+                gpu.lparena.size/max(gpu.lpt.size, 1)))
+
+    # The distinct LPT titles for --dedup: the first row of each, and the
+    # index of every row's title among them (by title code if the titles
+    # were dropped)
+    if gpu.dedup:
+        tm = time.perf_counter()
+        col = 'title' if 'title' in gpu.lpt.dtype.names else 'code'
+        _, gpu.lptfirst, gpu.lptinv = np.unique(gpu.lpt[col],
+                return_index=True, return_inverse=True)
+        tm = time.perf_counter() - tm
+        trace_host(gpu, 'load', tm, 'find distinct titles')
+        prtlog(gpu, 'LPT distinct titles: {} of {} rows ({})'
+                .format(gpu.lptfirst.size, gpu.lpt.size, tmstr(tm)))
+        gpu.lptuniq.append(gpu.lptfirst.size)
+
+    # If arena is the only engine, the 64-byte title rows are dropped: PT's
+    # arena is set up while its titles are still there, and only the page ids
+    # of the tables are kept, next to the title arenas
+    if gpu.engines == {'arena'}:
+        load_arena_pt(gpu)
+        gpu.tbls = tuple(id_rows(t) for t in gpu.tbls)
+        gpu.lpt, gpu.pt, gpu.rt = gpu.tbls
+
+    gpu.lptsz.append(gpu.lpt.size)
+    gpu.ptsz.append(gpu.pt.size)
+    gpu.setnbytes = sum(a.nbytes for a in tblarrays)
+
+#------------------------------------------------------------------------------
+# prefetch_sets(gpu, sets)
+#   Starts reading the tables of the next sets (in sets) in the background
+#   while the current one is joined, so that the device does not wait for
+#   the next set's I/O. Sets are read one at a time, in order, for as long
+#   as the estimated memory of the sets read ahead (but not yet joined) stays
+#   within gpu.pfbudget (option --prefetch). A set's memory is estimated from
+#   the current set's, in proportion to their sizes (set_size()).
+#
+#   LPT and RT are read, and PT too unless it comes from the persistent PT
+#   index (which maps it); LPT's fingerprints are computed if an engine needs
+#   them. Everything that depends on the run's state (the PT index, the title
+#   dictionary, the device) is left to load_tables() and the join.
+#------------------------------------------------------------------------------
+def prefetch_sets(gpu, sets):
+
+    if gpu.pfex is None:
+        return
+
+    inflight = sum(est for _, est in gpu.pf.values())
+    for tblset in sets:
+        if tblset in gpu.pf:
+            continue
+        est = gpu.setnbytes * set_size(tblset) // set_size(gpu.tblset)
+        if inflight + est > gpu.pfbudget:
+            break
+        gpu.pf[tblset] = gpu.pfex.submit(read_set, gpu, tblset), est
+        inflight += est
+
+#------------------------------------------------------------------------------
+# read_set(gpu, tblset)
+#   Reads a set's tables for prefetch_sets(), in the background thread. The
+#   messages of read_table() are kept with the arrays, for load_tables() to
+#   log when it takes them. Returns None if a file is missing or can't be
+#   read; load_tables() then reads the set itself and reports the error. It
+#   also returns None, before its next file, once the run has set
+#   gpu.pfstop. SystemExit and KeyboardInterrupt are not caught; they are
+#   raised again in the main thread by take_prefetched().
+#
+# Output:
+#   pre: dict of the arrays, keyed by file Path, plus 'log' (their messages),
+#        'lptfp' (LPT's fingerprints, or None), and 'trace' (the reads'
+#        (name, start, duration) for the timeline)
+#------------------------------------------------------------------------------
+def read_set(gpu, tblset):
+
+    sufx = '.npy' if gpu.usenpy else '.csv'
+    lpt, pt, rt = gpu.tbldict[tblset]
+    if gpu.ptbl:
+        pt = gpu.ptbl
+    files = [gpu.tblspath.joinpath(t).with_suffix(sufx) for t in (lpt, pt, rt)]
+    if gpu.ptindex:
+        del files[1]
+
+    # read_table() logs through this stand-in for gpu
+    wrk = GPUJOIN_STRUCT()
+    wrk.mknpy, wrk.verbose = gpu.mknpy, False
+
+    pre = {'log': {}, 'lptfp': None, 'trace': []}
+    try:
+        if not all(f.exists() for f in files):
+            return None
+        for f in files:
+            if gpu.pfstop.is_set():
+                return None
+            wrk.logfile = io.StringIO()
+            tm = time.perf_counter()
+            pre[f] = read_table(wrk, f)
+            pre['trace'].append(('read ' + f.name, tm,
+                                 time.perf_counter() - tm))
+            pre['log'][f] = wrk.logfile.getvalue()
+        if gpu.engines.intersection(fpengines) or gpu.bloom:
+            tm = time.perf_counter()
+            pre['lptfp'] = fingerprint_titles(pre[files[0]])
+            pre['trace'].append(('fingerprint titles', tm,
+                                 time.perf_counter() - tm))
+    except (SystemExit, KeyboardInterrupt):
+        # Not errors of the read: take_prefetched() gets them
+        raise
+    except Exception:
+        return None
+
+    return pre
+
+#------------------------------------------------------------------------------
+# take_prefetched(gpu)
+#   Returns the prefetched tables of the current set (see read_set()), after
+#   waiting for them if they are still being read, or {} if the set was not
+#   prefetched. The wait is the set's load time; the background reads are
+#   added to the timeline on a thread of their own.
+#------------------------------------------------------------------------------
+def take_prefetched(gpu):
+
+    if gpu.tblset not in gpu.pf:
+        return {}
+
+    tm = time.perf_counter()
+    fut, _ = gpu.pf.pop(gpu.tblset)
+    try:
+        pre = fut.result()
+    except SystemExit:
+        # read_table() gave up on a file and has said why
+        exit_prog(gpu)
+    if pre is None:
+        return {}
+    trace_host(gpu, 'load', time.perf_counter() - tm, 'wait for prefetch')
+
+    if gpu.tracef is not None:
+        for name, start, dur in pre['trace']:
+            rec = trace_rec(gpu, 'prefetch: ' + name, 'load', start, dur, 0,
+                    {})
+            rec['tid'] = 1
+            gpu.trace.append(rec)
+    return pre
+
+#------------------------------------------------------------------------------
+# read_table(gpu, f, mmap_mode=None)
+#   Loads a table's structured ndarray from a CSV or NPY file. With the -m
+#   option, an array loaded from CSV is also dumped to an NPY file.
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT
+#   f: Path of the table file
+#   mmap_mode: if not None, an NPY file is memory-mapped in this mode ('r' or
+#              'c') instead of being read into memory
+#
+# Output:
+#   arr: ndarray of dtype [('id', 'u4'), ('title', 'S60')]
+#------------------------------------------------------------------------------
+def read_table(gpu, f, mmap_mode=None):
+
+    # Define structured array dtype
+    dt = np.dtype([('id', 'u4'), ('title', 'S60')])
+
+    if f.suffix == '.csv':
+        try:
+            tm = time.perf_counter()
+            with f.open(encoding='unicode_escape', mode='r') as fd:
+                arr = np.loadtxt(fd, dtype=dt)
+            tm = time.perf_counter() - tm
+            prtlog(gpu, '{} rows loaded ({})'.format(arr.size, tmstr(tm)))
+        except FileNotFoundError:
+            prtlog(gpu, "Error: load_tables(): file not found: {}"
+                    .format(f.resolve()), fd=sys.stderr)
+            exit_prog(gpu)
+        if gpu.mknpy:
+            np.save(str(f.with_suffix('.npy')), arr)
+
+    else:
+        # Load from npy file
+        tm = time.perf_counter()
+        try:
+            arr = np.load(str(f.with_suffix('.npy')), mmap_mode=mmap_mode)
+            tm = time.perf_counter() - tm
+            s = 'mapped' if mmap_mode else 'loaded'
+            prtlog(gpu, '{} rows {} ({})'.format(arr.size, s, tmstr(tm)))
+        except IOError:
+            prtlog(gpu, "Error: load_tables(): file not found: {}"
+                    .format(f.resolve()), fd=sys.stderr)
+            exit_prog(gpu)
+
+    return arr
+
+#------------------------------------------------------------------------------
+# open_ptindex(gpu, ptf)
+#   Selects the persistent index of a PT file. The index is a directory in
+#   'tables/ptindex' named after a content digest (BLAKE2b) of the file, so a
+#   PT file that is edited or regenerated gets a new index, and copies of the
+#   same PT (e.g., in the gen-pt*-sets.sh directories) share one. The digest
+#   of each file is memoized with its size and mtime in 'digests.json', so an
+#   unchanged file is not read again to compute it.
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT
+#   ptf: Path of the PT file
+#
+# Output:
+#   gpu.ptidxdir: Path of the index directory (created if needed)
+#------------------------------------------------------------------------------
+def open_ptindex(gpu, ptf):
+
+    try:
+        st = ptf.stat()
+    except FileNotFoundError:
+        prtlog(gpu, "Error: load_tables(): file not found: {}"
+                .format(ptf.resolve()), fd=sys.stderr)
+        exit_prog(gpu)
+
+    key = str(ptf.resolve())
+    memo = gpu.ptdigests.get(key)
+    if memo is not None and memo[:2] == [st.st_size, st.st_mtime_ns]:
+        digest = memo[2]
+    else:
+        tm = time.perf_counter()
+        h = hashlib.blake2b(digest_size=16)
+        with ptf.open('rb') as fd:
+            for chunk in iter(lambda: fd.read(1 << 24), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        tm = time.perf_counter() - tm
+        prtlog(gpu, 'PT digest computed ({})'.format(tmstr(tm)))
+
+        gpu.ptdigests[key] = [st.st_size, st.st_mtime_ns, digest]
+        gpu.tblspath.joinpath('ptindex').mkdir(exist_ok=True)
+        with gpu.tblspath.joinpath('ptindex/digests.json').open('w') as fd:
+            json.dump(gpu.ptdigests, fd, indent=1)
+
+    name = '{}.v{}'.format(digest, PTINDEX_VERSION)
+    gpu.ptidxdir = gpu.tblspath/'ptindex'/name
+    gpu.ptidxdir.mkdir(parents=True, exist_ok=True)
+
+#------------------------------------------------------------------------------
+# get_ptindex(gpu, name, build)
+#   Returns the PT index array 'name'. If the current PT index has the array,
+#   it is memory-mapped from its NPY file; otherwise it is built by calling
+#   build() and saved to the index. Without an index (-x option), the array is
+#   just built.
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT
+#   name: name of the index array, e.g., 'pt', 'ptfp', 'htbl' or 'spt'
+#   build: function that takes no arguments and returns the array
+#
+# Output:
+#   arr: ndarray (a read-only memmap if it came from the index)
+#------------------------------------------------------------------------------
+def get_ptindex(gpu, name, build):
+
+    if gpu.ptidxdir is None:
+        return build()
+
+    f = gpu.ptidxdir/(name + '.npy')
+    if f.exists():
+        tm = time.perf_counter()
+        arr = np.load(str(f), mmap_mode='r')
+        tm = time.perf_counter() - tm
+        prtlog(gpu, 'PT index: {} mapped ({})'.format(f.name, tmstr(tm)))
+        return arr
+
+    arr = build()
+
+    # Write to a temporary file first, so that an interrupted run can't leave
+    # a partial array in the index
+    tmpf = gpu.ptidxdir/(name + '.tmp.npy')
+    np.save(str(tmpf), arr)
+    tmpf.replace(f)
+    prtlog(gpu, 'PT index: {} saved'.format(f.name))
+
+    return arr
+
+#------------------------------------------------------------------------------
+# pad_rows(arr, mult)
+#   Returns arr padded with empty (zero) rows to a multiple of mult rows, or
+#   arr itself if its size is one already. The kernels join the rows of a
+#   work-group at a time, so the LPT rows they are given are padded to a
+#   multiple of the rows of a work-group; the padding rows are not read back.
+#------------------------------------------------------------------------------
+def pad_rows(arr, mult):
+
+    n = -(-arr.size // mult) * mult
+    if n == arr.size:
+        return arr
+
+    padded = np.zeros(n, dtype=arr.dtype)
+    padded[:arr.size] = arr
+
+    return padded
+
+#------------------------------------------------------------------------------
+# to_device(gpu, arr, allocator, cq=None)
+#   Creates a read-only device array with the contents of host array arr. In
+#   zero-copy mode (-z option), the device buffer is created over arr's own
+#   memory (CL_MEM_USE_HOST_PTR) rather than copied into a newly allocated one.
+#   Together with memory-mapped npy tables, the data then go from the page
+#   cache to the device without a copy owned by Python. On CPU and integrated
+#   devices the kernel reads the host memory directly; a discrete GPU's driver
+#   transfers it when the kernel needs it.
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT
+#   arr: contiguous ndarray (or memmap)
+#   allocator: allocator for the copy when not in zero-copy mode
+#   cq: command queue of the device to use (default: gpu.cq)
+#
+# Output:
+#   pyopencl.array.Array with arr's shape and dtype
+#   gpu.setbytes: incremented by arr's size
+#   The copy is added to the timeline (phase upload)
+#------------------------------------------------------------------------------
+def to_device(gpu, arr, allocator, cq=None):
+
+    cq = gpu.cq if cq is None else cq
+    with gpu.uplock:
+        gpu.setbytes += arr.nbytes
+    if not gpu.zerocopy:
+        d_arr = cl.array.empty(cq, arr.shape, arr.dtype, allocator=allocator)
+        evt = cl.enqueue_copy(cq, d_arr.data, arr)
+        trace_event(gpu, 'upload', evt, cq, arr.nbytes)
+        return d_arr
+
+    mf = cl.mem_flags.READ_ONLY | cl.mem_flags.USE_HOST_PTR
+    buf = cl.Buffer(cq.context, mf, hostbuf=arr)
+    return cl.array.Array(cq, arr.shape, arr.dtype, data=buf)
+
+#------------------------------------------------------------------------------
+# to_device_resident(gpu, name, arr, owner=None)
+#   Returns the device copy of array arr, one of the arrays of the current PT
+#   (the PT itself, its fingerprints, hash table, etc.). The copies stay
+#   resident on the device, in the run's pool, for as long as later sets use
+#   the same PT (gpu.ptkey), e.g., with the -p option, so it is uploaded only
+#   once. The copies of a previous PT are dropped when the PT changes.
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT
+#   name: name of the array, e.g., 'pt' or 'ptfp'
+#   arr: host array to upload if it is not resident yet
+#   owner: OCLDEV_STRUCT of the device in multi-device mode (default: gpu)
+#
+# Output:
+#   pyopencl.array.Array
+#------------------------------------------------------------------------------
+def to_device_resident(gpu, name, arr, owner=None):
+
+    owner = gpu if owner is None else owner
+    if owner.resident.get('ptkey') != gpu.ptkey:
+        owner.resident = {'ptkey': gpu.ptkey}
+    if name not in owner.resident:
+        owner.resident[name] = to_device(gpu, arr, owner.rdpool, owner.cq)
+
+    return owner.resident[name]
+
+#------------------------------------------------------------------------------
+# def select_kernel(gpu):
+#   Makes gpu.knlkwd the current kernel: sets the engine, the work-group and
+#   tile sizes and the program built for it in init_gpujoin(), and the tables
+#   it joins (the dictionary-encoded copies for the dict engine). The count of
+#   bytes uploaded starts over for each kernel.
+#
+# Input:
+#  gpu: GPU data structure, with the set's tables loaded
+#------------------------------------------------------------------------------
+def select_kernel(gpu):
+
+    gpu.engine = kernels[gpu.knlkwd]['engine']
+    gpu.lclsz, gpu.fptblks, gpu.tuned, gpu.prg = gpu.knlcfg[gpu.knlkwd]
+    if gpu.engine == 'dict':
+        gpu.lpt, gpu.pt, gpu.rt = gpu.codetbls
+    else:
+        gpu.lpt, gpu.pt, gpu.rt = gpu.tbls
+    gpu.setbytes = 0
+    gpu.phases = {}
+
+    if len(gpu.knls) > 1:
+        prtlog(gpu, '\nKernel: {}'.format(gpu.knlkwd))
+
+#------------------------------------------------------------------------------
+# def local_mem(gpu):
+#   Returns the local memory the current kernel needs (see the kernels
+#   registry), or None if it needs none.
+#------------------------------------------------------------------------------
+def local_mem(gpu):
+
+    lmem = kernels[gpu.knlkwd]['lmem']
+    if lmem is None:
+        return None
+
+    return cl.LocalMemory(lmem(gpu.lclsz[0]*gpu.lclsz[1], gpu.fptblks))
+
+#------------------------------------------------------------------------------
+# def run_gpu(gpu):
+#   Launches the GPU kernel to join the set's tables. Compares the output LPT
+#   to the set's RT and returns a boolean indicating whether they are
+#   identical (True) or not (False). A PT that does not fit on the device
+#   with LPT is joined in partitions by join_pt_partitions(). With the --bloom
+#   option, only the LPT rows that pass bloom_prepass() are joined.
+#
+# Input:
+#  gpu: GPU data structure
+#
+# Output:
+#  equal: True if GPU output == reference, else False
+#  Other: This lists gputm[] and totaltm[] are appended with this set's
+#         execution times
+#------------------------------------------------------------------------------
+def run_gpu(gpu):
+
+    # Join only the distinct LPT titles (--dedup) that pass the Bloom
+    # filter (--bloom)
+    dedup = dedup_prepass(gpu)
+    full = bloom_prepass(gpu)
+
+    # Set global size: LPT's rows, padded to a multiple of the rows of a
+    # work-group
+    blksz = gpu.lclsz[0]*kernels[gpu.knlkwd]['wirows']
+    gpu.glbsz = -(-gpu.lpt.size // blksz) * blksz, 1
+
+    # PT is joined in partitions if it does not fit on the device with LPT
+    ptrows = pt_partition_rows(gpu)
+    nparts = -(-gpu.pt.size // ptrows)
+    if nparts > 1 and gpu.engine == 'hash':
+        emsg = 'PT does not fit on the device, and engine hash cannot'
+        emsg += ' partition it; use engine fprint'
+        prtlog(gpu, 'Error: run_gpu(): ', emsg, fd=sys.stderr)
+        exit_prog(gpu)
+
+    # Create device buffers in the run's pools. The previous set's LPT
+    # buffers are released first, so that the pool can reuse them; the PT
+    # buffers stay resident while the PT does not change.
+    mp = gpu.rdpool
+    gpu.d_lpt = gpu.d_lpfp = gpu.d_lpoff = gpu.d_lpid = None
+
+    # The dict engine needs only the LPT codes and the PT id of every code;
+    # the bsearch engine searches a copy of PT sorted by title
+    if gpu.engine == 'dict':
+        build_id_map(gpu)
+        lpt = np.ascontiguousarray(gpu.lpt['code'])
+        gpu.d_lpt = to_device(gpu, pad_rows(lpt, blksz), mp)
+        gpu.d_idmap = to_device(gpu, gpu.idmap, mp)
+    elif gpu.engine == 'bsearch':
+        gpu.spt = get_ptindex(gpu, 'spt', lambda: sort_pt(gpu))
+        gpu.d_lpt = to_device(gpu, pad_rows(gpu.lpt, blksz), mp)
+        if nparts == 1:
+            gpu.d_pt = to_device_resident(gpu, 'spt', gpu.spt)
+    elif gpu.engine == 'arena':
+        load_arena_pt(gpu)
+        arena, off = arena_rows(gpu.lparena, gpu.lpoff, 0, gpu.lpt.size,
+                gpu.glbsz[0])
+        gpu.d_lpt = to_device(gpu, arena, mp)
+        gpu.d_lpoff = to_device(gpu, off, mp)
+        gpu.d_pt = to_device_resident(gpu, 'ptarena', gpu.ptarena)
+        gpu.d_ptoff = to_device_resident(gpu, 'ptoff', gpu.ptoff)
+        gpu.d_ptid = to_device_resident(gpu, 'ptid', gpu.ptid)
+    else:
+        gpu.d_lpt = to_device(gpu, pad_rows(gpu.lpt, blksz), mp)
+        if nparts == 1:
+            gpu.d_pt = to_device_resident(gpu, 'pt', gpu.pt)
+
+    # Fingerprint columns
+    if gpu.engine in fpengines:
+        gpu.d_lpfp = to_device(gpu, pad_rows(gpu.lptfp, blksz), mp)
+        if nparts == 1:
+            gpu.d_ptfp = to_device_resident(gpu, 'ptfp', gpu.ptfp)
+
+    # The hash engine needs its slot table on the device as well
+    if gpu.engine == 'hash':
+        gpu.htbl = get_ptindex(gpu, 'htbl', lambda: build_hash_table(gpu))
+        gpu.d_htbl = to_device_resident(gpu, 'htbl', gpu.htbl)
+        gpu.hmask = np.uint32(gpu.htbl.size - 1)
+
+    gpu.d_lpid = cl.array.empty(gpu.cq, gpu.glbsz[0], dtype=np.uint32,
+            allocator=gpu.wrpool)
+
+    # Allocate shared memory, e.g., for a block of PT rows + 1 int (for
+    # matchcntr), or for a tile of PT fingerprints + 1 int
+    gpu.d_lmem = local_mem(gpu)
+
+    if nparts == 1:
+        prtlog(gpu, '\nBegin GPU processing')
+    else:
+        prtlog(gpu, '\nBegin GPU processing ({} PT partitions of {} rows)'
+                .format(nparts, ptrows))
+
+    # Launch the GPU kernel
+    ptsz = np.uint32(gpu.pt.size)
+    gputm, totaltm = 0.0, 0.0
+    for gpurun in range(gpu.runs):
+
+        # Record walltime start
+        tm = time.perf_counter()
+
+        if nparts == 1:
+            if not kernels[gpu.knlkwd]['zero']:
+                fill_zero(gpu, gpu.d_lpid, gpu.cq)
+            evt = enqueue_join(gpu, ptsz)
+            evt.wait()
+
+            # Read GPU output into id column of the host linkpage array
+            gpu.lpt['id'] = read_ids(gpu, gpu.d_lpid, gpu.cq)[:gpu.lpt.size]
+            ktm = 1e-9*(evt.profile.end - evt.profile.start)
+        else:
+            ktm = join_pt_partitions(gpu, ptrows)
+
+        # record times in sec
+        totaltm += time.perf_counter() - tm
+        tm = ktm
+        if gpu.runs > 1:
+            prtlog(gpu, 'run {} time: {}'.format(gpurun, tmstr(tm)))
+        gputm += tm
+
+        # There's little value in averaging times for large sets; skip
+        if set_size(gpu.tblset) > set_size('3M'):
+            prtlog(gpu, 'Running only once for this tblset')
+            gputm = gputm * gpu.runs
+            totaltm = totaltm * gpu.runs
+            break;
+
+    gputm = gputm/gpu.runs
+    totaltm = totaltm/gpu.runs
+    bloom_restore(gpu, full)
+    dedup_restore(gpu, dedup)
+
+    return record_join(gpu, gputm, totaltm, 'GPU')
+
+#------------------------------------------------------------------------------
+# def enqueue_join(gpu, ptsz, dev=None):
+#   Enqueues the current kernel (gpu.knlkwd) on the device buffers in gpu
+#   (d_lpt, d_pt, d_lpid, etc.) with global size gpu.glbsz, or on those of
+#   dev, an OCLDEV_STRUCT, in multi-device mode. The arguments are taken by
+#   name from the kernel's registry entry.
+#
+# Input:
+#  gpu: GPU data structure
+#  ptsz: number of PT rows in d_pt (np.uint32)
+#  dev: OCLDEV_STRUCT with the queue, program and buffers to use, if not gpu
+#
+# Output:
+#  evt: the kernel's event
+#------------------------------------------------------------------------------
+def enqueue_join(gpu, ptsz, dev=None):
+
+    # Buffers, queue and program are the device's in multi-device mode
+    dev = gpu if dev is None else dev
+    knl = kernels[gpu.knlkwd]
+
+    scalars = {'ptsz': ptsz, 'segoffset': np.uint32(0),
+               'nblks': np.uint32(knl['wirows'])}
+    args = []
+    for name in knl['args']:
+        if name in scalars:
+            args.append(scalars[name])
+        elif name == 'hmask':
+            args.append(dev.hmask)
+        elif name == 'lmem':
+            args.append(dev.d_lmem)
+        else:
+            args.append(getattr(dev, 'd_' + name).data)
+
+    # A work-item joins knl['wirows'] LPT rows. (A new kernel object for
+    # every launch, since devices may share a program across threads.)
+    glbsz = dev.glbsz[0] // knl['wirows'], 1
+    evt = cl.Kernel(dev.prg, knl['fn'])(dev.cq, glbsz, gpu.lclsz, *args)
+    trace_event(gpu, 'kernel', evt, dev.cq, name=knl['fn'])
+
+    return evt
+
+#------------------------------------------------------------------------------
+# def pt_partition_rows(gpu):
+#   Returns the number of PT rows that fit on the device next to LPT, its
+#   fingerprints and the output ids. A single buffer is limited to the
+#   device's max_mem_alloc_size, and all buffers together to its
+#   global_mem_size. The count is a multiple of the work-group size, and at
+#   least PT's size if all of PT fits. The --ptpart option overrides it.
+#
+# Input:
+#  gpu: GPU data structure
+#
+# Output:
+#  ptrows: rows per PT partition
+#------------------------------------------------------------------------------
+def pt_partition_rows(gpu):
+
+    # The dict engine has no PT on the device, and the arena engine's PT (a
+    # fraction of PT's size) is not partitioned
+    if gpu.engine in ('dict', 'arena'):
+        return max(gpu.pt.size, 1)
+
+    if gpu.ptpart is not None:
+        ptrows = gpu.ptpart
+    else:
+        dev = gpu.cq.device
+        rowsz = gpu.pt.itemsize
+        lptsz = gpu.lpt.nbytes + 4*gpu.lpt.size
+        if gpu.engine in fpengines:
+            rowsz += gpu.ptfp.itemsize
+            lptsz += gpu.lptfp.nbytes
+        if gpu.engine == 'hash':
+            rowsz += 4*4        # up to 4 uint32 slots per PT row
+        ptrows = min(dev.max_mem_alloc_size // gpu.pt.itemsize,
+                     (dev.global_mem_size - lptsz) // rowsz)
+
+    blksz = gpu.lclsz[0]
+    if ptrows >= gpu.pt.size:
+        return max(gpu.pt.size, 1)
+    if ptrows < blksz:
+        prtlog(gpu, 'Error: pt_partition_rows(): no room for PT on the device',
+                fd=sys.stderr)
+        exit_prog(gpu)
+
+    return ptrows // blksz * blksz
+
+#------------------------------------------------------------------------------
+# def join_pt_partitions(gpu, ptrows):
+#   Joins LPT with PT in several passes, one per partition of ptrows PT rows,
+#   for PTs that do not fit on the device. The first pass joins all of LPT
+#   with the first partition; every later pass joins only the LPT rows that
+#   are still unmatched, compacted into a new (smaller) LPT buffer, so passes
+#   get cheaper as rows are matched. Partitions are taken in PT order, so a
+#   title that occurs more than once in PT still gets the first one's id.
+#   Rows that no partition matches get an id of 0.
+#
+# Input:
+#  gpu: GPU data structure, with the LPT buffers of run_gpu()
+#  ptrows: rows per PT partition
+#
+# Output:
+#  ktm: sum of the passes' kernel times (sec)
+#  Other: the join output is written to the id column of gpu.lpt
+#------------------------------------------------------------------------------
+def join_pt_partitions(gpu, ptrows):
+
+    mp = gpu.rdpool
+    pt = gpu.spt if gpu.engine == 'bsearch' else gpu.pt
+    blksz = gpu.lclsz[0]*kernels[gpu.knlkwd]['wirows']
+
+    lpid = np.zeros(gpu.lpt.size, dtype=np.uint32)
+    rows = np.arange(gpu.lpt.size)
+    d_lpt, d_lpfp = gpu.d_lpt, getattr(gpu, 'd_lpfp', None)
+    glbsz = gpu.glbsz
+    ktm = 0.0
+    for lo in range(0, pt.size, ptrows):
+        hi = min(lo + ptrows, pt.size)
+
+        # Carry only the unmatched rows into this pass, padded with empty rows
+        # to a multiple of the rows of a work-group
+        if lo > 0:
+            rows = rows[ids == 0]
+            if rows.size == 0:
+                break
+            lpt = pad_rows(gpu.lpt[rows], blksz)
+            gpu.d_lpt = to_device(gpu, lpt, mp)
+            if gpu.engine in fpengines:
+                lpfp = pad_rows(gpu.lptfp[rows], blksz)
+                gpu.d_lpfp = to_device(gpu, lpfp, mp)
+            gpu.glbsz = lpt.size, 1
+
+        # Swap in this pass's PT partition
+        gpu.d_pt = gpu.d_ptfp = None
+        gpu.d_pt = to_device(gpu, pt[lo:hi], mp)
+        if gpu.engine in fpengines:
+            gpu.d_ptfp = to_device(gpu, gpu.ptfp[lo:hi], mp)
+
+        # Rows with no match in the partition must read back as 0
+        fill_zero(gpu, gpu.d_lpid, gpu.cq)
+        evt = enqueue_join(gpu, np.uint32(hi - lo))
+        evt.wait()
+        ktm += 1e-9*(evt.profile.end - evt.profile.start)
+
+        ids = read_ids(gpu, gpu.d_lpid, gpu.cq)[:rows.size]
+        lpid[rows] = ids
+        prtlog(gpu, 'PT rows {}-{}: {} of {} LPT rows matched'
+                .format(lo, hi - 1, np.count_nonzero(ids), rows.size))
+
+    # Restore the full-LPT buffers for the next run
+    gpu.d_lpt, gpu.d_lpfp = d_lpt, d_lpfp
+    gpu.glbsz = glbsz
+
+    gpu.lpt['id'] = lpid
+
+    return ktm
+
+#------------------------------------------------------------------------------
+# def run_gpu_stream(gpu):
+#   Streaming version of run_gpu() for the lmem engine (-s option). LPT is
+#   joined in chunks of gpu.chunksz rows by join_vecdata_LPTsegments, with
+#   two-chunk device buffers for LPT and the output ids. Three command queues
+#   form a pipeline: chunk k+1 is uploaded while chunk k is joined and the
+#   output of chunk k-1 is read back. Events order each chunk's upload, kernel
+#   and read-back, and the host reuses a buffer half only after the read-back
+#   of the chunk that last used it. Device memory is thus bounded by the chunk
+#   size; PT is resident as in run_gpu().
+#
+# Input:
+#  gpu: GPU data structure
+#
+# Output:
+#  equal: True if GPU output == reference, else False
+#  Other: gputm[] and totaltm[] are appended with this set's execution times.
+#         The GPU time is the sum of the chunks' kernel times, and the total
+#         time is the wall time of the pipeline, transfers included.
+#------------------------------------------------------------------------------
+def run_gpu_stream(gpu):
+
+    # Join only the distinct LPT titles (--dedup) that pass the Bloom
+    # filter (--bloom)
+    dedup = dedup_prepass(gpu)
+    full = bloom_prepass(gpu)
+
+    # Chunk size: a multiple of the work-group size, and no larger than LPT
+    blksz = gpu.lclsz[0]
+    nrows = gpu.lpt.size
+    chunk = -(-min(gpu.chunksz, nrows) // blksz) * blksz
+    nchunks = -(-nrows // chunk)
+
+    # PT is copied once (and stays resident); LPT and output ids get
+    # two-chunk buffers
+    gpu.d_pt = to_device_resident(gpu, 'pt', gpu.pt)
+    d_lpt = gpu.rdpool.allocate(2*chunk*gpu.lpt.itemsize)
+    d_lpid = gpu.wrpool.allocate(2*chunk*4)
+    h_lpid = np.empty((2, chunk), dtype=np.uint32)
+    d_lmem = cl.LocalMemory(gpu.pt.itemsize*gpu.lclsz[0]+4)
+
+    # Upload and read-back queues (the kernels run on gpu.cq)
+    props = cl.command_queue_properties.PROFILING_ENABLE
+    upq = cl.CommandQueue(gpu.ctx, properties=props)
+    downq = cl.CommandQueue(gpu.ctx, properties=props)
+    knl = cl.Kernel(gpu.prg, kernels[gpu.knlkwd]['fn'])
+
+    prtlog(gpu, '\nBegin GPU processing ({} chunks of {} rows)'
+            .format(nchunks, chunk))
+
+    ptsz = np.uint32(gpu.pt.size)
+    gputm, totaltm = 0.0, 0.0
+    for gpurun in range(gpu.runs):
+
+        # Record walltime start
+        tm = time.perf_counter()
+
+        # Wait for a chunk's read-back and copy its ids into LPT
+        evts = []
+        def drain(k):
+            lo, hi = k*chunk, min((k+1)*chunk, nrows)
+            evts[k][2].wait()
+            gpu.lpt['id'][lo:hi] = h_lpid[k % 2, :hi-lo]
+
+        for k in range(nchunks):
+            half = k % 2
+            lo, hi = k*chunk, min((k+1)*chunk, nrows)
+
+            # This half of the buffers is free once chunk k-2 is read back
+            if k >= 2:
+                drain(k-2)
+
+            up = cl.enqueue_copy(upq, d_lpt, gpu.lpt[lo:hi],
+                    dst_offset=half*chunk*gpu.lpt.itemsize, is_blocking=False)
+            gpu.setbytes += gpu.lpt[lo:hi].nbytes
+            glbsz = -(-(hi - lo) // blksz) * blksz, 1
+            kevt = knl(gpu.cq, glbsz, gpu.lclsz,
+                        d_lpt, np.uint32(half*chunk),
+                        gpu.d_pt.data, ptsz, d_lpid, d_lmem,
+                        wait_for=[up])
+            down = cl.enqueue_copy(downq, h_lpid[half, :hi-lo], d_lpid,
+                    src_offset=half*chunk*4, wait_for=[kevt],
+                    is_blocking=False)
+            evts.append((up, kevt, down))
+            for q in upq, gpu.cq, downq:
+                q.flush()
+
+        for k in range(max(nchunks-2, 0), nchunks):
+            drain(k)
+
+        # record times in sec
+        totaltm += time.perf_counter() - tm
+        uptm, tm, downtm = (sum(1e-9*(e.profile.end - e.profile.start)
+                                for e in es) for es in zip(*evts))
+        for k, (up, kevt, down) in enumerate(evts):
+            nb = (min((k+1)*chunk, nrows) - k*chunk)*gpu.lpt.itemsize
+            trace_event(gpu, 'upload', up, upq, nb)
+            trace_event(gpu, 'kernel', kevt, gpu.cq,
+                    name='join_vecdata_LPTsegments')
+            trace_event(gpu, 'readback', down, downq, nb//gpu.lpt.itemsize*4)
+        prtlog(gpu, 'transfer times: {} up, {} down'
+                .format(tmstr(uptm), tmstr(downtm)))
+        if gpu.runs > 1:
+            prtlog(gpu, 'run {} time: {}'.format(gpurun, tmstr(tm)))
+        gputm += tm
+
+        # There's little value in averaging times for large sets; skip
+        if set_size(gpu.tblset) > set_size('3M'):
+            prtlog(gpu, 'Running only once for this tblset')
+            gputm = gputm * gpu.runs
+            totaltm = totaltm * gpu.runs
+            break;
+
+    gputm = gputm/gpu.runs
+    totaltm = totaltm/gpu.runs
+    bloom_restore(gpu, full)
+    dedup_restore(gpu, dedup)
+
+    return record_join(gpu, gputm, totaltm, 'GPU')
+
+#------------------------------------------------------------------------------
+# def run_gpu_multi(gpu):
+#   Multi-device version of run_gpu() (-a option). Every device gets its own
+#   copy of the PT side of the join (PT, fingerprints, hash table, or code-to-
+#   id map), and LPT is split into chunks that the devices join in parallel,
+#   one host thread per device. Chunks go to the devices in contiguous ranges
+#   whose sizes are proportional to each device's throughput (rows/sec), as
+#   measured on the previous set or, for the first set, by a probe chunk per
+#   device. A device that has finished its range takes chunks from the end of
+#   the longest remaining range (work stealing), so a poor estimate costs
+#   little. Each chunk's ids are written to its rows of LPT, and a row with no
+#   match gets an id of 0, so the output does not depend on which device
+#   joined which chunk.
+#
+# Input:
+#  gpu: GPU data structure
+#
+# Output:
+#  equal: True if GPU output == reference, else False
+#  Other: gputm[] and totaltm[] are appended with this set's execution times.
+#         The GPU time is the largest sum of kernel times of any device, and
+#         the total time is the wall time of the join.
+#------------------------------------------------------------------------------
+def run_gpu_multi(gpu):
+
+    # Join only the distinct LPT titles (--dedup) that pass the Bloom
+    # filter (--bloom)
+    dedup = dedup_prepass(gpu)
+    full = bloom_prepass(gpu)
+
+    # Host-side structures of the engines, as in run_gpu()
+    lpt = gpu.lpt
+    if gpu.engine == 'dict':
+        build_id_map(gpu)
+        lpt = np.ascontiguousarray(gpu.lpt['code'])
+    elif gpu.engine == 'bsearch':
+        gpu.spt = get_ptindex(gpu, 'spt', lambda: sort_pt(gpu))
+    elif gpu.engine == 'hash':
+        gpu.htbl = get_ptindex(gpu, 'htbl', lambda: build_hash_table(gpu))
+    elif gpu.engine == 'arena':
+        load_arena_pt(gpu)
+
+    # Copy the PT side of the join to every device (once per PT)
+    for dev in gpu.devs:
+        if gpu.engine == 'dict':
+            dev.d_idmap = to_device(gpu, gpu.idmap, dev.rdpool, dev.cq)
+        elif gpu.engine == 'bsearch':
+            dev.d_pt = to_device_resident(gpu, 'spt', gpu.spt, dev)
+        elif gpu.engine == 'arena':
+            dev.d_pt = to_device_resident(gpu, 'ptarena', gpu.ptarena, dev)
+            dev.d_ptoff = to_device_resident(gpu, 'ptoff', gpu.ptoff, dev)
+            dev.d_ptid = to_device_resident(gpu, 'ptid', gpu.ptid, dev)
+        else:
+            dev.d_pt = to_device_resident(gpu, 'pt', gpu.pt, dev)
+        if gpu.engine in fpengines:
+            dev.d_ptfp = to_device_resident(gpu, 'ptfp', gpu.ptfp, dev)
+        if gpu.engine == 'hash':
+            dev.d_htbl = to_device_resident(gpu, 'htbl', gpu.htbl, dev)
+            dev.hmask = np.uint32(gpu.htbl.size - 1)
+        dev.d_lmem = local_mem(gpu)
+
+    # Chunk size: a multiple of the rows of a work-group
+    ndev = len(gpu.devs)
+    blksz = gpu.lclsz[0]*kernels[gpu.knlkwd]['wirows']
+    nrows = gpu.lpt.size
+    chunk = max(nrows // (MDEV_CHUNKS*ndev), MDEV_MINROWS)
+    chunk = -(-chunk // blksz) * blksz
+    nchunks = -(-nrows // chunk)
+
+    prtlog(gpu, '\nBegin GPU processing ({} devices, {} chunks of {} rows)'
+            .format(ndev, nchunks, chunk))
+
+    # Join chunk k on device dev. The last chunk is padded to a multiple of
+    # the rows of a work-group.
+    ptsz = np.uint32(gpu.pt.size)
+    def join_chunk(dev, k):
+        tm = time.perf_counter()
+        lo, hi = k*chunk, min((k+1)*chunk, nrows)
+        npad = -(-(hi - lo) // blksz) * blksz
+        def rows(a):
+            return pad_rows(a[lo:hi], blksz)
+        if gpu.engine == 'arena':
+            arena, off = arena_rows(gpu.lparena, gpu.lpoff, lo, hi, npad)
+            dev.d_lpt = to_device(gpu, arena, dev.rdpool, dev.cq)
+            dev.d_lpoff = to_device(gpu, off, dev.rdpool, dev.cq)
+        else:
+            dev.d_lpt = to_device(gpu, rows(lpt), dev.rdpool, dev.cq)
+        if gpu.engine in fpengines:
+            dev.d_lpfp = to_device(gpu, rows(gpu.lptfp), dev.rdpool, dev.cq)
+        dev.d_lpid = cl.array.zeros(dev.cq, npad, np.uint32,
+                allocator=dev.wrpool)
+        dev.glbsz = npad, 1
+        evt = enqueue_join(gpu, ptsz, dev)
+        gpu.lpt['id'][lo:hi] = read_ids(gpu, dev.d_lpid, dev.cq)[:hi-lo]
+        dev.ktm += 1e-9*(evt.profile.end - evt.profile.start)
+        dev.busytm += time.perf_counter() - tm
+        dev.rows += hi - lo
+        dev.chunks += 1
+
+    gputm, totaltm = 0.0, 0.0
+    for gpurun in range(gpu.runs):
+
+        # Record walltime start
+        tm = time.perf_counter()
+
+        for dev in gpu.devs:
+            dev.ktm, dev.busytm = 0.0, 0.0
+            dev.rows, dev.chunks, dev.stolen = 0, 0, 0
+
+        with ThreadPoolExecutor(max_workers=ndev) as ex:
+
+            # Probe each device's throughput with a chunk if it is not known
+            first = 0
+            if gpu.devtput is None:
+                first = min(ndev, nchunks)
+                list(ex.map(join_chunk, gpu.devs[:first], range(first)))
+                gpu.devtput = [dev.rows/dev.busytm if dev.busytm else 0.0
+                               for dev in gpu.devs]
+
+            # Split the other chunks in proportion to the throughputs (a
+            # device with no measure yet gets an average share)
+            w = np.array(gpu.devtput)
+            w[w == 0] = w.mean() if w.any() else 1.0
+            ends = first + np.rint((nchunks - first) * np.cumsum(w)/w.sum())
+            starts = np.r_[first, ends[:-1]]
+            ranges = [deque(range(int(lo), int(hi)))
+                      for lo, hi in zip(starts, ends)]
+            lock = threading.Lock()
+
+            # Each device joins its own range front to back, then steals from
+            # the back of the longest range left
+            def worker(i):
+                dev = gpu.devs[i]
+                while True:
+                    with lock:
+                        if ranges[i]:
+                            k = ranges[i].popleft()
+                        else:
+                            j = max(range(ndev), key=lambda j: len(ranges[j]))
+                            if not ranges[j]:
+                                return
+                            k = ranges[j].pop()
+                            dev.stolen += 1
+                    join_chunk(dev, k)
+
+            list(ex.map(worker, range(ndev)))
+
+        # record times in sec
+        totaltm += time.perf_counter() - tm
+        tm = max(dev.ktm for dev in gpu.devs)
+        for i, dev in enumerate(gpu.devs):
+            prtlog(gpu, 'device {} ({}): {} rows, {} chunks ({} stolen), '
+                    'kernel time {}'.format(i, dev.name, dev.rows, dev.chunks,
+                    dev.stolen, tmstr(dev.ktm)))
+        if gpu.runs > 1:
+            prtlog(gpu, 'run {} time: {}'.format(gpurun, tmstr(tm)))
+        gputm += tm
+
+        # Keep the measured throughputs for the next split
+        gpu.devtput = [dev.rows/dev.busytm if dev.busytm else tput
+                       for dev, tput in zip(gpu.devs, gpu.devtput)]
+
+        # There's little value in averaging times for large sets; skip
+        if set_size(gpu.tblset) > set_size('3M'):
+            prtlog(gpu, 'Running only once for this tblset')
+            gputm = gputm * gpu.runs
+            totaltm = totaltm * gpu.runs
+            break;
+
+    gputm = gputm/gpu.runs
+    totaltm = totaltm/gpu.runs
+    bloom_restore(gpu, full)
+    dedup_restore(gpu, dedup)
+
+    return record_join(gpu, gputm, totaltm, 'GPU')
+
+#------------------------------------------------------------------------------
+# def run_gpu_matches(gpu):
+#   Joins the set's tables in the join result mode of option --mode (other
+#   than 'left') with the bsearch engine's sorted PT. The kernel
+#   count_matches() finds the range of sorted PT rows that match each LPT row
+#   and sums the counts of each work-group. The exclusive prefix sum of the
+#   work-group sums gives the offset of every work-group's output and the
+#   total number of matches, for which the pairs buffer is allocated; in mode
+#   'inner', the kernel emit_pairs() then writes the (LPT row, PT row) pairs
+#   to it. The semi-join bitmask and the anti-join rows are taken from the
+#   counts. The work-group sums are few (one per BLKSIZE LPT rows), so their
+#   prefix sum is done on the host.
+#
+#   Every mode also fills the id column of LPT with the id of the first
+#   match, so that the join is verified against RT as in run_gpu(); the mode's
+#   own output is verified with match_reference(), and written to
+#   gpujoin-MODE-TBLSET.npy in the output directory.
+#
+# Input:
+#  gpu: GPU data structure
+#
+# Output:
+#  equal: True if both outputs == reference, else False
+#  Other: gputm[] and totaltm[] are appended with this set's execution times.
+#         The GPU time is that of both kernels.
+#------------------------------------------------------------------------------
+def run_gpu_matches(gpu):
+
+    # Global size: LPT's rows, padded to a multiple of the work-group size
+    blksz = gpu.lclsz[0]*gpu.lclsz[1]
+    gpu.glbsz = -(-gpu.lpt.size // blksz) * blksz, 1
+    nblks = gpu.glbsz[0] // blksz
+    if pt_partition_rows(gpu) < gpu.pt.size:
+        emsg = 'PT does not fit on the device, and option --mode cannot'
+        emsg += ' partition it'
+        prtlog(gpu, 'Error: run_gpu_matches(): ', emsg, fd=sys.stderr)
+        exit_prog(gpu)
+
+    # Sorted PT and the PT row of each of its rows stay on the device
+    gpu.spt = get_ptindex(gpu, 'spt', lambda: sort_pt(gpu))
+    gpu.d_pt = to_device_resident(gpu, 'spt', gpu.spt)
+    if gpu.mode == 'inner':
+        gpu.sptrow = get_ptindex(gpu, 'sptrow', lambda: sort_pt_rows(gpu))
+        gpu.d_sptrow = to_device_resident(gpu, 'sptrow', gpu.sptrow)
+
+    mp, wp = gpu.rdpool, gpu.wrpool
+    gpu.d_lpt = to_device(gpu, pad_rows(gpu.lpt, blksz), mp)
+    d_first = cl.array.empty(gpu.cq, gpu.glbsz[0], np.uint32, allocator=wp)
+    d_cnt = cl.array.empty(gpu.cq, gpu.glbsz[0], np.uint32, allocator=wp)
+    d_blkcnt = cl.array.empty(gpu.cq, nblks, np.uint32, allocator=wp)
+
+    prtlog(gpu, '\nBegin GPU processing ({} join)'.format(gpu.mode))
+
+    ptsz, lptsz = np.uint32(gpu.pt.size), np.uint32(gpu.lpt.size)
+    gputm, totaltm = 0.0, 0.0
+    for gpurun in range(gpu.runs):
+
+        # Record walltime start
+        tm = time.perf_counter()
+
+        # Count pass
+        evt = cl.Kernel(gpu.prg, 'count_matches')(gpu.cq, gpu.glbsz,
+                gpu.lclsz, gpu.d_lpt.data, gpu.d_pt.data, ptsz, lptsz,
+                d_first.data, d_cnt.data, d_blkcnt.data,
+                cl.LocalMemory(4))
+        trace_event(gpu, 'kernel', evt, gpu.cq, name='count_matches')
+        evt.wait()
+        ktm = 1e-9*(evt.profile.end - evt.profile.start)
+
+        # Offsets of the work-groups' outputs: the exclusive prefix sum of
+        # their counts
+        blkcnt = read_ids(gpu, d_blkcnt, gpu.cq)
+        blkoff = np.zeros(nblks, dtype=np.uint64)
+        np.cumsum(blkcnt[:-1], dtype=np.uint64, out=blkoff[1:])
+        total = int(blkoff[-1]) + int(blkcnt[-1])
+
+        first = read_ids(gpu, d_first, gpu.cq)[:gpu.lpt.size]
+        cnt = read_ids(gpu, d_cnt, gpu.cq)[:gpu.lpt.size]
+
+        # Emit pass, into a buffer of the total size
+        out = np.empty((0, 2), dtype=np.uint32)
+        if gpu.mode == 'inner' and total:
+            d_blkoff = to_device(gpu, blkoff, mp)
+            d_pairs = cl.array.empty(gpu.cq, (total, 2), np.uint32,
+                    allocator=wp)
+            evt = cl.Kernel(gpu.prg, 'emit_pairs')(gpu.cq, gpu.glbsz,
+                    gpu.lclsz, d_first.data, d_cnt.data, d_blkoff.data,
+                    gpu.d_sptrow.data, d_pairs.data,
+                    cl.LocalMemory(4*blksz))
+            trace_event(gpu, 'kernel', evt, gpu.cq, name='emit_pairs')
+            evt.wait()
+            ktm += 1e-9*(evt.profile.end - evt.profile.start)
+            out = read_ids(gpu, d_pairs, gpu.cq)
+            d_blkoff = d_pairs = None
+        elif gpu.mode == 'semi':
+            out = np.packbits(cnt > 0, bitorder='little')
+        elif gpu.mode == 'anti':
+            out = np.flatnonzero(cnt == 0).astype(np.uint32)
+
+        # Id of the first match of every LPT row
+        ids = gpu.spt['id'][np.minimum(first, max(gpu.pt.size, 1) - 1)]
+        gpu.lpt['id'] = np.where(cnt > 0, ids, 0)
+
+        # record times in sec
+        totaltm += time.perf_counter() - tm
+        if gpu.runs > 1:
+            prtlog(gpu, 'run {} time: {}'.format(gpurun, tmstr(ktm)))
+        gputm += ktm
+
+        # There's little value in averaging times for large sets; skip
+        if set_size(gpu.tblset) > set_size('3M'):
+            prtlog(gpu, 'Running only once for this tblset')
+            gputm = gputm * gpu.runs
+            totaltm = totaltm * gpu.runs
+            break;
+
+    gputm = gputm/gpu.runs
+    totaltm = totaltm/gpu.runs
+
+    f = output_path/'gpujoin-{}-{}.npy'.format(gpu.mode, gpu.tblset)
+    np.save(str(f), out)
+    s = {'inner': '{} pairs'.format(total),
+         'semi': '{} LPT rows with a match'.format(np.count_nonzero(cnt)),
+         'anti': '{} dangling links'.format(out.size)}[gpu.mode]
+    prtlog(gpu, ' {} join: {} (written to {})'.format(gpu.mode, s, f.name))
+
+    equal = record_join(gpu, gputm, totaltm, 'GPU')
+
+    # Verify the mode's output
+    tm = time.perf_counter()
+    ok = match_reference(gpu, out)
+    trace_host(gpu, 'verify', time.perf_counter() - tm)
+    prtlog(gpu, ' {} output == reference: {}'.format(gpu.mode, ok))
+
+    return equal and ok
+
+#------------------------------------------------------------------------------
+# def match_reference(gpu, out):
+#   Checks the output of run_gpu_matches() against the number of PT rows with
+#   each LPT title, counted on the host from PT's sorted titles: the pairs
+#   must join rows with equal titles, in LPT order, and number the count of
+#   each LPT row; the semi-join bitmask and the anti-join rows must be those
+#   of the LPT rows whose count is, or is not, 0.
+#------------------------------------------------------------------------------
+def match_reference(gpu, out):
+
+    titles = np.sort(gpu.pt['title'])
+    lptt = gpu.lpt['title']
+    cnt = (np.searchsorted(titles, lptt, 'right')
+           - np.searchsorted(titles, lptt, 'left'))
+
+    if gpu.mode == 'semi':
+        return np.array_equal(out, np.packbits(cnt > 0, bitorder='little'))
+    if gpu.mode == 'anti':
+        return np.array_equal(out, np.flatnonzero(cnt == 0))
+
+    lprow, prow = out[:, 0], out[:, 1]
+    return (out.shape[0] == cnt.sum()
+            and np.all(np.diff(lprow.astype(np.int64)) >= 0)
+            and np.array_equal(np.bincount(lprow, minlength=lptt.size), cnt)
+            and np.array_equal(gpu.pt['title'][prow], lptt[lprow]))
+
+#------------------------------------------------------------------------------
+# def run_cpu(gpu):
+#   Joins the set's tables on the host with a vectorized sort-merge join. PT is
+#   sorted by title (stably, so that the first of any duplicate titles sorts
+#   first), and every LPT title is then located in the sorted titles with a
+#   binary search (np.searchsorted). LPT rows with no match in PT get a page id
+#   of 0. As in run_gpu(), the output LPT is compared to the set's RT.
+#
+# Input:
+#  gpu: GPU data structure
+#
+# Output:
+#  equal: True if output == reference, else False
+#  Other: gputm[] and totaltm[] are appended with this set's execution times.
+#         For this engine, the "device" time is the host time of the sort and
+#         the search, and the total time adds the write of the ids to LPT.
+#------------------------------------------------------------------------------
+def run_cpu(gpu):
+
+    # Join only the distinct LPT titles (--dedup)
+    dedup = dedup_prepass(gpu)
+
+    prtlog(gpu, '\nBegin CPU processing')
+
+    gputm, totaltm = 0.0, 0.0
+    for cpurun in range(gpu.runs):
+
+        # Record walltime start
+        tm = time.perf_counter()
+
+        # Sort PT by title, then locate each LPT title in the sorted titles
+        order = np.argsort(gpu.pt['title'], kind='stable')
+        titles = gpu.pt['title'][order]
+        pos = np.searchsorted(titles, gpu.lpt['title'])
+        np.minimum(pos, titles.size - 1, out=pos)
+        hit = titles[pos] == gpu.lpt['title']
+        lpid = np.where(hit, gpu.pt['id'][order[pos]], 0)
+        jointm = time.perf_counter() - tm
+        trace_host(gpu, 'join', jointm, 'sort-merge join')
+
+        # Write the join output into id column of the host linkpage array
+        gpu.lpt['id'] = lpid
+
+        # record times in sec
+        totaltm += time.perf_counter() - tm
+        if gpu.runs > 1:
+            prtlog(gpu, 'run {} time: {}'.format(cpurun, tmstr(jointm)))
+        gputm += jointm
+
+    dedup_restore(gpu, dedup)
+
+    return record_join(gpu, gputm/gpu.runs, totaltm/gpu.runs, 'CPU')
+
+#------------------------------------------------------------------------------
+# def tune_kernel(gpu):
+#   Autotuner (--tune option). Times the kernel on a sample of the first
+#   table set with every work-group size in TUNE_LCLSZ that the device
+#   supports (and, for the fprint engine, every tile size in TUNE_FPTBLKS), and
+#   stores the fastest configuration whose output matches the reference in
+#   tune_fname, keyed by the device and the kernel. The sample is TUNE_ROWS
+#   random LPT rows; PT is used whole, so each configuration does the same
+#   work per row as a full join.
+#
+# Input:
+#  gpu: GPU data structure
+#
+# Output:
+#  rowsps: LPT rows per second of the fastest configuration
+#------------------------------------------------------------------------------
+def tune_kernel(gpu):
+
+    # Load the first set and draw the LPT sample (a multiple of the rows of
+    # the largest work-group, in table order). The sample is joined whole,
+    # even with --dedup.
+    gpu.dedup = False
+    gpu.tblset = gpu.sets[0]
+    load_tables(gpu)
+    select_kernel(gpu)
+    knl = kernels[gpu.knlkwd]
+    dev = gpu.cq.device
+    lclszs = [l for l in TUNE_LCLSZ if l <= dev.max_work_group_size
+              and l*knl['wirows'] <= gpu.lpt.size]
+    nrows = min(TUNE_ROWS, gpu.lpt.size)
+    nrows = nrows // (lclszs[-1]*knl['wirows']) * lclszs[-1]*knl['wirows']
+    rng = np.random.default_rng(0)
+    idx = np.sort(rng.choice(gpu.lpt.size, nrows, replace=False))
+    gpu.lpt, gpu.rt = gpu.lpt[idx], gpu.rt[idx]
+    if gpu.engine in fpengines:
+        gpu.lptfp = gpu.lptfp[idx]
+    if gpu.engine == 'arena':
+        gpu.lparena, gpu.lpoff = arena_select(gpu.lparena, gpu.lpoff, idx)
+
+    # Configurations whose local memory fits on the device
+    fptblks = TUNE_FPTBLKS if gpu.engine == 'fprint' else [gpu.fptblks]
+    configs = []
+    for l in lclszs:
+        for f in fptblks:
+            if knl['lmem'] is None or knl['lmem'](l, f) <= dev.local_mem_size:
+                configs.append((l, f))
+
+    prtlog(gpu, '\nTuning kernel {} on {} ({} LPT rows, {} configurations)'
+            .format(gpu.knlkwd, dev.name, nrows, len(configs)), fd=sys.stderr)
+
+    # Time every configuration. A configuration the device or its driver
+    # rejects (e.g., a work-group size above the kernel's limit) is skipped.
+    gpu.runs = max(gpu.runs, TUNE_RUNS)
+    t = prettytable.PrettyTable(['work-group size', 'tile blocks',
+            'device time', 'rows/sec', 'output == reference'])
+    best = None
+    for l, f in configs:
+        gpu.lclsz, gpu.fptblks = (l, 1), f
+        prtlog(gpu, '\nWork-group size {}, tile blocks {}'.format(l, f))
+        try:
+            gpu.prg = build_program(gpu, gpu.ctx, get_kernel(gpu))
+            equal = run_gpu(gpu)
+        except cl.Error as e:
+            prtlog(gpu, 'Skipped: {}'.format(e))
+            t.add_row([l, f, 'n/a', 'n/a', 'n/a'])
+            continue
+        tm = gpu.gputm.pop()
+        del gpu.totaltm[-1], gpu.upbytes[-1], gpu.phasestats[-1]
+        del gpu.bloomstats[-1]
+        t.add_row([l, f, tmstr(tm), round(nrows/tm), equal])
+        if equal and (best is None or tm < best[2]):
+            best = l, f, tm
+
+    # Print the results; override gpu.verbose to ensure they are always
+    # printed out to stdout as well as to logfile
+    verbose = gpu.verbose
+    gpu.verbose = True
+    t.align = 'r'
+    prtlog(gpu, '\nTuning results for {} ({}). All times in sec.'
+            .format(dev.name, dev.platform.name))
+    if gpu.engine != 'fprint':
+        t.del_column('tile blocks')
+    prtlog(gpu, t)
+    gpu.verbose = verbose
+
+    if best is None:
+        prtlog(gpu, 'Error: tune_kernel(): no configuration produced the',
+                ' reference output', fd=sys.stderr)
+        exit_prog(gpu)
+
+    # Store the winner (via a temporary file, so that a concurrent run never
+    # reads a partial one)
+    tuning = json.loads(tune_fname.read_text()) if tune_fname.exists() else {}
+    key = ' | '.join(device_key(dev))
+    tuning.setdefault(key, {})[gpu.knlkwd] = {
+            'lclsz': best[0], 'fptblks': best[1],
+            'rowsps': round(nrows/best[2]), 'tblset': gpu.tblset,
+            'date': time.ctime()}
+    tmp = tune_fname.with_suffix('.tmp')
+    tmp.write_text(json.dumps(tuning, indent=1))
+    tmp.replace(tune_fname)
+    s = '\nTuned: work-group size {}'.format(best[0])
+    if gpu.engine == 'fprint':
+        s += ', tile blocks {}'.format(best[1])
+    prtlog(gpu, s, ' (saved to {})'.format(tune_fname.name), fd=sys.stderr)
+
+    return round(nrows/best[2])
+
+#------------------------------------------------------------------------------
+# def tune_kernels(gpu):
+#   Tunes every kernel of the run (option -k, else the engine's kernel) with
+#   tune_kernel(), on the same LPT sample. With more than one kernel, the
+#   fastest of them (in rows per second, each in its best configuration) is
+#   stored in tune_fname as the device's 'best' kernel, which later runs on
+#   the device use when they select neither a kernel nor an engine (see
+#   load_best_kernel()).
+#
+# Input:
+#  gpu: GPU data structure
+#------------------------------------------------------------------------------
+def tune_kernels(gpu):
+
+    rowsps = {}
+    for gpu.knlkwd in gpu.knls:
+        rowsps[gpu.knlkwd] = tune_kernel(gpu)
+    if len(rowsps) == 1:
+        return
+
+    # Print the kernels from the fastest; override gpu.verbose to ensure they
+    # are always printed out to stdout as well as to logfile
+    dev = gpu.cq.device
+    t = prettytable.PrettyTable(['kernel', 'engine', 'rows/sec'])
+    for knl in sorted(rowsps, key=rowsps.get, reverse=True):
+        t.add_row([knl, kernels[knl]['engine'], rowsps[knl]])
+    verbose = gpu.verbose
+    gpu.verbose = True
+    t.align = 'r'
+    prtlog(gpu, '\nKernels on {} ({}), each in its best configuration'
+            .format(dev.name, dev.platform.name))
+    prtlog(gpu, t)
+    gpu.verbose = verbose
+
+    # Store the fastest kernel (via a temporary file, as in tune_kernel())
+    best = max(rowsps, key=rowsps.get)
+    tuning = json.loads(tune_fname.read_text())
+    key = ' | '.join(device_key(dev))
+    tuning[key]['best'] = {'kernel': best, 'rowsps': rowsps[best],
+            'kernels': sorted(rowsps), 'tblset': gpu.tblset,
+            'date': time.ctime()}
+    tmp = tune_fname.with_suffix('.tmp')
+    tmp.write_text(json.dumps(tuning, indent=1))
+    tmp.replace(tune_fname)
+    prtlog(gpu, '\nFastest kernel: {} (saved to {})'.format(best,
+            tune_fname.name), fd=sys.stderr)
+
+#------------------------------------------------------------------------------
+# def load_best_kernel(gpu):
+#   Returns the fastest kernel tune_kernels() stored for the device, or None
+#   if it has none.
+#
+# Input:
+#  gpu: GPU data structure with the OpenCL runtime initialized
+#------------------------------------------------------------------------------
+def load_best_kernel(gpu):
+
+    if not tune_fname.exists():
+        return None
+    with tune_fname.open('r') as fd:
+        tuning = json.load(fd)
+    key = ' | '.join(device_key(gpu.cq.device))
+    best = tuning.get(key, {}).get('best')
+    if best is None or best['kernel'] not in kernels:
+        return None
+
+    return best['kernel']
+
+#------------------------------------------------------------------------------
+# def load_tuning(gpu):
+#   Sets gpu.lclsz and gpu.fptblks to the values tune_kernel() stored for the
+#   device and the kernel gpu.knlkwd, if there are any, and gpu.tuned to True.
+#
+# Input:
+#  gpu: GPU data structure with the OpenCL runtime initialized
+#------------------------------------------------------------------------------
+def load_tuning(gpu):
+
+    if not tune_fname.exists():
+        return
+    with tune_fname.open('r') as fd:
+        tuning = json.load(fd)
+    key = ' | '.join(device_key(gpu.cq.device))
+    conf = tuning.get(key, {}).get(gpu.knlkwd)
+    if conf is not None:
+        gpu.lclsz, gpu.fptblks = (conf['lclsz'], 1), conf['fptblks']
+        gpu.tuned = True
+
+#------------------------------------------------------------------------------
+# def record_join(gpu, jointm, totaltm, dev):
+#   Prints and records the times of a set's join, and verifies the output LPT
+#   against the set's RT.
+#
+# Input:
+#  gpu: GPU data structure
+#  jointm, totaltm: the join's device and total times (averaged over runs)
+#  dev: name of the device the join ran on ('GPU' or 'CPU')
+#
+# Output:
+#  equal: True if output == reference, else False
+#------------------------------------------------------------------------------
+def record_join(gpu, jointm, totaltm, dev):
+
+    # Print JOIN times to output file and record them for final messaging
+    prtlog(gpu, 'Done!')
+    if gpu.runs == 1:
+        if dev == 'GPU':
+            prtlog(gpu, ' GPU (profiling) time: {}'.format(tmstr(jointm)))
+        else:
+            prtlog(gpu, ' {} time: {}'.format(dev, tmstr(jointm)))
+        prtlog(gpu, ' total ({}+Host) time: {}'.format(dev, tmstr(totaltm)))
+    else:
+        prtlog(gpu, ' avg. {} time: {}'.format(dev, tmstr(jointm)))
+        prtlog(gpu, ' avg. total time: {}'.format(tmstr(totaltm)))
+
+    # keep full precision here and do the rounding when printing results
+    gpu.gputm.append(jointm)
+    gpu.totaltm.append(totaltm)
+    gpu.upbytes.append(gpu.setbytes)
+    prtlog(gpu, ' bytes uploaded: {}'.format(gpu.setbytes))
+
+    # LPT rows the Bloom filter kept and dropped (--bloom), if it was used
+    gpu.bloomstats.append(gpu.bloomrows)
+    gpu.bloomrows = None
+
+    # Verify join output against reference table
+    tm = time.perf_counter()
+    equal = np.array_equal(gpu.lpt['id'], gpu.rt['id'])
+    trace_host(gpu, 'verify', time.perf_counter() - tm)
+    prtlog(gpu, ' output == reference: {}'.format((equal)))
+
+    # Keep the join's phases: the set's and its own
+    trace_resolve(gpu)
+    phases = dict(gpu.setphases, **gpu.phases)
+    gpu.phasestats.append({phase: phases[phase] for phase in TRACE_TIDS
+                           if phase in phases})
+    prtlog(gpu, ' phases: {}'.format(', '.join(
+            '{} {}{}'.format(phase, tmstr(tm), ' ({} GB/s)'.format(
+            round(nb/tm/1e9, 2)) if nb and tm else '')
+            for phase, (tm, nb) in gpu.phasestats[-1].items())))
+
+    return equal
+
+#------------------------------------------------------------------------------
+# def trace_host(gpu, phase, tm, name=None):
+#   Records a host phase of tm seconds that ends now: adds it to the phase
+#   times of the set (phase load) or of the current join (gpu.setphases or
+#   gpu.phases) and, with option --trace, to the run's timeline (gpu.trace).
+#------------------------------------------------------------------------------
+def trace_host(gpu, phase, tm, name=None):
+
+    add_phase(gpu, phase, tm, 0)
+    if gpu.tracef is not None:
+        end = time.perf_counter()
+        gpu.trace.append(trace_rec(gpu, name or phase, phase, end - tm, tm, 0,
+                {}))
+
+#------------------------------------------------------------------------------
+# def trace_event(gpu, phase, evt, cq, nbytes=0, name=None):
+#   Records an OpenCL command of the current join by its profiling event.
+#   The event's times can only be read once it is complete, so it is kept in
+#   gpu.pending until the join is recorded (see trace_resolve()).
+#------------------------------------------------------------------------------
+def trace_event(gpu, phase, evt, cq, nbytes=0, name=None):
+
+    gpu.pending.append((phase, name or phase, evt, cq, nbytes))
+
+#------------------------------------------------------------------------------
+# def trace_resolve(gpu):
+#   Adds the pending device events to the current join's phase times and
+#   bytes, and, with option --trace, to the timeline, on their device's track.
+#   Device timestamps are mapped to the host clock with the device's clock
+#   offset, taken once per device with a marker (the offset is the host time
+#   at which the marker is seen complete, less its device end time).
+#------------------------------------------------------------------------------
+def trace_resolve(gpu):
+
+    pending, gpu.pending = gpu.pending, []
+    for phase, name, evt, cq, nbytes in pending:
+        start, end = 1e-9*evt.profile.start, 1e-9*evt.profile.end
+        add_phase(gpu, phase, end - start, nbytes)
+        if gpu.tracef is None:
+            continue
+
+        key = cq.device.int_ptr
+        if key not in gpu.clkoff:
+            m = cl.enqueue_marker(cq)
+            m.wait()
+            off = time.perf_counter() - 1e-9*m.profile.end
+            gpu.clkoff[key] = off, len(gpu.clkoff) + 1, cq.device.name
+        off, pid, _ = gpu.clkoff[key]
+
+        args = {}
+        if nbytes:
+            args = {'bytes': nbytes, 'GB/s': round(nbytes/(end-start)/1e9, 3)
+                    if end > start else None}
+        gpu.trace.append(trace_rec(gpu, name, phase, start + off, end - start,
+                pid, args))
+
+#------------------------------------------------------------------------------
+# def add_phase(gpu, phase, tm, nbytes):
+#   Adds tm seconds and nbytes bytes to a phase of the set or current join.
+#------------------------------------------------------------------------------
+def add_phase(gpu, phase, tm, nbytes):
+
+    phases = gpu.setphases if phase == 'load' else gpu.phases
+    t, nb = phases.get(phase, (0.0, 0))
+    phases[phase] = [t + tm, nb + nbytes]
+
+#------------------------------------------------------------------------------
+# def trace_rec(gpu, name, phase, start, dur, pid, args):
+#   Returns a Chrome trace 'complete' event for a phase that started at host
+#   time start and lasted dur seconds, on process pid (0 is the host).
+#------------------------------------------------------------------------------
+def trace_rec(gpu, name, phase, start, dur, pid, args):
+
+    args = dict(args, set=gpu.tblset)
+    if phase != 'load' and gpu.engine != 'sort':
+        args['kernel'] = gpu.knlkwd
+    return {'name': name, 'cat': phase, 'ph': 'X', 'pid': pid,
+            'tid': TRACE_TIDS[phase] if pid else 0,
+            'ts': round((start - gpu.t0)*1e6, 3), 'dur': round(dur*1e6, 3),
+            'args': args}
+
+#------------------------------------------------------------------------------
+# def write_trace(gpu):
+#   Writes the run's timeline to gpu.tracef (option --trace) in the Chrome
+#   trace event format, which chrome://tracing and Perfetto display. The host
+#   and every device are processes, and a device's uploads, kernels and
+#   read-backs are threads of it.
+#------------------------------------------------------------------------------
+def write_trace(gpu):
+
+    meta = [{'name': 'process_name', 'ph': 'M', 'pid': 0,
+             'args': {'name': 'host'}},
+            {'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': 1,
+             'args': {'name': 'prefetch'}}]
+    for _, pid, name in gpu.clkoff.values():
+        meta.append({'name': 'process_name', 'ph': 'M', 'pid': pid,
+                     'args': {'name': 'device {}: {}'.format(pid, name)}})
+        for tname, tid in ('upload', 1), ('kernel', 2), ('readback', 3):
+            meta.append({'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                         'tid': tid, 'args': {'name': tname}})
+
+    with gpu.tracef.open('w') as fd:
+        json.dump({'traceEvents': meta + gpu.trace,
+                   'displayTimeUnit': 'ms'}, fd)
+    prtlog(gpu, 'Timeline written to {}'.format(gpu.tracef))
+
+#------------------------------------------------------------------------------
+# def fill_zero(gpu, d_ids, cq):
+#   Clears the output id buffer d_ids on queue cq (phase fill).
+#------------------------------------------------------------------------------
+def fill_zero(gpu, d_ids, cq):
+
+    evt = cl.enqueue_fill_buffer(cq, d_ids.data, np.uint32(0), 0,
+            d_ids.nbytes)
+    trace_event(gpu, 'fill', evt, cq)
+
+#------------------------------------------------------------------------------
+# def read_ids(gpu, d_ids, cq):
+#   Returns a host copy of the output id buffer d_ids, read on queue cq
+#   (phase readback).
+#------------------------------------------------------------------------------
+def read_ids(gpu, d_ids, cq):
+
+    ids = np.empty(d_ids.shape, dtype=np.uint32)
+    evt = cl.enqueue_copy(cq, ids, d_ids.data)
+    trace_event(gpu, 'readback', evt, cq, ids.nbytes)
+
+    return ids
+
+#------------------------------------------------------------------------------
+# title_words(tbl)
+#   Returns a (tbl.size, 15) uint32 view of the titles in a structured table
+#   array, i.e., the title words the kernels read as the last 15 elements of a
+#   64-byte row
+#------------------------------------------------------------------------------
+def title_words(tbl):
+
+    return tbl.view(np.uint32).reshape(tbl.size, -1)[:, 1:]
+
+#------------------------------------------------------------------------------
+# sort_pt_rows(gpu)
+#   Returns the PT rows in the order of the bsearch engine's sorted PT. Titles
+#   are ordered by their packed uint32 words, compared one word at a time from
+#   the first, which is the order the kernel join_sorted_bsearch() uses. The
+#   sort is stable, so among duplicate titles the one that comes first in PT
+#   also comes first in the sorted copy.
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT with gpu.pt loaded
+#
+# Output:
+#   sptrow: uint32 ndarray, the PT row of each sorted row
+#------------------------------------------------------------------------------
+def sort_pt_rows(gpu):
+
+    tm = time.perf_counter()
+
+    # np.lexsort() uses its last key as the primary one
+    words = title_words(gpu.pt)
+    sptrow = np.lexsort(words.T[::-1]).astype(np.uint32)
+
+    tm = time.perf_counter() - tm
+    trace_host(gpu, 'index', tm, 'sort PT')
+    prtlog(gpu, 'PT sorted by title ({})'.format(tmstr(tm)))
+
+    return sptrow
+
+#------------------------------------------------------------------------------
+# sort_pt(gpu)
+#   Returns PT sorted by title for the bsearch engine, in the order of
+#   sort_pt_rows(), which is kept in the PT index as 'sptrow'.
+#------------------------------------------------------------------------------
+def sort_pt(gpu):
+
+    return gpu.pt[get_ptindex(gpu, 'sptrow', lambda: sort_pt_rows(gpu))]
+
+#------------------------------------------------------------------------------
+# title_arena(tbl)
+#   Packs the titles of a structured table array into a title arena: their
+#   bytes, without the null padding of the S60 column, back to back in one
+#   uint8 array, and tbl.size+1 offsets into it, title i being the bytes
+#   arena[off[i]:off[i+1]] (its length is off[i+1] - off[i]). Most titles are
+#   far shorter than 60 bytes, so the arena is a fraction of the column's
+#   size. Rows are packed ARENA_CHUNK at a time, to bound the memory of the
+#   temporary per-byte masks.
+#
+# Input:
+#   tbl: ndarray of dtype [('id', 'u4'), ('title', 'S60')]
+#
+# Output:
+#   arena: uint8 ndarray of the titles' bytes
+#   off: uint32 ndarray of tbl.size+1 offsets into arena
+#------------------------------------------------------------------------------
+def title_arena(tbl):
+
+    b = tbl.view(np.uint8).reshape(tbl.size, -1)[:, 4:]
+    off = np.zeros(tbl.size + 1, dtype=np.uint32)
+    chunks = []
+    for lo in range(0, tbl.size, ARENA_CHUNK):
+        c = b[lo:lo+ARENA_CHUNK]
+
+        # A title's length: the position after its last non-null byte
+        nz = c != 0
+        lens = np.where(nz.any(axis=1),
+                        c.shape[1] - np.argmax(nz[:, ::-1], axis=1), 0)
+        chunks.append(c[np.arange(c.shape[1]) < lens[:, None]])
+        off[lo+1:lo+1+lens.size] = lens
+
+    np.cumsum(off, out=off)
+    arena = np.concatenate(chunks) if chunks else np.zeros(0, np.uint8)
+
+    return arena, off
+
+#------------------------------------------------------------------------------
+# arena_rows(arena, off, lo, hi, nrows)
+#   Returns the title arena and offsets of rows lo to hi-1 of a table packed
+#   by title_arena(), for a device buffer of nrows rows: the offsets start at
+#   the first row's title and are padded with empty titles to nrows+1.
+#------------------------------------------------------------------------------
+def arena_rows(arena, off, lo, hi, nrows):
+
+    rowoff = np.full(nrows + 1, off[hi] - off[lo], dtype=np.uint32)
+    rowoff[:hi-lo+1] = off[lo:hi+1] - off[lo]
+
+    return arena[off[lo]:off[hi]], rowoff
+
+#------------------------------------------------------------------------------
+# arena_select(arena, off, rows)
+#   Returns the title arena and offsets of the given rows (in their order) of
+#   a table packed by title_arena(), as title_arena() would pack them from the
+#   table's rows, without unpacking the titles to their S60 rows.
+#------------------------------------------------------------------------------
+def arena_select(arena, off, rows):
+
+    lens = (off[rows + 1] - off[rows]).astype(np.intp)
+    newoff = np.zeros(rows.size + 1, dtype=np.uint32)
+    np.cumsum(lens, out=newoff[1:])
+
+    # Byte j of the new arena is byte j - newoff[i] of title i, for the row i
+    # it falls in
+    idx = np.repeat(off[rows].astype(np.intp) - newoff[:-1], lens)
+    idx += np.arange(idx.size)
+
+    return arena[idx], newoff
+
+#------------------------------------------------------------------------------
+# arena_titles(arena, off, rows)
+#   Returns the titles of the given rows of a table packed by title_arena(),
+#   unpacked to an S60 array.
+#------------------------------------------------------------------------------
+def arena_titles(arena, off, rows):
+
+    sub, suboff = arena_select(arena, off, rows)
+    b = np.zeros((rows.size, 60), dtype=np.uint8)
+    b[np.arange(60) < np.diff(suboff)[:, None]] = sub
+
+    return b.view('S60').ravel()
+
+#------------------------------------------------------------------------------
+# id_rows(tbl)
+#   Returns a copy of a table's page ids, as a structured array of dtype
+#   [('id', 'u4')], for the arena-only runs that drop the title column.
+#------------------------------------------------------------------------------
+def id_rows(tbl):
+
+    ids = np.empty(tbl.size, dtype=[('id', 'u4')])
+    ids['id'] = tbl['id']
+
+    return ids
+
+#------------------------------------------------------------------------------
+# load_arena_pt(gpu)
+#   Sets up the PT side of the arena engine from the PT index (building and
+#   saving it if needed): gpu.ptarena and gpu.ptoff, the title arena of PT's
+#   rows sorted by title length and then by title bytes, and gpu.ptid, the
+#   page ids of the sorted rows. That is the order join_arena_bsearch()
+#   compares titles in, so that a title's length settles most compares. The
+#   sort is stable, so among duplicate titles the one that comes first in PT
+#   also comes first in the arena.
+#
+#   If PT's titles were dropped (arena-only runs), load_tables() has already
+#   set it up before dropping them, and nothing is done.
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT with gpu.pt loaded
+#------------------------------------------------------------------------------
+def load_arena_pt(gpu):
+
+    if 'title' not in gpu.pt.dtype.names:
+        return
+
+    built = {}
+    def build(name):
+        if not built:
+            tm = time.perf_counter()
+            lens = np.char.str_len(gpu.pt['title'])
+            order = np.argsort(gpu.pt['title'], kind='stable')
+            order = order[np.argsort(lens[order], kind='stable')]
+            spt = gpu.pt[order]
+            built['ptarena'], built['ptoff'] = title_arena(spt)
+            built['ptid'] = np.ascontiguousarray(spt['id'])
+            tm = time.perf_counter() - tm
+            trace_host(gpu, 'index', tm, 'build PT title arena')
+            prtlog(gpu, 'PT title arena built ({}): {} bytes'
+                    .format(tmstr(tm), built['ptarena'].size))
+        return built[name]
+
+    gpu.ptarena = get_ptindex(gpu, 'ptarena', lambda: build('ptarena'))
+    gpu.ptoff = get_ptindex(gpu, 'ptoff', lambda: build('ptoff'))
+    gpu.ptid = get_ptindex(gpu, 'ptid', lambda: build('ptid'))
+
+#------------------------------------------------------------------------------
+# fingerprint_titles(tbl)
+#   Computes a 64-bit fingerprint of every title in a structured table array.
+#   The title is read as 15 uint32 words, folded with 64-bit FNV-1a and
+#   finalized with the MurmurHash3 64-bit mixer, so that every title byte
+#   reaches every fingerprint bit. Equal titles have equal fingerprints; two
+#   different titles have equal ones with a probability of about 2^-64, so the
+#   kernels compare fingerprints first and the full titles only on a hit.
+#
+# Input:
+#   tbl: ndarray of dtype [('id', 'u4'), ('title', 'S60')]
+#
+# Output:
+#   fp: uint64 ndarray of tbl.size fingerprints
+#------------------------------------------------------------------------------
+def fingerprint_titles(tbl):
+
+    words = title_words(tbl)
 
-    # Init tables path; terminate if it does not exist
-    #
-    gpu.tblspath = project_path/'tables'
-    if args.tdir is not None:
-        gpu.tblspath = Path(args.tdir[0])
-    if not gpu.tblspath.is_dir():
-        prtlog(gpu, 'Error: init_gpujoin(): no such directory: {}'
-                .format(gpu.tblspath), fd=sys.stderr)
-        exit_prog(gpu)
+    fp = np.full(tbl.size, 0xcbf29ce484222325, dtype=np.uint64)
+    for j in range(words.shape[1]):
+        fp ^= words[:, j]
+        fp *= np.uint64(0x100000001b3)
 
-    # Create list of table sets to be joined
-    if 'all' in args.tblset:
-        gpu.sets = allsets
-    else:
-        gpu.sets = sorted(args.tblset, key=lambda x: allsets.index(x))
+    fp ^= fp >> np.uint64(33)
+    fp *= np.uint64(0xff51afd7ed558ccd)
+    fp ^= fp >> np.uint64(33)
+    fp *= np.uint64(0xc4ceb9fe1a85ec53)
+    fp ^= fp >> np.uint64(33)
 
-    # Note: if a single page table to be used for all joins (-p option), make
-    # sure it is large enough for all the LPTs in the join sets; don't do the
-    # joins for which it is not. E.g., if cmdline is something like "gpujoin -p
-    # pt832K 208K 416K 832K 2M", then tblset 2M will be removed, since pt832K
-    # is not large enough to produce a full join with lpt2M.
-    gpu.ptbl = None
-    if args.ptbl is not None:
-        gpu.ptbl = args.ptbl[0]
-        ptidx = allsets.index(gpu.ptbl[2:])
-        ptlst = []
-        new =[]
-        for tblset in gpu.sets:
-            if allsets.index(tblset) <= ptidx:
-                new += [tblset]
-                ptlst += [gpu.ptbl]
-            else:
-                break
-        gpu.sets = new
-    else:
-        ptlst = [''.join(['pt', tblset]) for tblset in gpu.sets]
+    return fp
 
-    lptlst = [''.join(['lpt', tblset]) for tblset in gpu.sets]
-    rtlst = [''.join(['rt', tblset]) for tblset in gpu.sets]
-    gpu.tbldict = {}
-    for key, lpt, pt, rt in zip(gpu.sets, lptlst, ptlst, rtlst):
-        gpu.tbldict[key] = (lpt, pt, rt)
+#------------------------------------------------------------------------------
+# build_hash_table(gpu)
+#   Builds the open-addressing (linear probing) table used by the hash engine.
+#   The table has a power-of-2 number of slots, at least twice the PT size, and
+#   each slot holds the index of a PT row or HTEMPTY. A row's probe sequence
+#   starts at the slot given by the low-order bits of its title fingerprint.
+#
+#   Rows are inserted all at once, one probe step per pass: rows whose current
+#   slot is free claim it, lowest row index first, and all others move on to
+#   the next slot. Rows with equal titles therefore probe in lockstep, and the
+#   first of them in PT is always found first, which is the row the nested-loop
+#   kernels match.
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT with gpu.pt and gpu.ptfp loaded
+#
+# Output:
+#   htbl: uint32 ndarray of PT row indices
+#------------------------------------------------------------------------------
+def build_hash_table(gpu):
 
-    gpu.mknpy = args.mknpy
-    gpu.usenpy = args.usenpy
-    gpu.runs = 1 if args.runs is None else args.runs[0]
+    tm = time.perf_counter()
 
-    # Create lists to hold execution times, sizes of consumed tables, & errinfo
-    gpu.gputm, gpu.totaltm = [], []
-    gpu.lptsz, gpu.ptsz = [], []
-    gpu.errinfo = []
+    nslots = 1 << (2*gpu.pt.size - 1).bit_length()
+    mask = np.uint32(nslots - 1)
+    htbl = np.full(nslots, HTEMPTY, dtype=np.uint32)
 
-    # Development/test options.
-    gpu.lclsz = (16, 1) if args.dim is None else tuple(args.dim)
-    gpu.knlfname = project_path/'src/kernel.cl'
-    if args.kfn is not None:
-        gpu.knlfname = Path(args.kfn[0])
+    rows = np.arange(gpu.pt.size, dtype=np.uint32)
+    slots = gpu.ptfp.astype(np.uint32) & mask
+    while rows.size:
+        # Free slots go to the lowest-numbered row that probes them
+        free = np.flatnonzero(htbl[slots] == HTEMPTY)
+        _, first = np.unique(slots[free], return_index=True)
+        won = free[first]
+        htbl[slots[won]] = rows[won]
 
-    # Get kernel src, build OpenCL program, and dump ptx code to file.
-    #gpu.knlkwd = 'lmem' if args.knlkwd is None else args.knlkwd[0]
-    gpu.knlkwd = 'lmem'
-    knlstr = get_kernel(gpu)
-    gpu.prg = cl.Program(gpu.ctx, knlstr).build()
-    dump_ptx(gpu.prg)
+        # Advance the remaining rows to their next slot
+        left = np.ones(rows.size, dtype=bool)
+        left[won] = False
+        rows = rows[left]
+        slots = (slots[left] + np.uint32(1)) & mask
 
-    # Print out execution parameters for this run
-    #
-    # (OpenCL platform -- for some reason, the context properties list comes
-    # back empty, so use devices list instead.)
-    platname = gpu.ctx.devices[0].platform.name
-    if args.platname is None:
-        s = 'OpenCL platform: {} (default)'.format(platname)
-    else:
-        s = 'Selected OpenCL platform: {}'.format(platname)
-    prtlog(gpu, s)
-    if gpu.ptbl is None:
-        prtlog(gpu, 'One PT for all joins: No')
-    else:
-        prtlog(gpu, 'One PT for all joins: Yes — {}'.format(gpu.ptbl))
-    if gpu.sets is allsets:
-        prtlog(gpu, 'Join sets: All')
-    else:
-        prtlog(gpu, 'Join sets: {}'.format(gpu.sets))
-    prtlog(gpu, 'Scheduled GPU iterations per set: {}'.format(gpu.runs))
+    tm = time.perf_counter() - tm
+    trace_host(gpu, 'index', tm, 'build hash table')
+    prtlog(gpu, 'Hash table: {} slots built ({})'.format(nslots, tmstr(tm)))
 
+    return htbl
 
-    return gpu
 #------------------------------------------------------------------------------
-# load_tables(gpu)
-#   Creates the the tables' structured ndarrays and loads them from CSV or NPY
-#   data files
+# dedup_prepass(gpu)
+#   Pre-pass of the --dedup option. LPTs drawn from pagelinks repeat popular
+#   titles many times, and every copy pays for its own search of PT. Only the
+#   distinct titles are joined: the first LPT row of each title (found by
+#   load_tables()) takes the place of gpu.lpt, and of the other LPT arrays
+#   the engine joins (fingerprints, title arena), until dedup_restore().
 #
 # Input:
-#   gpu: GPUJOIN_STRUCT
+#   gpu: GPUJOIN_STRUCT, with the current kernel (or engine) selected
 #
 # Output:
-#   ndarray tuple: (lpt, pt, rt), where
-#      lpt: linkpage table array
-#      pt:  page table array
-#      rt:  reference linkpage table
+#   saved: dict of the set's LPT arrays that were replaced, by attribute name,
+#          or None without --dedup
 #------------------------------------------------------------------------------
-def load_tables(gpu):
-
-    tblset = gpu.tbldict[gpu.tblset]
+def dedup_prepass(gpu):
+
+    if not gpu.dedup:
+        return None
+
+    tm = time.perf_counter()
+    rows = gpu.lptfirst
+    names = ['lpt']
+    if gpu.engine in fpengines or gpu.bloom:
+        names.append('lptfp')
+    saved = {name: getattr(gpu, name) for name in names}
+    for name in names:
+        setattr(gpu, name, saved[name][rows])
+    if gpu.engine == 'arena':
+        saved['lparena'], saved['lpoff'] = gpu.lparena, gpu.lpoff
+        gpu.lparena, gpu.lpoff = arena_select(gpu.lparena, gpu.lpoff, rows)
+
+    trace_host(gpu, 'dedup', time.perf_counter() - tm, 'gather titles')
+    prtlog(gpu, 'Joining {} distinct titles of {} LPT rows (dedup ratio {})'
+            .format(rows.size, saved['lpt'].size,
+            round(saved['lpt'].size/max(rows.size, 1), 2)))
+
+    return saved
 
-    # Print out simple header to stdout
-    s = '\nTable set: {}'.format(gpu.tblset)
-    prtlog(gpu, s, '\n{:—<{len}}'.format('', len=len(s)-1))
+#------------------------------------------------------------------------------
+# dedup_restore(gpu, saved)
+#   Undoes dedup_prepass(): puts the set's LPT arrays back in gpu and
+#   scatters the ids of the distinct titles to all the LPT rows with each
+#   title.
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT, with the output of the join in gpu.lpt
+#   saved: the return value of dedup_prepass()
+#------------------------------------------------------------------------------
+def dedup_restore(gpu, saved):
 
-    p = gpu.tblspath
-    sufx = '.npy' if gpu.usenpy else '.csv'
+    if saved is None:
+        return
 
-    # Construct tables' pathnames
-    lptf, ptf, rtf = (p.joinpath(t).with_suffix(sufx) for t in tblset)
+    tm = time.perf_counter()
+    saved['lpt']['id'] = gpu.lpt['id'][gpu.lptinv]
+    for name, arr in saved.items():
+        setattr(gpu, name, arr)
+    trace_host(gpu, 'dedup', time.perf_counter() - tm, 'scatter ids')
 
-    # If one PT is to be used for all JOINs, reset ptf to point to it
-    if gpu.ptbl:
-        ptf = p.joinpath(gpu.ptbl).with_suffix(sufx)
+#------------------------------------------------------------------------------
+# bloom_hashes(fp)
+#   Returns the two 32-bit halves of title fingerprints fp from which a title's
+#   Bloom-filter bits are derived by double hashing: bit i (i = 0 ..
+#   BLOOM_HASHES-1) is (h1 + i*h2) modulo the filter's size. h2 is odd, so
+#   that the bits differ for any power-of-2 size.
+#------------------------------------------------------------------------------
+def bloom_hashes(fp):
 
-    # Define structured array dtype
-    dt = np.dtype([('id', 'u4'), ('title', 'S60')])
+    h1 = fp & np.uint64(0xFFFFFFFF)
+    h2 = (fp >> np.uint64(32)) | np.uint64(1)
 
-    # Load ndarrays from csv or npy files
-    tblarrays = []
-    for f in lptf, ptf, rtf:
-        prtlog(gpu, 'Reading {}'.format(f.name))
+    return h1, h2
 
-        if sufx == '.csv':
-            try:
-                with f.open(encoding='unicode_escape', mode='r') as fd:
-                    tm = time.clock()
-                    arr = np.loadtxt(fd, dtype=dt)
-                    tm = time.clock() - tm
-                    prtlog(gpu, '{} rows loaded ({})'.format(arr.size, tmstr(tm)))
-            except FileNotFoundError:
-                prtlog(gpu, "Error: load_tables(): file not found: {}"
-                        .format(f.resolve()), fd=sys.stderr)
-                exit_prog(gpu)
-            if gpu.mknpy:
-                np.save(str(f.with_suffix('.npy')), arr)
+#------------------------------------------------------------------------------
+# build_bloom_filter(gpu)
+#   Builds the Bloom filter of the --bloom pre-pass: a bit array of about
+#   BLOOM_BITS bits per PT row (a power of 2), in which every PT title sets
+#   BLOOM_HASHES bits (see bloom_hashes()).
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT with gpu.pt and gpu.ptfp loaded
+#
+# Output:
+#   bloom: uint8 ndarray of the filter's bits, 8 per byte, lowest bit first
+#------------------------------------------------------------------------------
+def build_bloom_filter(gpu):
 
-        else:
-            # Load from npy file
-            tm = time.clock()
-            try:
-                arr = np.load(str(f.with_suffix('.npy')))
-                tm = time.clock() - tm
-                prtlog(gpu, '{} rows loaded ({})'.format(arr.size, tmstr(tm)))
-            except IOError:
-                prtlog(gpu, "Error: load_tables(): file not found: {}"
-                        .format(f.resolve()), fd=sys.stderr)
-                exit_prog(gpu)
+    tm = time.perf_counter()
 
-        tblarrays.append(arr)
+    nbits = 1 << (BLOOM_BITS*max(gpu.pt.size, 1) - 1).bit_length()
+    mask = np.uint64(nbits - 1)
+    bits = np.zeros(nbits, dtype=bool)
+    h1, h2 = bloom_hashes(gpu.ptfp)
+    for i in range(BLOOM_HASHES):
+        bits[(h1 + np.uint64(i)*h2) & mask] = True
+    bloom = np.packbits(bits, bitorder='little')
 
-    # Init table pointers in gpu_struct and record current array sizes
-    #
-    gpu.lpt, gpu.pt, gpu.rt = tblarrays[0], tblarrays[1], tblarrays[2]
+    tm = time.perf_counter() - tm
+    trace_host(gpu, 'index', tm, 'build Bloom filter')
+    prtlog(gpu, 'Bloom filter: {} bits built ({})'.format(nbits, tmstr(tm)))
 
-    gpu.lptsz.append(gpu.lpt.size)
-    gpu.ptsz.append(gpu.pt.size)
+    return bloom
 
 #------------------------------------------------------------------------------
-# def run_gpu(gpu):
-#   Launches the GPU kernel to join the set's tables. Compares the output LPT
-#   to the set's RT and returns a boolean indicating whether they are
-#   identical (True) or not (False).
+# bloom_prepass(gpu)
+#   Semi-join pre-pass of the --bloom option, for the engines whose kernels
+#   scan PT (BLOOM_ENGINES). An LPT row with no match in PT (a red link) keeps
+#   its work-group scanning all of PT, the most expensive outcome of the join.
+#   The Bloom filter over PT's titles tells most of these rows apart on the
+#   host. Only the rows that pass it, i.e., that may have a match, are joined:
+#   they are compacted into a new LPT, padded with empty rows to a multiple of
+#   the rows of a work-group, that takes the place of gpu.lpt (and gpu.lptfp)
+#   until bloom_restore(). The filter has no false negatives, so every row it
+#   drops has no match in PT.
 #
 # Input:
-#  gpu: GPU data structure
+#   gpu: GPUJOIN_STRUCT, with the current kernel selected
 #
 # Output:
-#  equal: True if GPU output == reference, else False
-#  Other: This lists gputm[] and totaltm[] are appended with this set's
-#         execution times
+#   full: (lpt, lptfp, rows), the set's LPT and fingerprints and the LPT rows
+#         that gpu.lpt holds, or None if the pre-pass does not apply
 #------------------------------------------------------------------------------
-def run_gpu(gpu):
+def bloom_prepass(gpu):
+
+    if not gpu.bloom or gpu.engine not in BLOOM_ENGINES:
+        return None
+
+    bloom = get_ptindex(gpu, 'bloom', lambda: build_bloom_filter(gpu))
+
+    # Test the rows one hash at a time, keeping only those still in the
+    # running
+    tm = time.perf_counter()
+    mask = np.uint64(8*bloom.size - 1)
+    h1, h2 = bloom_hashes(gpu.lptfp)
+    rows = np.arange(gpu.lpt.size)
+    for i in range(BLOOM_HASHES):
+        pos = (h1[rows] + np.uint64(i)*h2[rows]) & mask
+        bit = (pos & np.uint64(7)).astype(np.uint8)
+        rows = rows[(bloom[pos >> np.uint64(3)] >> bit) & 1 != 0]
+
+    blksz = gpu.lclsz[0]*kernels[gpu.knlkwd]['wirows']
+    npad = max(-(-rows.size // blksz), 1) * blksz
+    lpt = np.zeros(npad, dtype=gpu.lpt.dtype)
+    lpt[:rows.size] = gpu.lpt[rows]
+    lptfp = np.zeros(npad, dtype=gpu.lptfp.dtype)
+    lptfp[:rows.size] = gpu.lptfp[rows]
+
+    full = gpu.lpt, gpu.lptfp, rows
+    gpu.lpt, gpu.lptfp = lpt, lptfp
+    gpu.bloomrows = [rows.size, full[0].size - rows.size]
+
+    tm = time.perf_counter() - tm
+    trace_host(gpu, 'filter', tm, 'Bloom filter')
+    prtlog(gpu, 'Bloom filter: {} of {} LPT rows may match, {} filtered out'
+            ' ({})'.format(rows.size, full[0].size, full[0].size - rows.size,
+            tmstr(tm)))
+
+    return full
 
-    # Set global size.
-    gpu.glbsz = gpu.lpt.size, 1
+#------------------------------------------------------------------------------
+# bloom_restore(gpu, full)
+#   Undoes bloom_prepass(): puts the set's LPT and fingerprints back in gpu
+#   and writes the join output of the compacted rows to their rows of LPT.
+#   The rows the filter dropped get an id of 0.
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT, with the output of the join in gpu.lpt
+#   full: the return value of bloom_prepass()
+#------------------------------------------------------------------------------
+def bloom_restore(gpu, full):
 
-    # Create device buffers
-    mf = cl.mem_flags.READ_ONLY
-    mp = cl.tools.MemoryPool(cl.tools.ImmediateAllocator(gpu.cq,
-            mem_flags=mf))
-    gpu.d_lpt = cl.array.to_device(gpu.cq, gpu.lpt, allocator=mp)
-    gpu.d_pt = cl.array.to_device(gpu.cq, gpu.pt, allocator=mp)
+    if full is None:
+        return
 
-    mf = cl.mem_flags.WRITE_ONLY
-    mp = cl.tools.MemoryPool(cl.tools.ImmediateAllocator(gpu.cq,
-            mem_flags=mf))
-    gpu.d_lpid = cl.array.empty(gpu.cq, gpu.lpt.size, dtype=np.uint32,
-            allocator=mp)
+    lpt, lptfp, rows = full
+    lpid = np.zeros(lpt.size, dtype=np.uint32)
+    lpid[rows] = gpu.lpt['id'][:rows.size]
+    lpt['id'] = lpid
+    gpu.lpt, gpu.lptfp = lpt, lptfp
 
-    # Allocate shared memory for 16 PT rows + 1 int (for matchcntr)
-    d_lmem = cl.LocalMemory(gpu.pt.itemsize*gpu.lclsz[0]+4)
+#------------------------------------------------------------------------------
+# load_title_dict(gpu)
+#   Loads the title dictionary of the dict engine from the tables directory,
+#   or creates an empty one. The dictionary maps each distinct title to a dense
+#   uint32 code: the title's position in the dictionary's 'titles' array.
+#   Titles are only ever appended, so a title keeps its code across runs, and
+#   all LPTs, PTs and RTs in the directory share one key space. The array
+#   'order' sorts the titles and is used to look them up.
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT with gpu.tblspath set
+#
+# Output:
+#   gpu.tdict, gpu.tdict_order: the dictionary's titles and their sort order
+#------------------------------------------------------------------------------
+def load_title_dict(gpu):
+
+    gpu.tdictf = gpu.tblspath/tdict_fname
+    if gpu.tdictf.exists():
+        with np.load(str(gpu.tdictf)) as npz:
+            gpu.tdict, gpu.tdict_order = npz['titles'], npz['order']
+        prtlog(gpu, 'Title dictionary: {} ({} titles)'
+                .format(gpu.tdictf.name, gpu.tdict.size))
+    else:
+        gpu.tdict = np.empty(0, dtype='S60')
+        gpu.tdict_order = np.empty(0, dtype=np.intp)
+    gpu.tdict_grown = False
 
-    prtlog(gpu, '\nBegin GPU processing')
+#------------------------------------------------------------------------------
+# save_title_dict(gpu)
+#   Writes the title dictionary back to the tables directory if titles were
+#   added to it. It is written to a temporary file first, so that an
+#   interrupted run can't leave a partial dictionary for the next one to load.
+#------------------------------------------------------------------------------
+def save_title_dict(gpu):
 
-    # Launch the GPU kernel
-    ptsz = np.uint32(gpu.pt.size)
-    gputm, totaltm = 0.0, 0.0
-    for gpurun in range(gpu.runs):
+    if gpu.tdict_grown:
+        tmpf = gpu.tdictf.with_suffix('.tmp.npz')
+        np.savez(str(tmpf), titles=gpu.tdict, order=gpu.tdict_order)
+        tmpf.replace(gpu.tdictf)
+        gpu.tdict_grown = False
 
-        # Record walltime start
-        tm = time.perf_counter()
+#------------------------------------------------------------------------------
+# encode_titles(gpu, tbl)
+#   Returns a copy of a table with each title replaced by its dictionary code.
+#   Titles that are not yet in the dictionary are appended to it first.
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT with the title dictionary loaded
+#   tbl: ndarray of dtype [('id', 'u4'), ('title', 'S60')]
+#
+# Output:
+#   ctbl: ndarray of dtype codedt, i.e., [('id', 'u4'), ('code', 'u4')]
+#------------------------------------------------------------------------------
+def encode_titles(gpu, tbl):
 
-        evt = gpu.prg.join_vecdata_lmem(
-                    gpu.cq, gpu.glbsz, gpu.lclsz,
-                    gpu.d_lpt.data, gpu.d_pt.data,
-                    ptsz, gpu.d_lpid.data, d_lmem)
-        evt.wait()
+    titles = tbl['title']
 
-        # Read GPU output into id column of the host linkpage array
-        gpu.lpt['id'] = gpu.d_lpid.get()
+    # Look up the titles in the sorted dictionary
+    stitles = gpu.tdict[gpu.tdict_order]
+    pos = np.searchsorted(stitles, titles)
+    found = np.zeros(titles.size, dtype=bool)
+    if stitles.size:
+        np.minimum(pos, stitles.size - 1, out=pos)
+        found = stitles[pos] == titles
 
-        # record times in sec
-        totaltm += time.perf_counter() - tm
-        tm = 1e-9*(evt.profile.end - evt.profile.start)
-        if gpu.runs > 1:
-            prtlog(gpu, 'run {} time: {}'.format(gpurun, tmstr(tm)))
-        gputm += tm
+    codes = np.empty(titles.size, dtype=np.uint32)
+    codes[found] = gpu.tdict_order[pos[found]]
 
-        # There's little value in averaging times for large sets; skip
-        if allsets.index(gpu.tblset) > allsets.index('3M'):
-            prtlog(gpu, 'Running only once for this tblset')
-            gputm = gputm * gpu.runs
-            totaltm = totaltm * gpu.runs
-            break;
+    # Append the new titles to the dictionary and give them the next codes
+    if not found.all():
+        new, inv = np.unique(titles[~found], return_inverse=True)
+        codes[~found] = gpu.tdict.size + inv
+        gpu.tdict = np.concatenate((gpu.tdict, new))
+        gpu.tdict_order = np.argsort(gpu.tdict, kind='stable')
+        gpu.tdict_grown = True
 
-    gputm = gputm/gpu.runs
-    totaltm = totaltm/gpu.runs
+    ctbl = np.empty(tbl.size, dtype=codedt)
+    ctbl['id'] = tbl['id']
+    ctbl['code'] = codes
 
-    # Print JOIN times to output file and record them for final messaging
-    prtlog(gpu, 'Done!')
-    if gpu.runs == 1:
-        prtlog(gpu, ' GPU (profiling) time: {}'.format(tmstr(gputm)))
-        prtlog(gpu, ' total (GPU+Host) time: {}'.format(tmstr(totaltm)))
-    else:
-        prtlog(gpu, ' avg. GPU time: {}'.format(tmstr(gputm)))
-        prtlog(gpu, ' avg. total time: {}'.format(tmstr(totaltm)))
+    return ctbl
 
-    # keep full precision here and do the rounding when printing results
-    gpu.gputm.append(gputm)
-    gpu.totaltm.append(totaltm)
+#------------------------------------------------------------------------------
+# build_id_map(gpu)
+#   Builds the dict engine's direct-address map from title code to PT page id.
+#   The map has one entry per dictionary code, set to the id of the first PT
+#   row with that code, or 0 if PT has no such row.
+#
+# Input:
+#   gpu: GPUJOIN_STRUCT with the dictionary-encoded gpu.pt loaded
+#
+# Output:
+#   gpu.idmap: uint32 ndarray of gpu.tdict.size page ids
+#------------------------------------------------------------------------------
+def build_id_map(gpu):
 
-    # Verify GPU output against reference table
-    equal = np.array_equal(gpu.lpt['id'], gpu.rt['id'])
-    prtlog(gpu, ' output == reference: {}'.format((equal)))
+    tm = time.perf_counter()
 
-    return equal
+    gpu.idmap = np.zeros(gpu.tdict.size, dtype=np.uint32)
+    codes, first = np.unique(gpu.pt['code'], return_index=True)
+    gpu.idmap[codes] = gpu.pt['id'][first]
+
+    tm = time.perf_counter() - tm
+    trace_host(gpu, 'index', tm, 'build code-to-id map')
+    prtlog(gpu, 'Code-to-id map built ({})'.format(tmstr(tm)))
 
 #------------------------------------------------------------------------------
 # get_kernel(gpu)
@@ -394,11 +2828,10 @@ def get_kernel(gpu):
     hdr, sep, code = krnlsrc.partition(sep);
 
     # Set up the "#define" statements. ROWLEN is '16' for the naive kernel and
-    # '4' for the vector-data kernels; BLKSIZE is 16; and M is the length of
-    # PT, as determined during loading from CSV
-    #rowlen = '16' if gpu.knlkwd == 'naive' else '4'
-    #kdefs = ['#define ROWLEN\t',  rowlen, 'U\n']
-    kdefs = ['#define ROWLEN\t4U\n']
+    # '4' for the vector-data kernels (see the kernels registry); BLKSIZE is
+    # the work-group size, 16 unless tuned
+    knl = kernels[gpu.knlkwd]
+    kdefs = ['#define ROWLEN\t', str(knl['rowlen']), 'U\n']
     kdefs += ['#define BLKSIZE\t', str(gpu.lclsz[0]*gpu.lclsz[1]), 'U\n']
 
     kdefs += ['\n']
@@ -408,20 +2841,23 @@ def get_kernel(gpu):
     kdefs += ['#define OCLFNS\t3\n']
     kdefs += ['#define LMEM\t4\n']
     kdefs += ['#define LPTSEGS\t\t5\n']
+    kdefs += ['#define HASH\t6\n']
+    kdefs += ['#define BSEARCH\t7\n']
+    kdefs += ['#define FPRINT\t8\n']
+    kdefs += ['#define DICT\t9\n']
+    kdefs += ['#define LWG\t\t10\n']
+    kdefs += ['#define ARENA\t11\n']
+
+    kdefs += ['\n']
+
+    kdefs += ['#define HTEMPTY\t0xFFFFFFFFU\n']
+    fptile = gpu.fptblks*gpu.lclsz[0]*gpu.lclsz[1]
+    kdefs += ['#define FPTILE\t', str(fptile), 'U\n']
 
     kdefs += ['\n']
 
-    #if gpu.knlkwd == 'lmem':
-    #    kdefs += ['#define KERNEL\tLMEM\n']
-    kdefs += ['#define KERNEL\tLMEM\n']
-    #elif gpu.knlkwd == 'lptsegs':
-    #    kdefs += ['#define KERNEL\tLPTSEGS\n']
-    #elif gpu.knlkwd == 'oclfns':
-    #    kdefs += ['#define KERNEL\tOCLFNS\n']
-    #elif gpu.knlkwd == 'xor':
-    #    kdefs += ['#define KERNEL\tXOR\n']
-    #elif gpu.knlkwd == 'naive':
-    #    kdefs += ['#define KERNEL\tNAIVE\n']
+    # Select the kernel
+    kdefs += ['#define KERNEL\t', knl['knl'], '\n']
 
     kdefs += ['\n']
 
@@ -434,11 +2870,80 @@ def get_kernel(gpu):
     khdr = ['/', 78*'*', '\n', '* Auto-generated kernel source\n']
     khdr += [78*'*', '/' ,'\n\n']
     ksrc = ''.join(khdr + kdefs) + sep + code
-    with project_path.joinpath('src/.kernel.generated.cl').open('w') as fd:
-        print(gpu, ksrc, file=fd)
-    #sys.exit(0)
 
     return ksrc
+
+#------------------------------------------------------------------------------
+# device_key(dev)
+#  Returns the strings that identify an OpenCL device and its driver: the
+#  device's name, vendor and version, the driver version, and the platform's
+#  name and version. They key the program cache and the tuning file.
+#------------------------------------------------------------------------------
+def device_key(dev):
+
+    return [dev.name, dev.vendor, dev.version, dev.driver_version,
+            dev.platform.name, dev.platform.version]
+
+#------------------------------------------------------------------------------
+# build_program(gpu, ctx, ksrc)
+#  Builds the OpenCL program from kernel source ksrc for the devices of ctx.
+#  Built binaries are cached in src/.clcache, one file per device, named after
+#  a digest (BLAKE2b) of the source, the device, its driver and platform
+#  versions, and the build options. When every device of ctx has a cached
+#  binary, the program is created from the binaries instead of being compiled.
+#  A binary that the driver rejects is rebuilt from source. Only a build from
+#  source writes the generated source to src/.kernel.generated.cl and dumps the
+#  ptx code.
+#
+# Inputs:
+#   gpu: GPUJOIN_STRUCT
+#   ctx: OpenCL context
+#   ksrc: kernel source string (from get_kernel())
+#
+# Outputs:
+#   prg: built OpenCL program
+#------------------------------------------------------------------------------
+def build_program(gpu, ctx, ksrc):
+
+    cachedir = project_path/'src/.clcache'
+
+    # Cache file of each device's binary
+    files = []
+    for dev in ctx.devices:
+        key = [ksrc] + device_key(dev) + [' '.join(CL_OPTIONS)]
+        h = hashlib.blake2b('\0'.join(key).encode(), digest_size=16)
+        files.append(cachedir/'{}.bin'.format(h.hexdigest()))
+
+    tm = time.perf_counter()
+    if all(f.exists() for f in files):
+        try:
+            binaries = [f.read_bytes() for f in files]
+            prg = cl.Program(ctx, ctx.devices, binaries)
+            prg = prg.build(options=CL_OPTIONS)
+            tm = time.perf_counter() - tm
+            prtlog(gpu, 'OpenCL program loaded from cache ({})'
+                    .format(tmstr(tm)))
+            return prg
+        except cl.Error:
+            prtlog(gpu, 'Cached OpenCL program rejected; rebuilding')
+
+    prg = cl.Program(ctx, ksrc).build(options=CL_OPTIONS)
+    tm = time.perf_counter() - tm
+    prtlog(gpu, 'OpenCL program built ({})'.format(tmstr(tm)))
+
+    # Save the binaries (via temporary files, so that a concurrent run never
+    # sees a partial one)
+    cachedir.mkdir(exist_ok=True)
+    for f, binary in zip(files, prg.binaries):
+        tmp = f.with_suffix('.tmp')
+        tmp.write_bytes(binary)
+        tmp.replace(f)
+
+    with project_path.joinpath('src/.kernel.generated.cl').open('w') as fd:
+        fd.write(ksrc)
+    dump_ptx(prg)
+
+    return prg
 #------------------------------------------------------------------------------
 # init_ocl_runtime(platname)
 #  Sets up OpenCL runtime (context & command queue)
@@ -447,10 +2952,38 @@ def get_kernel(gpu):
 #  gpu: GPUJOIN_STRUCT with platname initialized
 #
 # Return
-#   gpu.ctx & gpu.cq are set to the OpenCL context and command-queue values
+#   gpu.ctx & gpu.cq are set to the OpenCL context and command-queue values.
+#   In multi-device mode (-a), gpu.devs lists an OCLDEV_STRUCT per device.
 #------------------------------------------------------------------------------
 def init_ocl_runtime(gpu):
 
+    # Only the host engine can run without PyOpenCL
+    if cl is None:
+        emsg = 'pyopencl is not installed; use the host engine (-e sort)'
+        prtlog(gpu, 'Error: init_ocl_runtime(): ', emsg, fd=sys.stderr)
+        exit_prog(gpu)
+
+    # Multi-device mode: open every device of every platform, with one context
+    # per platform and one command queue per device. The first device stands
+    # in for gpu.ctx & gpu.cq.
+    if gpu.alldevs:
+        props = cl.command_queue_properties.PROFILING_ENABLE
+        gpu.devs = []
+        for platform in cl.get_platforms():
+            devices = platform.get_devices()
+            if not devices:
+                continue
+            ctx = cl.Context(devices)
+            for device in devices:
+                dev = OCLDEV_STRUCT()
+                dev.name, dev.platname = device.name, platform.name
+                dev.ctx = ctx
+                dev.cq = cl.CommandQueue(ctx, device, properties=props)
+                gpu.devs.append(dev)
+        gpu.ctx, gpu.cq = gpu.devs[0].ctx, gpu.devs[0].cq
+        gpu.devtput = None
+        return
+
     # Case 1: platname is a valid platform, probably 'NVIDIA CUDA', the default
     #
     if gpu.platname not in ['any', 'interactive']:
@@ -489,7 +3022,9 @@ def init_ocl_runtime(gpu):
 
 #------------------------------------------------------------------------------
 # dump_ptx()
-#   Dump ptx code in a file named './.gpu.ptx'
+#   Dump ptx code in a file named './.gpu.ptx'. (Other platforms' binaries,
+#   e.g., pocl's ELF objects, are not text; their bytes that are not UTF-8 are
+#   replaced.)
 #------------------------------------------------------------------------------
 def dump_ptx(oclprog):
 
@@ -497,11 +3032,15 @@ def dump_ptx(oclprog):
     ptx = oclprog.binaries
     f = project_path/'src/.gpu.ptx'
     with f.open(mode='w') as fd:
-        fd.write(''.join(ptx[0].decode('utf8')))
+        fd.write(''.join(ptx[0].decode('utf8', errors='replace')))
 
 #------------------------------------------------------------------------------
 # log_errors(gpu)
 #  This function writes the error rows in the GPU output a log file.
+#  The error rows are found with np.flatnonzero(), and at most gpu.maxerrs of
+#  them (option --errs) are formatted and written, in one block; if there are
+#  more, an evenly spaced sample of them is written. With option --errnpy,
+#  all the error rows are also saved, unformatted, to an npy file.
 #
 # Input:
 #   gpu: system data structure
@@ -510,6 +3049,8 @@ def dump_ptx(oclprog):
 #   gpu.errinfo[] is appended with errinfo = [tblset, num_errors]
 #   Error log file: the output errors are written to a file in the logs
 #                   directory, named after gpujoin-${currset}-errors.log
+#   Error npy file (--errnpy): gpujoin-errors-${currset}[-${kernel}].npy in
+#                   the output directory
 #------------------------------------------------------------------------------
 def log_errors(gpu):
 
@@ -520,27 +3061,55 @@ def log_errors(gpu):
         print('** {} error log — {}.'.format(prog_path.name, time.ctime()),
                 file=gpu.errfd)
 
-    # Init errinfo list for this set
+    # Init errinfo list for this set (and kernel, if there are several)
     errinfo = [gpu.tblset]
-
-    # Generate a boolean array of error locations in output LPT
-    neq = np.not_equal(gpu.lpt['id'], gpu.rt['id'])
-
-    # Create formatted list of the error rows
-    err_rows = [(n, gpu.rt['id'][n], gpu.lpt['id'][n], gpu.rt['title'][n])
-                for n in range(gpu.lpt.size) if neq[n]]
-
-    errinfo += [len(err_rows)]
-
-    print('\n\n# Table set {} errors\n'.format(gpu.tblset), file=gpu.errfd)
-    print('{:^8}  {:<9}  {:<9}  {:<8}'.format('row', 'ref pg_id',
-        'GPU pg_id', 'pg_title'), file=gpu.errfd)
-    print('--------  ---------  ---------  ---------'.format('  '),
-            file=gpu.errfd)
-
-    for row in err_rows[:len(err_rows)]:
-        print('{0[0]:>8}  {0[1]:<9}  {0[2]:<9}  {0[3]:<60}'.format(row),
-            file=gpu.errfd)
+    if len(gpu.knls) > 1:
+        errinfo = ['{} ({})'.format(gpu.tblset, gpu.knlkwd)]
+
+    # Get the row numbers of the errors in output LPT
+    errs = np.flatnonzero(gpu.lpt['id'] != gpu.rt['id'])
+    errinfo += [errs.size]
+
+    # Dictionary-encoded tables have codes in place of titles, and arena-only
+    # runs only LPT's title arena (RT's titles are LPT's)
+    def titles(rows):
+        if 'title' in gpu.rt.dtype.names:
+            return gpu.rt['title'][rows]
+        if 'code' in gpu.rt.dtype.names:
+            return gpu.tdict[gpu.rt['code'][rows]]
+        return arena_titles(gpu.lparena, gpu.lpoff, rows)
+
+    if gpu.errnpy:
+        f = ['gpujoin-errors-', gpu.tblset]
+        if len(gpu.knls) > 1:
+            f += ['-', gpu.knlkwd]
+        f = output_path/''.join(f + ['.npy'])
+        dt = np.dtype([('row', 'u8'), ('ref', 'u4'), ('out', 'u4'),
+                       ('title', 'S60')])
+        arr = np.empty(errs.size, dtype=dt)
+        arr['row'] = errs
+        arr['ref'] = gpu.rt['id'][errs]
+        arr['out'] = gpu.lpt['id'][errs]
+        arr['title'] = titles(errs)
+        np.save(str(f), arr)
+
+    # Cap the rows to format with an evenly spaced sample of them
+    rows = errs
+    if gpu.maxerrs and errs.size > gpu.maxerrs:
+        rows = errs[np.linspace(0, errs.size-1, gpu.maxerrs).astype(np.intp)]
+
+    s = ['\n\n# Table set {} errors\n'.format(errinfo[0])]
+    if rows.size < errs.size:
+        s += ['# {} of {} rows shown (--errs)\n'.format(rows.size, errs.size)]
+    s += ['{:^8}  {:<9}  {:<9}  {:<8}'.format('row', 'ref pg_id', 'GPU pg_id',
+          'pg_title')]
+    s += ['--------  ---------  ---------  ---------']
+    # The titles themselves (their UTF-8 bytes decoded), as the last column
+    fmt = '{:>8}  {:<9}  {:<9}  {}'.format
+    s += [fmt(*row) for row in zip(rows.tolist(),
+          gpu.rt['id'][rows].tolist(), gpu.lpt['id'][rows].tolist(),
+          [t.decode('utf-8', 'replace') for t in titles(rows).tolist()])]
+    gpu.errfd.write('\n'.join(s) + '\n')
 
     gpu.errinfo.append(errinfo)
 
@@ -559,14 +3128,10 @@ def record_display_results(gpu):
     if not gpu.errinfo:
         prtlog(gpu, '\nGPU table join(s) completed with no errors.')
 
-        # Write execution times to tms file(s) in output directory
-        p, cp = write_tmsfile(gpu)
-        if cp:
-            prtlog(gpu, 'Execution data written to {} & {} in output directory'
-                    .format(p.name, cp.name))
-        else:
-            prtlog(gpu, 'Execution data written to {} in output directory'
-                    .format(p.name))
+        # Append this run to the results store in output directory
+        n = write_results(gpu)
+        prtlog(gpu, 'Execution data appended to {} in output directory '
+                '(run {})'.format(results_fname.name, n))
 
 
         # Display table of all results
@@ -586,17 +3151,44 @@ def record_display_results(gpu):
         gpu.errfd.close()
 
 #------------------------------------------------------------------------------
-# print_summary_table(gpu, tmsfp=None):
-#   Print a summary table from data produced by this run, or, if a file path
-#   object is passed in the keyword parameter tmsfp, print from data in that
-#   file.
+# print_summary_table(gpu, tmsfp=None, rec=None):
+#   Print a summary table from data produced by this run, or, if a record of
+#   the results store is passed in the keyword parameter rec, print from data
+#   in that record. Tables of older runs can still be printed from their .tms
+#   files, given by Path() object in the keyword parameter tmsfp.
 #------------------------------------------------------------------------------
-def print_summary_table(gpu, tmsfp=None):
-
-    # If tmsfp is not None, read table data from file
+def print_summary_table(gpu, tmsfp=None, rec=None):
+
+    # If rec is not None, take the table data from the stored run
+    if rec is not None:
+        gpu.sets, gpu.lptsz, gpu.ptsz = rec['sets'], rec['lptsz'], rec['ptsz']
+        gpu.lptuniq = rec.get('lptuniq', [])
+        gpu.knls = rec['kernels'] if len(rec['kernels']) > 1 else []
+        gpu.gputm, gpu.totaltm, gpu.upbytes = ([j[k] for j in rec['joins']]
+                for k in ('device_time', 'total_time', 'bytes_uploaded'))
+        gpu.phasestats = [j.get('phases', {}) for j in rec['joins']]
+        gpu.bloomstats = [j.get('bloom_rows') for j in rec['joins']]
+        gpu.ptbl = rec['ptbl']
+        if rec['allsets']:
+            gpu.sets = allsets
+
+    # If tmsfp is not None, read table data from file (older files have no
+    # upload data)
     if tmsfp is not None:
-        gpu.sets, gpu.gputm, gpu.totaltm, gpu.lptsz, gpu.ptsz = \
-                read_tmsfile(tmsfp)
+        tmsdata = read_tmsfile(tmsfp)
+        gpu.sets, gpu.gputm, gpu.totaltm, gpu.lptsz, gpu.ptsz = tmsdata[:5]
+        gpu.lptuniq = []
+        gpu.phasestats = []
+        gpu.bloomstats = []
+        gpu.upbytes = tmsdata[5] if len(tmsdata) > 5 else []
+        gpu.knls = []
+
+        # Files of runs with several kernels hold the times of each kernel
+        # too; interleave them as record_join() does
+        if len(tmsdata) > 6:
+            gpu.knls = tmsdata[6]
+            gpu.gputm, gpu.totaltm, gpu.upbytes = ([x for xs in zip(*l)
+                    for x in xs] for l in tmsdata[7:10])
         # Check if this is a single-pt file, i.e., name is like *-pt13M*.tms
         gpu.ptbl = None
         if 'pt' in tmsfp.name:
@@ -605,9 +3197,54 @@ def print_summary_table(gpu, tmsfp=None):
     t = prettytable.PrettyTable([''] + gpu.sets)
     t.add_row(['linkpage table size'] + gpu.lptsz)
     t.add_row(['page table size'] + gpu.ptsz)
-    t.add_row(['device time'] + gpu.gputm)
-    #t.add_row(['GPU processing time'] + gpu.totaltm)
-    t.add_row(['total time'] + gpu.totaltm)
+    if gpu.lptuniq:
+        t.add_row(['LPT dedup ratio'] + [round(n/max(u, 1), 2)
+                  for n, u in zip(gpu.lptsz, gpu.lptuniq)])
+
+    # With several kernels, the times of each set are in kernel order, and
+    # every kernel gets its own rows
+    nk = max(len(gpu.knls), 1)
+    for i in range(nk):
+        sfx = ' ({})'.format(gpu.knls[i]) if nk > 1 else ''
+        t.add_row(['device time' + sfx] + gpu.gputm[i::nk])
+    for i in range(nk):
+        sfx = ' ({})'.format(gpu.knls[i]) if nk > 1 else ''
+        #t.add_row(['GPU processing time' + sfx] + gpu.totaltm[i::nk])
+        t.add_row(['total time' + sfx] + gpu.totaltm[i::nk])
+    if gpu.upbytes:
+        for i in range(nk):
+            sfx = ' ({})'.format(gpu.knls[i]) if nk > 1 else ''
+            t.add_row(['bytes uploaded' + sfx] + gpu.upbytes[i::nk])
+
+    # LPT rows the Bloom filter dropped (--bloom), so that the times of a
+    # filtered join are not taken for those of a full one
+    if any(gpu.bloomstats):
+        for i in range(nk):
+            sfx = ' ({})'.format(gpu.knls[i]) if nk > 1 else ''
+            t.add_row(['Bloom rows dropped' + sfx] + [br[1] if br else 'n/a'
+                      for br in gpu.bloomstats[i::nk]])
+
+    # Phases of the timeline: the sets' load times, and the bandwidth of the
+    # copies and the verification time of every kernel (older runs have none)
+    if any(gpu.phasestats):
+        def phase(st, name):
+            return st.get(name, (0.0, 0))
+        def gbps(st, name):
+            tm, nb = phase(st, name)
+            return round(nb/tm/1e9, 2) if tm else 'n/a'
+        t.add_row(['load time'] + [round(phase(st, 'load')[0], 4)
+                                   for st in gpu.phasestats[::nk]])
+        for name in 'upload', 'readback':
+            if not any(name in st for st in gpu.phasestats):
+                continue
+            for i in range(nk):
+                sfx = ' ({})'.format(gpu.knls[i]) if nk > 1 else ''
+                t.add_row(['{} GB/s{}'.format(name, sfx)] +
+                          [gbps(st, name) for st in gpu.phasestats[i::nk]])
+        for i in range(nk):
+            sfx = ' ({})'.format(gpu.knls[i]) if nk > 1 else ''
+            t.add_row(['verify time' + sfx] + [round(phase(st, 'verify')[0],
+                      4) for st in gpu.phasestats[i::nk]])
 
     # If there are mysql data, add to table
     sqlfname = ['sqljoin', '.tms']
@@ -619,7 +3256,8 @@ def print_summary_table(gpu, tmsfp=None):
         sqlfname[1:1] = ['-', gpu.ptbl]
     sqlfp = output_path/''.join(sqlfname)
 
-    if sqlfp.exists():
+    # (SQL times exist only for the sets in allsets)
+    if sqlfp.exists() and all(name in allsets for name in gpu.sets):
         # extract values that correspond to the sets in this run
         (tmdata,) = read_tmsfile(sqlfp)
         if gpu.sets is not allsets:
@@ -628,9 +3266,9 @@ def print_summary_table(gpu, tmsfp=None):
             sqltms = tmdata
         t.add_row(['MySQL processing time'] + sqltms)
 
-        # Create list of GPU speed gain/loss factors
+        # Create list of GPU speed gain/loss factors (of the first kernel)
         factor = [ (str(round((mtm/gtm), 2)), 'x')
-                    for gtm, mtm in zip(gpu.gputm, sqltms)]
+                    for gtm, mtm in zip(gpu.gputm[::nk], sqltms)]
         # Add list to table
         t.add_row(['GPU speed-up'] + [''.join(a) for a in factor])
 
@@ -649,82 +3287,106 @@ def print_summary_table(gpu, tmsfp=None):
     gpu.verbose = verbose
 
 #------------------------------------------------------------------------------
-# write_tmsfile(gpu):
-#  Write processing results to "gpujoin.tms" in the output directory. Also,
-#  make a copy of the file with a name that contains this run's parameters.
+# write_results(gpu):
+#  Append this run's results to the results store, results_fname in the output
+#  directory, as one JSON record (one line). The record holds the run's
+#  parameters (date, git revision, devices, engines, kernels, etc.), the sizes
+#  of the sets' tables, and one entry per join, in set-major, kernel-minor
+#  order, with the join's times, bytes uploaded, and phases (the time and
+#  bytes of each phase of its timeline; see trace_host()).
 #
 # Return:
-#   (p, cp): Path() objects for the two files created
+#   n: the index of the run in the store
 #------------------------------------------------------------------------------
-def write_tmsfile(gpu):
+def write_results(gpu):
 
     # Round the timing data here
     gpu.gputm = np.around(gpu.gputm, decimals=4).tolist()
     gpu.totaltm = np.around(gpu.totaltm, decimals=4).tolist()
 
-    # Construct file pathname
-    p = output_path/'gpujoin.tms'
-
-    # Write output data
-    with p.open(mode='w') as fd:
-
-        print('{:-<79}'.format('#'), file=fd)
-        s = '# GPU Processing Times'
-        print(s, '\n# {:\u2014<{len}}'.format('', len=len(s)-2), file=fd)
-        print('# {}'.format(time.ctime()), file=fd)
-        print('#\n# GPU runs per table set: {}'.format(gpu.runs), file=fd)
-        print('# Join input pairs: ', file=fd)
-        print("#  ", end='', file=fd)
-
-        nsets= len(gpu.sets)
-        for i, currset in zip(range(nsets), gpu.sets):
-            print('{}'.format(gpu.tbldict[currset][:2]), end='', file=fd)
-            if i == nsets-1:
-                print("\n#\n#", file=fd)
-            elif not (i+1)%3:
-                print(",\n#  ", end='', file=fd)
-            else:
-                print(", ", end='', file=fd)
-
-        print('# Output lists:', file=fd)
+    if gpu.engine == 'sort':
+        devices = []
+    elif gpu.alldevs:
+        devices = ['{} ({})'.format(dev.name, dev.platname)
+                   for dev in gpu.devs]
+    else:
+        device = gpu.ctx.devices[0]
+        devices = ['{} ({})'.format(device.name, device.platform.name)]
+
+    knls = gpu.knls or [gpu.engine]
+    joins = [{'set': tblset, 'kernel': knl, 'device_time': gtm,
+              'total_time': ttm, 'bytes_uploaded': int(nb),
+              'phases': {phase: [round(tm, 6), int(pb)]
+                         for phase, (tm, pb) in st.items()},
+              'bloom_rows': br and [int(n) for n in br]}
+             for (tblset, knl), gtm, ttm, nb, st, br in zip(
+                 ((tblset, knl) for tblset in gpu.sets for knl in knls),
+                 gpu.gputm, gpu.totaltm, gpu.upbytes, gpu.phasestats,
+                 gpu.bloomstats)]
+
+    rec = {'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+           'git': git_revision(),
+           'host': os.uname().nodename,
+           'devices': devices,
+           'engines': sorted(gpu.engines),
+           'kernels': knls,
+           'runs': gpu.runs,
+           'allsets': gpu.sets is allsets,
+           'ptbl': gpu.ptbl,
+           'chunksz': gpu.chunksz,
+           'alldevs': gpu.alldevs,
+           'bloom': gpu.bloom,
+           'dedup': gpu.dedup,
+           'zerocopy': gpu.zerocopy,
+           'ptpart': gpu.ptpart,
+           'mode': gpu.mode,
+           'sets': list(gpu.sets),
+           'lptsz': [int(n) for n in gpu.lptsz],
+           'lptuniq': [int(n) for n in gpu.lptuniq],
+           'ptsz': [int(n) for n in gpu.ptsz],
+           'joins': joins}
+
+    n = len(read_results())
+    with results_fname.open('a') as fd:
+        fd.write(json.dumps(rec) + '\n')
+    return n
 
-        print('#  1. tblsets[]', file=fd)
-        if gpu.runs == 1:
-            s = '#  2. device_time[] (sec)\n#  2. total_time[] (sec)'
-        else:
-            s = '#  2. avg_device_time[] (sec)\n#  2. avg_total_time[] (sec)'
-
-        print(s, file=fd)
-        print('#  3. linkpage_table_size[] (rows)', file=fd)
-        print('#  4. page_table_size[] (rows)', file=fd)
-        print('{:-<79}'.format('#'), file=fd)
-        print('{}'.format(repr(gpu.sets)), file=fd)
-        print('{}'.format(repr(gpu.gputm)), file=fd)
-        print('{}'.format(repr(gpu.totaltm)), file=fd)
-        print('{}'.format(repr(gpu.lptsz)), file=fd)
-        print('{}'.format(repr(gpu.ptsz)), file=fd)
-
-    # Make a copy with name that describes this run's parameters
-    cp = None
-    cf = []
-    if gpu.sets is allsets:
-        cf += ['-allsets']
-    if gpu.ptbl:
-        cf += ['-', gpu.ptbl]
-    if gpu.runs > 1:
-        cf += ['-iter', str(gpu.runs)]
+#------------------------------------------------------------------------------
+# read_results(p=results_fname)
+#   Return the list of run records in a results store. Lines that are not
+#   valid JSON (e.g., the tail of an interrupted write) are skipped.
+#------------------------------------------------------------------------------
+def read_results(p=results_fname):
+
+    recs = []
+    if p.exists():
+        with p.open('r') as fd:
+            for line in fd:
+                try:
+                    recs.append(json.loads(line))
+                except ValueError:
+                    pass
+    return recs
 
-    if any(cf):
-        cf.insert(0, p.stem)
-        cf.append('.tms')
-        cp = p.with_name(''.join(cf))
-        copy(str(p), str(cp))
+#------------------------------------------------------------------------------
+# git_revision()
+#   Return the git revision of the project's tree (with a '-dirty' suffix if
+#   it has local changes), or None if it isn't known.
+#------------------------------------------------------------------------------
+def git_revision():
 
-    return p, cp
+    try:
+        cp = subprocess.run(['git', 'describe', '--always', '--dirty'],
+                cwd=str(project_path), stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL, encoding='UTF_8')
+    except OSError:
+        return None
+    return cp.stdout.strip() or None
 
 #------------------------------------------------------------------------------
 # read_tmsfile(p)
-#   Return all non-comment lines from a '.tms' file.
+#   Return all non-comment lines from a '.tms' file. The sqljoin.tms files,
+#   and the .tms files of older gpujoin runs, are in this format.
 # Input:
 #   p: file Path() object
 # Output:
@@ -735,19 +3397,18 @@ def read_tmsfile(p):
     tmsdata = []
     with p.open('r') as fd:
         for line in fd:
-            # eval() doesn't like empty lines, so check for them
+            # literal_eval() doesn't like empty lines, so check for them
             if not line.isspace() and line[0] != '#':
-                tmsdata.append(eval(line))
+                tmsdata.append(ast.literal_eval(line))
     return tuple(tmsdata)
 
-#def read_tmsfile(tmsfile):
-#
-#    tmsdata = []
-#    for line in tmsfile:
-#        # eval() doesn't like empty lines, so check for them
-#        if not line.isspace() and line[0] != '#':
-#            tmsdata.append(eval(line))
-#    return tuple(tmsdata)
+#------------------------------------------------------------------------------
+# def set_size(tblset):
+#   Returns the nominal LPT row count of a tblset keyword N[KM] (K = 1024 rows,
+#   M = 1024K rows), by which sets are ordered and compared; e.g., 832K < 2M.
+#------------------------------------------------------------------------------
+def set_size(tblset):
+    return int(tblset[:-1]) << (10 if tblset[-1] == 'K' else 20)
 
 #------------------------------------------------------------------------------
 # def tmstr(tm):
@@ -805,11 +3466,16 @@ def parse_cmdline():
     s += ["more keywords from", str(allsets)+'.', "Example: '%(prog)s all' or"]
     s += ["'%(prog)s 416K 832K 3M'. Each %(metavar)s identifies a tuple"]
     s += ["(LPT, PT, RT) of tables on which to perform the GPU join, e.g.,"]
-    s += ["416K specifies the tuple (lpt416K, pt416K, rt416K)."]
-    s += ["See the README file for details."]
+    s += ["416K specifies the tuple (lpt416K, pt416K, rt416K). Other sets,"]
+    s += ["e.g., ones made by gentables.py, are given by name in the same"]
+    s += ["N[KM] form. See the README file for details."]
     hstr = ' '.join(s)
-    tblsets = allsets + ['all']
-    pgrp.add_argument('tblset', nargs='+', metavar='TBLSET', choices=tblsets,
+    def tblset(arg):
+        if arg != 'all' and not re.fullmatch(r'[1-9]\d*[KM]', arg):
+            raise argparse.ArgumentTypeError('invalid table set: {}'
+                    .format(arg))
+        return arg
+    pgrp.add_argument('tblset', nargs='+', metavar='TBLSET', type=tblset,
             help=hstr)
 
     # arg: -h, --help
@@ -832,6 +3498,85 @@ def parse_cmdline():
     hstr = 'load tables from npy files (see option -m)'
     optgrp.add_argument('-n', dest='usenpy', action='store_true', help=hstr)
 
+    # arg: -e ENGINE
+    s = ["join engine to use (default: lmem). 'lmem' scans PT in blocks of"]
+    s += ["16 rows (the work-group size) in local memory for every LPT row;"]
+    s += ["'fprint' scans PT in blocks of 128 64-bit title fingerprints"]
+    s += ["(8 work-group sizes) and compares full titles"]
+    s += ["only on a fingerprint match; 'hash' builds an open-addressing hash"]
+    s += ["table over PT fingerprints and probes it with one work-item per"]
+    s += ["LPT row; 'bsearch' sorts PT once and binary-searches it on the"]
+    s += ["device for every LPT title; 'dict' replaces titles with uint32"]
+    s += ["codes from a title dictionary kept in the tables directory and"]
+    s += ["joins by a gather through a code-to-id map; 'arena' packs titles"]
+    s += ["without their null padding into byte arenas and binary-searches"]
+    s += ["PT, sorted by title length and title, with one work-item per LPT"]
+    s += ["row;"]
+    s += ["'sort' joins on the host CPU by sorting PT titles and"]
+    s += ["binary-searching them (NumPy), without OpenCL"]
+    hstr = ' '.join(s)
+    optgrp.add_argument('-e', nargs=1, dest='engine', metavar='ENGINE',
+            choices=engines, help=hstr)
+
+    # arg: -k KERNELS
+    s = ["OpenCL kernel(s) to run (default: the engine's kernel). %(metavar)s"]
+    s += ["is the keyword 'all' or a comma-separated list of keywords from"]
+    s += [str(list(kernels))+'.', "'naive', 'xor', 'oclfns', 'lptsegs' and"]
+    s += ["'lwg' are the other nested-loop kernels of kernel.cl on the lmem"]
+    s += ["engine's tables; every other keyword is an engine's kernel. Every"]
+    s += ["set is joined by each kernel in turn (with its own engine, which"]
+    s += ["overrides -e), and the summary table shows their times side by"]
+    s += ["side. Example: '%(prog)s -k lmem,xor,fprint 832K'"]
+    hstr = ' '.join(s)
+    def knllist(arg):
+        knls = arg.split(',')
+        bad = [k for k in knls if k not in kernels and k != 'all']
+        if bad:
+            raise argparse.ArgumentTypeError('invalid kernel(s): {}'
+                    .format(', '.join(bad)))
+        return knls
+    optgrp.add_argument('-k', dest='knls', metavar='KERNELS', type=knllist,
+            help=hstr)
+
+    # arg: --mode MODE
+    s = ["join result mode: 'left' (the default) gives every LPT row the id"]
+    s += ["of its first match in PT, or 0; 'inner' returns the (LPT row, PT"]
+    s += ["row) pairs of all the matches; 'semi' a bitmask of the LPT rows"]
+    s += ["with a match; 'anti' the LPT rows with none (dangling links). The"]
+    s += ["output of the other modes than 'left' is written to"]
+    s += ["gpujoin-MODE-TBLSET.npy in the output directory. They require the"]
+    s += ["bsearch engine"]
+    hstr = ' '.join(s)
+    optgrp.add_argument('--mode', metavar='MODE', choices=modes,
+            default='left', help=hstr)
+
+    # arg: -a
+    s = ["multi-device mode. Open every OpenCL device of every platform"]
+    s += ["(GPUs and CPUs alike) and split LPT across them. The first split"]
+    s += ["is proportional to each device's measured throughput, and devices"]
+    s += ["that run out of rows take chunks from the others (work stealing)."]
+    s += ["Option -t is ignored"]
+    hstr = ' '.join(s)
+    optgrp.add_argument('-a', dest='alldevs', action='store_true', help=hstr)
+
+    # arg: -s ROWS
+    s = ["streaming mode. Join LPT in chunks of %(metavar)s rows (rounded up"]
+    s += ["to a multiple of the work-group size) with two chunk buffers on"]
+    s += ["the device: the next chunk is copied in while one is joined, and"]
+    s += ["the output of the previous one is read back. Device memory is then"]
+    s += ["bounded by the chunk size, not the LPT size. Requires the lmem"]
+    s += ["engine"]
+    hstr = ' '.join(s)
+    optgrp.add_argument('-s', nargs=1, dest='chunksz', metavar='ROWS',
+            type=int, help=hstr)
+
+    # arg: -z (zerocopy)
+    s = ["zero-copy mode. Memory-map npy tables (see option -n) instead of"]
+    s += ["reading them, and create the device input buffers over host memory"]
+    s += ["(CL_MEM_USE_HOST_PTR) instead of copying them"]
+    hstr = ' '.join(s)
+    optgrp.add_argument('-z', dest='zerocopy', action='store_true', help=hstr)
+
     # arg: -i ITER
     s = ["number of times to run the GPU kernel for each input set. ITER can"]
     s += ["be 1, 2, 3, or 4 (default: 1). This is used to obtain the average"]
@@ -848,9 +3593,13 @@ def parse_cmdline():
     s += ["joins that require larger PTs than the one specified will not be"]
     s += ["performed"]
     hstr = ' '.join(s)
+    def pgtbl(arg):
+        if not re.fullmatch(r'pt[1-9]\d*[KM]', arg):
+            raise argparse.ArgumentTypeError('invalid page table: {}'
+                    .format(arg))
+        return arg
     optgrp.add_argument('-p', nargs=1, dest='ptbl', metavar='PGTBL',
-            choices=[''.join(['pt', tblset]) for tblset in allsets],
-            help=hstr)
+            type=pgtbl, help=hstr)
 
     # arg: -o FNAME
     #hstr = ["redirect output to file %(metavar)s (default: stdout)"]
@@ -873,6 +3622,73 @@ def parse_cmdline():
     optgrp.add_argument('-t', nargs=1, dest='platname', metavar='PLATNAME',
             type=str, help=hstr)
 
+    # arg: -x
+    s = ["do not use the persistent PT index. By default, the parsed PT and"]
+    s += ["the structures the engines build over it (fingerprints, hash"]
+    s += ["table, sorted copy) are saved to 'ptindex' in the tables"]
+    s += ["directory, keyed by a digest of the PT file, and memory-mapped in"]
+    s += ["later runs with the same PT"]
+    hstr = ' '.join(s)
+    optgrp.add_argument('-x', dest='noindex', action='store_true', help=hstr)
+
+    # arg: --tune
+    s = ["tune the engine's kernel, or those of -k, for the OpenCL device and"]
+    s += ["exit. Every work-group size the device supports (and, for the"]
+    s += ["fprint engine, every fingerprint tile size) is timed on a sample"]
+    s += ["of the first TBLSET's LPT, and the fastest is stored in"]
+    s += ["src/.cltune.json. Later runs of the kernel on the same device use"]
+    s += ["it. Option --dim overrides it. With several kernels (e.g., '-k"]
+    s += ["all'), the fastest kernel is stored too, and later runs on the"]
+    s += ["device without -k or -e use it"]
+    hstr = ' '.join(s)
+    optgrp.add_argument('--tune', action='store_true', help=hstr)
+
+    # arg: --bloom
+    s = ["before the join, drop the LPT rows whose titles a Bloom filter over"]
+    s += ["the PT titles shows are not in PT, and give them an id of 0; only"]
+    s += ["the other rows are uploaded and joined. Used with the kernels that"]
+    s += ["scan PT (engines lmem and fprint)"]
+    hstr = ' '.join(s)
+    optgrp.add_argument('--bloom', action='store_true', help=hstr)
+
+    # arg: --dedup
+    s = ["join each distinct LPT title once and copy its id to all the LPT"]
+    s += ["rows with that title. The summary table shows each set's dedup"]
+    s += ["ratio (LPT rows per distinct title)"]
+    hstr = ' '.join(s)
+    optgrp.add_argument('--dedup', action='store_true', help=hstr)
+
+    # arg: --prefetch MB
+    s = ["while a set is joined, read the tables of the next sets in the"]
+    s += ["background, up to about %(metavar)s megabytes of them ahead; 0"]
+    s += ["turns prefetching off (default: %(default)s)"]
+    hstr = ' '.join(s)
+    optgrp.add_argument('--prefetch', type=int, metavar='MB',
+            default=PREFETCH_MB, help=hstr)
+
+    # arg: --trace FNAME
+    s = ["write the run's timeline to %(metavar)s in the Chrome trace"]
+    s += ["format (open it in chrome://tracing or ui.perfetto.dev): the host"]
+    s += ["phases (table loads, index builds, verification) and every upload,"]
+    s += ["kernel and read-back on the device(s), timed by their OpenCL"]
+    s += ["events"]
+    hstr = ' '.join(s)
+    optgrp.add_argument('--trace', nargs=1, metavar='FNAME', help=hstr)
+
+    # arg: --errs N
+    s = ["log at most %(metavar)s error rows per join, an evenly spaced"]
+    s += ["sample of them if there are more; 0 logs all rows (default:"]
+    s += ["%(default)s)"]
+    hstr = ' '.join(s)
+    optgrp.add_argument('--errs', dest='maxerrs', type=int, metavar='N',
+            default=ERRLOG_ROWS, help=hstr)
+
+    # arg: --errnpy
+    s = ["also save all the error rows of a join (row, reference id, output"]
+    s += ["id, title) to an npy file in the output directory"]
+    hstr = ' '.join(s)
+    optgrp.add_argument('--errnpy', action='store_true', help=hstr)
+
     # arg: -v
     # Enable verbose output
     hstr = 'verbose output'
@@ -894,6 +3710,12 @@ def parse_cmdline():
             #help=hstr)
             help=argparse.SUPPRESS)
 
+    # arg: --ptpart ROWS
+    hstr = '(devel option): join PT in partitions of %(metavar)s rows'
+    optgrp.add_argument('--ptpart', nargs=1, type=int, metavar='ROWS',
+            #help=hstr)
+            help=argparse.SUPPRESS)
+
     # arg: --dim XD YD
     hstr = "(devel option): local_size tuple: (XD, YD)"
     optgrp.add_argument('--dim', nargs=2, type=int,
@@ -906,22 +3728,17 @@ def parse_cmdline():
     #hstr = "(devel option): dump ptx code in gpu.ptx"
     #optgrp.add_argument('--ptx', action='store_true', help=argparse.SUPPRESS)
 
-    # arg: --prt FNAME
-    # This option, if specified with FNAME, must be the last one the cmdline
+    # arg: --prt RUN
+    # This option, if specified with RUN, must be the last one the cmdline
     #
-    s = ['(devel option): print output summary table from data in %(metavar)s']
-    s += ['and exit. If specified, this option must be the last one on the']
-    s += ['comand line. (Default %(metavar)s: "gpujoin.tms" in the logs']
-    s += ['directory)']
+    s = ['(devel option): print output summary table of run %(metavar)s in']
+    s += ['the results store and exit. %(metavar)s is an index into the']
+    s += ['runs (default: -1, the last run) or the path of an older .tms']
+    s += ['file. If specified, this option must be the last one on the']
+    s += ['comand line']
     hstr = ' '.join(s)
-    #tmsfname = str(output_path.joinpath('gpujoin.tms').resolve())
-    #optgrp.add_argument('--prt', nargs='?', dest='tmsfile', metavar='FNAME',
-    #        type=argparse.FileType('r'), const=tmsfname,
-    #        #help=hstr)
-    #        help=argparse.SUPPRESS)
-    tmsfname = str(output_path.joinpath('gpujoin.tms').resolve())
-    optgrp.add_argument('--prt', nargs='?', dest='tmsfile', metavar='FNAME',
-            const=tmsfname,
+    optgrp.add_argument('--prt', nargs='?', dest='prtrun', metavar='RUN',
+            const='-1',
             #help=hstr)
             help=argparse.SUPPRESS)
 
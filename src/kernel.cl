@@ -40,7 +40,13 @@
  * obtaining the page id. The values of L that were tested are 8, 16, and
  * 32. L = 16 means that each threadblk (i.e., instance of the kernel)
  * processes 16 LPT rows. For an input LPT of size (N, 1), the GPU grid is made
- * up of N/L threadblks, each assigned L rows from LPT.
+ * up of N/L threadblks, each assigned L rows from LPT. gpujoin.py pads the
+ * LPT it uploads with empty rows to a multiple of L rows. PT can have any
+ * number of rows: the kernels that copy PT to local memory in blocks of
+ * BLKSIZE rows bound the last block, which may be a partial one.
+ *
+ * L is a build-time parameter (BLKSIZE). gpujoin --tune benchmarks the values
+ * a device supports and stores the fastest for later runs on that device.
  *
  * Input
  *  LPT: Nx1 'linkpage' table of (0, lnkpg_title) tuples
@@ -202,7 +208,8 @@ __kernel void join_vecdata_oclfns(global const float4* restrict lpt,
  * This kernel makes use of fast local (shared) memory to accelerate execution
  * further. Each thread in a work-group copies a corresponding page table (PT)
  * row into local memory. The title-string compares are then performed by all
- * 16 threads in a work-group on blocks of 16 PT rows in local memory.
+ * BLKSIZE (by default, 16) threads in a work-group on blocks of BLKSIZE PT
+ * rows in local memory.
  *
  * The Nvidia GPU used in this work is a Maxwell microarchitecture device that
  * contains 13 Streaming Multiprocessor Maxwell (SMM), althernatively denoted
@@ -230,6 +237,7 @@ __kernel void join_vecdata_lmem(global const float4* restrict lpt,
     int tid = get_local_id(0);
     int rownum = get_local_id(0) + get_group_id(0)*BLKSIZE;
     int gotmatch = false, num_matches = 0, m, k;
+    uint blkrows;
     global const float4 *lpd = &lpt[rownum*ROWLEN]; // ptr to LPT row data
     global const float4 *pd;                        // ptr to PT data
     volatile local int *match_cntr = &lmem[2*ROWLEN*BLKSIZE];
@@ -238,36 +246,42 @@ __kernel void join_vecdata_lmem(global const float4* restrict lpt,
     if (tid == 0) *match_cntr = 1;
     barrier(CLK_LOCAL_MEM_FENCE);
 
-    // Loop over all PT rows, processing them in blocks of 16
+    // Loop over all PT rows, processing them in blocks of BLKSIZE
     for (m = 0; m < ptsz && num_matches < BLKSIZE; m += BLKSIZE) {
 
+        // PT rows in this block: BLKSIZE, or fewer in the last block if the
+        // PT size is not a multiple of BLKSIZE
+        blkrows = min((uint)BLKSIZE, ptsz - m);
+
         // Copy this thread's corresponding PT row into local memory. This step
         // needs to be done even if a title match has been made for this
         // thread. The PT row is still needed for other threads that may not
         // have yet made a title match
         //
-        pd = &pt[(tid+m)*ROWLEN];
-        lmem[tid] = pd[0].xy, lmem[tid+16] = pd[0].zw;
-        lmem[tid+32] = pd[1].xy, lmem[tid+48] = pd[1].zw;
-        lmem[tid+64] = pd[2].xy, lmem[tid+80] = pd[2].zw;
-        lmem[tid+96] = pd[3].xy, lmem[tid+112] = pd[3].zw;
+        if (tid < blkrows) {
+            pd = &pt[(tid+m)*ROWLEN];
+            lmem[tid] = pd[0].xy, lmem[tid+BLKSIZE] = pd[0].zw;
+            lmem[tid+2*BLKSIZE] = pd[1].xy, lmem[tid+3*BLKSIZE] = pd[1].zw;
+            lmem[tid+4*BLKSIZE] = pd[2].xy, lmem[tid+5*BLKSIZE] = pd[2].zw;
+            lmem[tid+6*BLKSIZE] = pd[3].xy, lmem[tid+7*BLKSIZE] = pd[3].zw;
+        }
 
         // Sync threads here to ensure all PT rows are in local memory
         barrier(CLK_LOCAL_MEM_FENCE);
 
-        for (k = 0; k < BLKSIZE && gotmatch == false; k++) {
+        for (k = 0; k < blkrows && gotmatch == false; k++) {
 
             if (isnotequal(lpd[0].y,  lmem[k].y)) continue;
-            if (any(isnotequal(lpd[0].zw, lmem[k+16]))) continue;
+            if (any(isnotequal(lpd[0].zw, lmem[k+BLKSIZE]))) continue;
 
-            if (any(isnotequal(lpd[1].xy, lmem[k+32]))) continue;
-            if (any(isnotequal(lpd[1].zw, lmem[k+48]))) continue;
+            if (any(isnotequal(lpd[1].xy, lmem[k+2*BLKSIZE]))) continue;
+            if (any(isnotequal(lpd[1].zw, lmem[k+3*BLKSIZE]))) continue;
 
-            if (any(isnotequal(lpd[2].xy, lmem[k+64]))) continue;
-            if (any(isnotequal(lpd[2].zw, lmem[k+80]))) continue;
+            if (any(isnotequal(lpd[2].xy, lmem[k+4*BLKSIZE]))) continue;
+            if (any(isnotequal(lpd[2].zw, lmem[k+5*BLKSIZE]))) continue;
 
-            if (any(isnotequal(lpd[3].xy, lmem[k+96]))) continue;
-            if (any(isnotequal(lpd[3].zw, lmem[k+112]))) continue;
+            if (any(isnotequal(lpd[3].xy, lmem[k+6*BLKSIZE]))) continue;
+            if (any(isnotequal(lpd[3].zw, lmem[k+7*BLKSIZE]))) continue;
 
             gotmatch = true;
             num_matches = atomic_inc(match_cntr);
@@ -286,7 +300,15 @@ __kernel void join_vecdata_lmem(global const float4* restrict lpt,
  *                                      local float2 *lmem) {
  *
  *  This kernel is called multiple times from the host to compute joins on
- *  segments of LPT. The size of PT does not change for
+ *  segments of LPT. The size of PT does not change for the segments: each
+ *  call joins one segment, whose rows start at row 'segoffset' of the lpt and
+ *  lpid buffers, against all of PT, as join_vecdata_lmem does.
+ *
+ *  The streaming mode of gpujoin.py (-s option) uses it with two-segment
+ *  (double) buffers: while one segment is joined, the next is copied into
+ *  the other half of lpt, and the output of the previous one is read from
+ *  the other half of lpid. Because the buffers are reused, a row with no
+ *  match in PT gets an id of 0 rather than leaving a stale value in place.
  *****************************************************************************/
 #if KERNEL == LPTSEGS
 __kernel void join_vecdata_LPTsegments(global const float4* restrict lpt,
@@ -299,45 +321,55 @@ __kernel void join_vecdata_LPTsegments(global const float4* restrict lpt,
     int tid = get_local_id(0);
     int rownum = get_local_id(0) + get_group_id(0)*BLKSIZE;
     int gotmatch = false, num_matches = 0, m, k;
+    uint blkrows;
     global const float4 *lpd = &lpt[(segoffset+rownum)*ROWLEN];
     global const float4 *pd;
     global float *id = &lpid[segoffset];
     volatile local int *match_cntr = &lmem[2*ROWLEN*BLKSIZE];
 
+    // Clear this row's output slot (0 is no match)
+    id[rownum] = 0.0f;
+
     // Use thread 0 to init atomic match-counter
     if (tid == 0) *match_cntr = 1;
     barrier(CLK_LOCAL_MEM_FENCE);
 
-    // Loop over all PT rows, processing them in blocks of 16
+    // Loop over all PT rows, processing them in blocks of BLKSIZE
     for (m = 0; m < ptsz && num_matches < BLKSIZE; m += BLKSIZE) {
 
+        // PT rows in this block: BLKSIZE, or fewer in the last block if the
+        // PT size is not a multiple of BLKSIZE
+        blkrows = min((uint)BLKSIZE, ptsz - m);
+
         // Copy this thread's corresponding PT row into local memory. This step
         // needs to be done even if a title match has been made for this
         // thread. The PT row is still needed for other threads that may not
         // have yet made a title match
         //
-        pd = &pt[(tid+m)*ROWLEN];
-        lmem[tid] = pd[0].xy, lmem[tid+16] = pd[0].zw;
-        lmem[tid+32] = pd[1].xy, lmem[tid+48] = pd[1].zw;
-        lmem[tid+64] = pd[2].xy, lmem[tid+80] = pd[2].zw;
-        lmem[tid+96] = pd[3].xy, lmem[tid+112] = pd[3].zw;
+        if (tid < blkrows) {
+            pd = &pt[(tid+m)*ROWLEN];
+            lmem[tid] = pd[0].xy, lmem[tid+BLKSIZE] = pd[0].zw;
+            lmem[tid+2*BLKSIZE] = pd[1].xy, lmem[tid+3*BLKSIZE] = pd[1].zw;
+            lmem[tid+4*BLKSIZE] = pd[2].xy, lmem[tid+5*BLKSIZE] = pd[2].zw;
+            lmem[tid+6*BLKSIZE] = pd[3].xy, lmem[tid+7*BLKSIZE] = pd[3].zw;
+        }
 
         // Sync threads here to ensure all PT rows are in local memory
         barrier(CLK_LOCAL_MEM_FENCE);
 
-        for (k = 0; k < BLKSIZE && gotmatch == false; k++) {
+        for (k = 0; k < blkrows && gotmatch == false; k++) {
 
             if (isnotequal(lpd[0].y,  lmem[k].y)) continue;
-            if (any(isnotequal(lpd[0].zw, lmem[k+16]))) continue;
+            if (any(isnotequal(lpd[0].zw, lmem[k+BLKSIZE]))) continue;
 
-            if (any(isnotequal(lpd[1].xy, lmem[k+32]))) continue;
-            if (any(isnotequal(lpd[1].zw, lmem[k+48]))) continue;
+            if (any(isnotequal(lpd[1].xy, lmem[k+2*BLKSIZE]))) continue;
+            if (any(isnotequal(lpd[1].zw, lmem[k+3*BLKSIZE]))) continue;
 
-            if (any(isnotequal(lpd[2].xy, lmem[k+64]))) continue;
-            if (any(isnotequal(lpd[2].zw, lmem[k+80]))) continue;
+            if (any(isnotequal(lpd[2].xy, lmem[k+4*BLKSIZE]))) continue;
+            if (any(isnotequal(lpd[2].zw, lmem[k+5*BLKSIZE]))) continue;
 
-            if (any(isnotequal(lpd[3].xy, lmem[k+96]))) continue;
-            if (any(isnotequal(lpd[3].zw, lmem[k+112]))) continue;
+            if (any(isnotequal(lpd[3].xy, lmem[k+6*BLKSIZE]))) continue;
+            if (any(isnotequal(lpd[3].zw, lmem[k+7*BLKSIZE]))) continue;
 
             gotmatch = true;
             num_matches = atomic_inc(match_cntr);
@@ -361,7 +393,9 @@ __kernel void join_vecdata_LPTsegments(global const float4* restrict lpt,
  * The number of blocks per kernel instantiation is passed in a new 'nblks'
  * parameter.
  *
- * This kernel is much slower than previous implementations and is not used.
+ * This kernel is much slower than previous implementations and is not used
+ * by default. gpujoin runs it with option -k lwg, with nblks = 4 (the wirows
+ * value of its entry in the kernel registry of gpujoin.py).
  *
  * Rashad Barghouti: UNI: rb3074
  * ELEN E6893 term project, fall 2016
@@ -380,6 +414,7 @@ __kernel void join_vecdata_lwg(global const float4* restrict lpt,
     int rownum = get_local_id(0) + get_group_id(0)*nblks*BLKSIZE;
     int gotmatch, num_matches;
     int n, m, k;
+    uint blkrows;
 
     for (n = 0; n < nblks; n++, rownum += BLKSIZE) {
 
@@ -395,38 +430,47 @@ __kernel void join_vecdata_lwg(global const float4* restrict lpt,
         // Point to this thread's LPT row data
         lpd = &lpt[rownum*ROWLEN];
 
-        // Loop over all PT rows, processing them in blocks of 16
+        // Loop over all PT rows, processing them in blocks of BLKSIZE
         for (m = 0; m < ptsz && num_matches < BLKSIZE; m += BLKSIZE) {
 
+            // PT rows in this block (fewer than BLKSIZE in a last, partial
+            // block)
+            blkrows = min((uint)BLKSIZE, ptsz - m);
+
             // Copy this thread's PT row into local memory. This must be done
             // even if a title match for this thread has been made. It's
             // corresponding PT row is needed for other threads until all 16
             // titles have been matched.
             //
-            pd = &pt[(tid+m)*ROWLEN];
-            lmem[tid] = pd[0].xy, lmem[tid+16] = pd[0].zw;
-            lmem[tid+32] = pd[1].xy, lmem[tid+48] = pd[1].zw;
-            lmem[tid+64] = pd[2].xy, lmem[tid+80] = pd[2].zw;
-            lmem[tid+96] = pd[3].xy, lmem[tid+112] = pd[3].zw;
+            if (tid < blkrows) {
+                pd = &pt[(tid+m)*ROWLEN];
+                lmem[tid] = pd[0].xy, lmem[tid+BLKSIZE] = pd[0].zw;
+                lmem[tid+2*BLKSIZE] = pd[1].xy;
+                lmem[tid+3*BLKSIZE] = pd[1].zw;
+                lmem[tid+4*BLKSIZE] = pd[2].xy;
+                lmem[tid+5*BLKSIZE] = pd[2].zw;
+                lmem[tid+6*BLKSIZE] = pd[3].xy;
+                lmem[tid+7*BLKSIZE] = pd[3].zw;
+            }
 
             // Sync threads here to ensure all PT rows are in local memory
             barrier(CLK_LOCAL_MEM_FENCE);
 
             // Iterate over PT rows in local memory and do a title string
             // compare with each. When a match is found, stop.
-            for (k = 0; k < BLKSIZE && gotmatch == false; k++) {
+            for (k = 0; k < blkrows && gotmatch == false; k++) {
 
                 if (isnotequal(lpd[0].y,  lmem[k].y)) continue;
-                if (any(isnotequal(lpd[0].zw, lmem[k+16]))) continue;
+                if (any(isnotequal(lpd[0].zw, lmem[k+BLKSIZE]))) continue;
 
-                if (any(isnotequal(lpd[1].xy, lmem[k+32]))) continue;
-                if (any(isnotequal(lpd[1].zw, lmem[k+48]))) continue;
+                if (any(isnotequal(lpd[1].xy, lmem[k+2*BLKSIZE]))) continue;
+                if (any(isnotequal(lpd[1].zw, lmem[k+3*BLKSIZE]))) continue;
 
-                if (any(isnotequal(lpd[2].xy, lmem[k+64]))) continue;
-                if (any(isnotequal(lpd[2].zw, lmem[k+80]))) continue;
+                if (any(isnotequal(lpd[2].xy, lmem[k+4*BLKSIZE]))) continue;
+                if (any(isnotequal(lpd[2].zw, lmem[k+5*BLKSIZE]))) continue;
 
-                if (any(isnotequal(lpd[3].xy, lmem[k+96]))) continue;
-                if (any(isnotequal(lpd[3].zw, lmem[k+112]))) continue;
+                if (any(isnotequal(lpd[3].xy, lmem[k+6*BLKSIZE]))) continue;
+                if (any(isnotequal(lpd[3].zw, lmem[k+7*BLKSIZE]))) continue;
 
                 gotmatch = true;
                 num_matches = atomic_inc(match_cntr);
@@ -436,3 +480,467 @@ __kernel void join_vecdata_lwg(global const float4* restrict lpt,
     }
 }
 #endif
+/******************************************************************************
+ * __kernel void join_hash_probe(global const uint4* restrict lpt,
+ *                               global const ulong* restrict lpfp,
+ *                               global const uint4* restrict pt,
+ *                               global const ulong* restrict ptfp,
+ *                               global const uint* restrict htbl,
+ *                               const uint hmask,
+ *                               global uint *lpid)
+ *
+ * This kernel replaces the scan of PT with a lookup in an open-addressing hash
+ * table. The table is built on the host (build_hash_table() in gpujoin.py)
+ * and has hmask+1 slots, each holding either the index of a PT row or the
+ * value HTEMPTY. Every thread starts at the slot given by the low-order bits
+ * of its LPT title fingerprint and walks the table (linear probing) until it
+ * finds the PT row with its title or reaches an empty slot. At the table's
+ * load factor of at most 0.5, a probe reads only a few slots, so the work per
+ * LPT row no longer depends on the size of PT.
+ *
+ * The fingerprint of each visited PT row is compared first, and the title,
+ * with XOR ops on uint4 vectors as in the join_vecdata_xor_ops kernel, only
+ * when the fingerprints are equal. LPT rows with no match in PT get a page id
+ * of 0.
+ *
+ * Input:
+ *  LPT, PT: same as the naive kernel
+ *  LPFP, PTFP: 64-bit title fingerprints of the LPT and PT rows
+ *  htbl: hash table of PT row indices
+ *  hmask: number of hash table slots - 1 (the slot count is a power of 2)
+ *
+ * Output:
+ *  lpid[N] array with the id values of LPT
+ *****************************************************************************/
+#if KERNEL == HASH
+__kernel void join_hash_probe(global const uint4* restrict lpt,
+                              global const ulong* restrict lpfp,
+                              global const uint4* restrict pt,
+                              global const ulong* restrict ptfp,
+                              global const uint* restrict htbl,
+                              const uint hmask,
+                              global uint *lpid) {
+
+    int i = get_local_id(0) + get_group_id(0)*BLKSIZE;
+    global const uint4 *lp = &lpt[i*ROWLEN];
+    global const uint4 *ptrow;
+    ulong fp = lpfp[i];
+    uint slot, r, id = 0;
+    uint4 r0;
+
+    // Walk the probe sequence until the title or an empty slot is found
+    for (slot = (uint)fp & hmask; (r = htbl[slot]) != HTEMPTY;
+            slot = (slot + 1) & hmask) {
+
+        if (ptfp[r] != fp) continue;
+
+        ptrow = &pt[r*ROWLEN];
+
+        r0 = lp[0] ^ ptrow[0];
+        // ignore r0.x, which contains the XOR of page-id words
+        if (r0.y | r0.z | r0.w) continue;
+        r0 = lp[1] ^ ptrow[1];
+        if (r0.x | r0.y | r0.z | r0.w) continue;
+        r0 = lp[2] ^ ptrow[2];
+        if (r0.x | r0.y | r0.z | r0.w) continue;
+        r0 = lp[3] ^ ptrow[3];
+        if (r0.x | r0.y | r0.z | r0.w) continue;
+
+        id = ptrow[0].x;
+        break;
+    }
+    lpid[i] = id;
+}
+#endif
+/******************************************************************************
+ * __kernel void join_sorted_bsearch(global const uint4* restrict lpt,
+ *                                   global const uint4* restrict spt,
+ *                                   const uint ptsz,
+ *                                   global uint *lpid)
+ *
+ * This kernel joins LPT with a copy of PT that the host has sorted by title
+ * (sort_pt() in gpujoin.py). Titles are ordered by their 15 uint32 words,
+ * compared one word at a time. Each thread does a lower-bound binary search
+ * of the sorted PT for its LPT title. That takes log2(M) title compares
+ * rather than up to M. Unlike in the lmem kernel, the work of a thread does
+ * not depend on where in PT its match is, and threads in a work-group do not
+ * wait for each other to find a match.
+ *
+ * Because the host sort is stable and the search finds the first of any equal
+ * titles, duplicate titles in PT resolve to the same row as in the nested-loop
+ * kernels. LPT rows with no match in PT get a page id of 0.
+ *
+ * Input:
+ *  LPT: same as the naive kernel
+ *  SPT: PT sorted by title
+ *  ptsz: number of rows in SPT
+ *
+ * Output:
+ *  lpid[N] array with the id values of LPT
+ *****************************************************************************/
+#if KERNEL == BSEARCH
+// Compare the titles of two rows by their words. Returns <0, 0 or >0
+inline int title_cmp(global const uint4 *a, global const uint4 *b) {
+
+    global const uint *x = (global const uint *)a;
+    global const uint *y = (global const uint *)b;
+
+    for (uint j = 1; j < 4*ROWLEN; j++)
+        if (x[j] != y[j])
+            return x[j] < y[j] ? -1 : 1;
+
+    return 0;
+}
+
+__kernel void join_sorted_bsearch(global const uint4* restrict lpt,
+                                  global const uint4* restrict spt,
+                                  const uint ptsz,
+                                  global uint *lpid) {
+
+    int i = get_local_id(0) + get_group_id(0)*BLKSIZE;
+    global const uint4 *lp = &lpt[i*ROWLEN];
+    uint lo = 0, hi = ptsz, mid;
+
+    // Find the first sorted PT row whose title is not less than this title
+    while (lo < hi) {
+        mid = lo + (hi - lo)/2;
+        if (title_cmp(&spt[mid*ROWLEN], lp) < 0)
+            lo = mid + 1;
+        else
+            hi = mid;
+    }
+
+    if (lo < ptsz && title_cmp(&spt[lo*ROWLEN], lp) == 0)
+        lpid[i] = spt[lo*ROWLEN].x;
+    else
+        lpid[i] = 0;
+}
+
+/******************************************************************************
+ * __kernel void count_matches(global const uint4* restrict lpt,
+ *                             global const uint4* restrict spt,
+ *                             const uint ptsz,
+ *                             const uint lptsz,
+ *                             global uint *first,
+ *                             global uint *cnt,
+ *                             global uint *blkcnt,
+ *                             local uint *lsum)
+ *
+ * __kernel void emit_pairs(global const uint *first,
+ *                          global const uint *cnt,
+ *                          global const ulong *blkoff,
+ *                          global const uint *sptrow,
+ *                          global uint2 *pairs,
+ *                          local uint *lscan)
+ *
+ * These two kernels return all the matches of the LPT rows rather than the
+ * first one (gpujoin's --mode option). They are built with the bsearch
+ * kernel and search the same sorted PT.
+ *
+ * count_matches() is the count pass. Each thread finds the range of sorted PT
+ * rows whose title equals its LPT title, with a lower-bound and an
+ * upper-bound binary search, and writes the first row of the range and its
+ * length. The work-group also sums its threads' counts into blkcnt. Rows at
+ * or past lptsz are padding and have no matches.
+ *
+ * The host turns blkcnt into the exclusive prefix sum blkoff, the offset of
+ * each work-group's first pair in the output, and allocates the output for
+ * the total. emit_pairs() then scans the counts of its work-group in local
+ * memory, which gives each thread its own offset, and the thread writes its
+ * (LPT row, PT row) pairs there. PT rows are those of the unsorted PT
+ * (sptrow maps a sorted row to it), in PT order for each LPT row, and the
+ * pairs are in LPT order.
+ *
+ * Input:
+ *  LPT, SPT, ptsz: same as join_sorted_bsearch()
+ *  lptsz: number of LPT rows, not counting the padding
+ *  sptrow: PT row of each SPT row
+ *  blkoff: offset of each work-group's first pair in pairs
+ *  lsum, lscan: local memory for 1 and BLKSIZE ints
+ *
+ * Output:
+ *  first[N], cnt[N]: first SPT row and number of matches of each LPT row
+ *  blkcnt: number of matches of each work-group's LPT rows
+ *  pairs: (LPT row, PT row) of every match
+ *****************************************************************************/
+// Binary search of SPT rows [lo, ptsz) for title lp. Returns the first row
+// whose title is not less than lp or, with upper, greater than lp
+inline uint title_bound(global const uint4 *spt, uint lo, uint ptsz,
+                        global const uint4 *lp, int upper) {
+
+    uint hi = ptsz, mid;
+    int c;
+
+    while (lo < hi) {
+        mid = lo + (hi - lo)/2;
+        c = title_cmp(&spt[mid*ROWLEN], lp);
+        if (c < 0 || (upper && c == 0))
+            lo = mid + 1;
+        else
+            hi = mid;
+    }
+
+    return lo;
+}
+
+__kernel void count_matches(global const uint4* restrict lpt,
+                            global const uint4* restrict spt,
+                            const uint ptsz,
+                            const uint lptsz,
+                            global uint *first,
+                            global uint *cnt,
+                            global uint *blkcnt,
+                            local uint *lsum) {
+
+    int tid = get_local_id(0);
+    int i = tid + get_group_id(0)*BLKSIZE;
+    uint lo = 0, n = 0;
+
+    if (i < lptsz) {
+        lo = title_bound(spt, 0, ptsz, &lpt[i*ROWLEN], 0);
+        n = title_bound(spt, lo, ptsz, &lpt[i*ROWLEN], 1) - lo;
+    }
+    first[i] = lo;
+    cnt[i] = n;
+
+    // Sum the work-group's counts
+    if (tid == 0)
+        *lsum = 0;
+    barrier(CLK_LOCAL_MEM_FENCE);
+    if (n)
+        atomic_add(lsum, n);
+    barrier(CLK_LOCAL_MEM_FENCE);
+    if (tid == 0)
+        blkcnt[get_group_id(0)] = *lsum;
+}
+
+__kernel void emit_pairs(global const uint *first,
+                         global const uint *cnt,
+                         global const ulong *blkoff,
+                         global const uint *sptrow,
+                         global uint2 *pairs,
+                         local uint *lscan) {
+
+    int tid = get_local_id(0);
+    int i = tid + get_group_id(0)*BLKSIZE;
+    uint n = cnt[i], v;
+
+    // Inclusive scan of the work-group's counts (Hillis-Steele)
+    lscan[tid] = n;
+    barrier(CLK_LOCAL_MEM_FENCE);
+    for (uint d = 1; d < BLKSIZE; d <<= 1) {
+        v = tid >= d ? lscan[tid - d] : 0;
+        barrier(CLK_LOCAL_MEM_FENCE);
+        lscan[tid] += v;
+        barrier(CLK_LOCAL_MEM_FENCE);
+    }
+
+    ulong off = blkoff[get_group_id(0)] + lscan[tid] - n;
+    for (uint j = 0; j < n; j++)
+        pairs[off + j] = (uint2)(i, sptrow[first[i] + j]);
+}
+#endif
+/******************************************************************************
+ * __kernel void join_fprint_lmem(global const uint4* restrict lpt,
+ *                                global const ulong* restrict lpfp,
+ *                                global const uint4* restrict pt,
+ *                                global const ulong* restrict ptfp,
+ *                                const uint ptsz,
+ *                                global uint *lpid,
+ *                                local ulong *lmem)
+ *
+ * This is the lmem kernel's block scan of PT done on 64-bit title
+ * fingerprints. The host computes a fingerprint for every LPT and PT title
+ * (fingerprint_titles() in gpujoin.py). The work-group copies a tile of
+ * FPTILE PT fingerprints into local memory, and each thread compares its LPT
+ * fingerprint with the tile. A thread reads a full PT row from global memory
+ * only on a fingerprint match, to confirm it with a title compare.
+ *
+ * A fingerprint is 8 bytes instead of a 64-byte row. A PT row then costs one
+ * 64-bit compare instead of up to eight float2 compares, and the tile holds
+ * FPTILE = 8*BLKSIZE PT rows in the local memory that the lmem kernel uses
+ * for BLKSIZE rows.
+ *
+ * The work-group stops scanning PT once all its threads have a match. The
+ * match counter is read by all threads between the same two barriers, so
+ * every thread leaves the loop after the same tile. LPT rows with no match in
+ * PT get a page id of 0, and PT does not need to be padded to a multiple of
+ * the tile size.
+ *
+ * Input:
+ *  LPT, PT, ptsz: same as the naive kernel
+ *  LPFP, PTFP: 64-bit title fingerprints of the LPT and PT rows
+ *  lmem: local memory for FPTILE fingerprints + 1 int (match counter)
+ *
+ * Output:
+ *  lpid[N] array with the id values of LPT
+ *****************************************************************************/
+#if KERNEL == FPRINT
+__kernel void join_fprint_lmem(global const uint4* restrict lpt,
+                               global const ulong* restrict lpfp,
+                               global const uint4* restrict pt,
+                               global const ulong* restrict ptfp,
+                               const uint ptsz,
+                               global uint *lpid,
+                               local ulong *lmem) {
+
+    int tid = get_local_id(0);
+    int rownum = get_local_id(0) + get_group_id(0)*BLKSIZE;
+    int gotmatch = false;
+    uint m, k, j, tilesz;
+    global const uint4 *lp = &lpt[rownum*ROWLEN];
+    global const uint4 *ptrow;
+    volatile local int *match_cntr = (volatile local int *)&lmem[FPTILE];
+    ulong fp = lpfp[rownum];
+    uint id = 0;
+    uint4 r0;
+
+    // Use thread 0 to init match-counter
+    if (tid == 0) *match_cntr = 0;
+    barrier(CLK_LOCAL_MEM_FENCE);
+
+    // Loop over PT in tiles of FPTILE fingerprints
+    for (m = 0; m < ptsz && *match_cntr < BLKSIZE; m += FPTILE) {
+
+        // Copy the tile's fingerprints into local memory
+        tilesz = min(FPTILE, ptsz - m);
+        for (j = tid; j < tilesz; j += BLKSIZE)
+            lmem[j] = ptfp[m + j];
+
+        // Sync threads here to ensure the whole tile is in local memory
+        barrier(CLK_LOCAL_MEM_FENCE);
+
+        for (k = 0; k < tilesz && gotmatch == false; k++) {
+
+            if (lmem[k] != fp) continue;
+
+            // Fingerprint hit; confirm with the title
+            ptrow = &pt[(m+k)*ROWLEN];
+
+            r0 = lp[0] ^ ptrow[0];
+            if (r0.y | r0.z | r0.w) continue;
+            r0 = lp[1] ^ ptrow[1];
+            if (r0.x | r0.y | r0.z | r0.w) continue;
+            r0 = lp[2] ^ ptrow[2];
+            if (r0.x | r0.y | r0.z | r0.w) continue;
+            r0 = lp[3] ^ ptrow[3];
+            if (r0.x | r0.y | r0.z | r0.w) continue;
+
+            gotmatch = true;
+            id = ptrow[0].x;
+            atomic_inc(match_cntr);
+        }
+
+        // Sync before the next tile overwrites local memory and the counter
+        // is read again
+        barrier(CLK_LOCAL_MEM_FENCE);
+    }
+    lpid[rownum] = id;
+}
+#endif
+/******************************************************************************
+ * __kernel void join_dict_gather(global const uint* restrict lpcode,
+ *                                global const uint* restrict idmap,
+ *                                global uint *lpid)
+ *
+ * This kernel joins dictionary-encoded tables. The host replaces every title
+ * in LPT and PT with its uint32 code from a title dictionary shared by all
+ * tables (encode_titles() in gpujoin.py), and builds a direct-address map
+ * from code to the page id of the first PT row with that code (0 if none).
+ * The join is then a gather: each thread reads its LPT code and looks up the
+ * id. LPT is 4 bytes per row on the device instead of 64, and no title compare
+ * is needed.
+ *
+ * Input:
+ *  lpcode: N title codes of LPT
+ *  idmap: page id of each code
+ *
+ * Output:
+ *  lpid[N] array with the id values of LPT
+ *****************************************************************************/
+#if KERNEL == DICT
+__kernel void join_dict_gather(global const uint* restrict lpcode,
+                               global const uint* restrict idmap,
+                               global uint *lpid) {
+
+    int i = get_local_id(0) + get_group_id(0)*BLKSIZE;
+
+    lpid[i] = idmap[lpcode[i]];
+}
+#endif
+/******************************************************************************
+ * __kernel void join_arena_bsearch(global const uchar* restrict lpt,
+ *                                  global const uint* restrict lpoff,
+ *                                  global const uchar* restrict pt,
+ *                                  global const uint* restrict ptoff,
+ *                                  global const uint* restrict ptid,
+ *                                  const uint ptsz,
+ *                                  global uint *lpid)
+ *
+ * This kernel joins tables whose titles are packed into title arenas
+ * (title_arena() in gpujoin.py) instead of 60-byte fields: the titles' bytes
+ * back to back, without their null padding, and an array of offsets, title i
+ * being the bytes from offset i to offset i+1. Wikipedia titles average well
+ * under half of 60 bytes, so the arenas are that much smaller than the 64-byte
+ * rows the other kernels read, and so is the upload.
+ *
+ * The host sorts PT by title length, then by title bytes (load_arena_pt()),
+ * and the ids of the sorted rows are in ptid. Each thread does a lower-bound
+ * binary search of the sorted PT for its LPT title, as join_sorted_bsearch()
+ * does. Two titles are compared by their lengths first, and byte by byte only
+ * if the lengths are equal, so most compares read no title bytes at all. The
+ * host sort is stable, so duplicate titles in PT resolve to the same row as
+ * in the nested-loop kernels. LPT rows with no match in PT get a page id of 0.
+ *
+ * Input:
+ *  LPT: title arena of LPT, and lpoff, its N+1 offsets
+ *  PT: title arena of the sorted PT, and ptoff, its ptsz+1 offsets
+ *  ptid: page ids of the sorted PT rows
+ *
+ * Output:
+ *  lpid[N] array with the id values of LPT
+ *****************************************************************************/
+#if KERNEL == ARENA
+// Compare two arena titles by length, then byte by byte. Returns <0, 0 or >0
+inline int arena_cmp(global const uchar *x, uint xlen,
+                     global const uchar *y, uint ylen) {
+
+    if (xlen != ylen)
+        return xlen < ylen ? -1 : 1;
+
+    for (uint j = 0; j < xlen; j++)
+        if (x[j] != y[j])
+            return x[j] < y[j] ? -1 : 1;
+
+    return 0;
+}
+
+__kernel void join_arena_bsearch(global const uchar* restrict lpt,
+                                 global const uint* restrict lpoff,
+                                 global const uchar* restrict pt,
+                                 global const uint* restrict ptoff,
+                                 global const uint* restrict ptid,
+                                 const uint ptsz,
+                                 global uint *lpid) {
+
+    int i = get_local_id(0) + get_group_id(0)*BLKSIZE;
+    global const uchar *lp = &lpt[lpoff[i]];
+    uint len = lpoff[i+1] - lpoff[i];
+    uint lo = 0, hi = ptsz, mid;
+
+    // Find the first sorted PT row whose title is not less than this title
+    while (lo < hi) {
+        mid = lo + (hi - lo)/2;
+        if (arena_cmp(&pt[ptoff[mid]], ptoff[mid+1] - ptoff[mid], lp, len) < 0)
+            lo = mid + 1;
+        else
+            hi = mid;
+    }
+
+    if (lo < ptsz && arena_cmp(&pt[ptoff[lo]], ptoff[lo+1] - ptoff[lo],
+                               lp, len) == 0)
+        lpid[i] = ptid[lo];
+    else
+        lpid[i] = 0;
+}
+#endif